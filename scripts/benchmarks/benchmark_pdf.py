@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+PDF Extraction Benchmarks
+Times the Clueless Mind page analysis (scripts/clueless-mind/pdf_layout.py)
+with different numbers of worker processes, and checks that every run
+returns the same page records as the serial one.
+
+By default the benchmark writes a synthetic book (a 72pt heading every few
+pages, 11pt body text) to a temporary directory, so it runs without the
+real PDF. Pass --pdf to time a real book instead.
+
+With --memory it also streams synthetic books of a quarter, half and all
+of --pages pages, each in a fresh process, and reports their peak resident
+memory, which should stay flat as the page count grows.
+
+Usage:
+    python scripts/benchmarks/benchmark_pdf.py
+    python scripts/benchmarks/benchmark_pdf.py --pages 400 --workers 1 2 4 8
+    python scripts/benchmarks/benchmark_pdf.py --pdf docs/archive/Aoasm.pdf --json results.json
+    python scripts/benchmarks/benchmark_pdf.py --memory --workers 1
+
+Requires the Clueless Mind requirements (pdfplumber).
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR / "clueless-mind"))
+from pdf_layout import analyze_pdf, peak_memory_mb
+
+WORDS = ("the river ran slow and the men stood on the bank watching the light "
+         "fall over the water while the town behind them went quiet").split()
+
+
+def write_synthetic_book(path, pages, chapter_every=5, seed=0):
+    """
+    Write a plain PDF book: a page number, a 72pt heading every chapter_every pages, and 11pt body text.
+
+    Args:
+        path: Output file
+        pages: Number of pages
+        chapter_every: Pages per chapter
+        seed: Seed for the body text
+    """
+    rnd = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_num in range(pages):
+        ops = [f"BT /F1 9 Tf 300 770 Td ({page_num + 1}) Tj ET"]
+        y = 740
+        if page_num % chapter_every == 0:
+            ops.append(f"BT /F1 72 Tf 40 {y - 60} Td (Part {page_num // chapter_every + 1} Begins) Tj ET")
+            y -= 110
+        while y > 60:
+            line = " ".join(rnd.choice(WORDS) for _ in range(12))
+            ops.append(f"BT /F1 11 Tf 50 {y} Td ({line}) Tj ET")
+            y -= 14
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        ).encode("latin-1"))
+        kids.append(len(objects))
+    objects[1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>"
+    ).encode("latin-1")
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def bench_workers(pdf_path, workers, baseline=None):
+    """Analyze the whole PDF with a given number of workers and time it."""
+    started = time.perf_counter()
+    records = list(analyze_pdf(pdf_path, workers))
+    elapsed = time.perf_counter() - started
+    result = {
+        "benchmark": f"analyze_pdf_{workers}_workers",
+        "workers": workers,
+        "pages": len(records),
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(records) / elapsed, 1) if elapsed else None,
+    }
+    if baseline is not None:
+        result["speedup"] = round(baseline["seconds"] / elapsed, 2) if elapsed else None
+    return result, records
+
+
+def measure_memory(pdf_path, workers):
+    """Stream every page record of a PDF and print the peak memory as JSON (run in a fresh process)."""
+    pages = sum(1 for _ in analyze_pdf(pdf_path, workers))
+    own_mb, worker_mb = peak_memory_mb()
+    print(json.dumps({"pages": pages, "peak_mb": own_mb, "worker_peak_mb": worker_mb}))
+
+
+def bench_memory(work_dir, pages, workers):
+    """Report the peak memory of streaming a synthetic book, in a fresh process."""
+    pdf_path = work_dir / f"synthetic_{pages}.pdf"
+    write_synthetic_book(pdf_path, pages)
+    output = subprocess.run(
+        [sys.executable, __file__, "--measure-memory", str(pdf_path), "--workers", str(workers)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    result = {"benchmark": f"stream_{pages}_pages_{workers}_workers", "workers": workers}
+    result.update(json.loads(output.strip().splitlines()[-1]))
+    return result
+
+
+def print_results(results):
+    print()
+    print("=" * 60)
+    print("Benchmark Results")
+    print("=" * 60)
+    for result in results:
+        print(f"{result['benchmark']}:")
+        for key, value in result.items():
+            if key != "benchmark":
+                print(f"  {key}: {value}")
+
+
+def main():
+    """Main execution flow."""
+    parser = argparse.ArgumentParser(description="Benchmark parallel PDF page analysis")
+    parser.add_argument("--pdf", help="PDF to analyze (default: a synthetic book)")
+    parser.add_argument("--pages", type=int, default=320, help="Pages of the synthetic book")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+                        help="Worker counts to compare (the first is the baseline)")
+    parser.add_argument("--memory", action="store_true",
+                        help="Also report peak memory for growing page counts")
+    parser.add_argument("--measure-memory", metavar="PDF", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.measure_memory:
+        measure_memory(args.measure_memory, args.workers[0])
+        return
+
+    work_dir = Path(tempfile.mkdtemp(prefix="mockpoet-pdf-bench-"))
+    try:
+        if args.pdf:
+            pdf_path = Path(args.pdf)
+        else:
+            pdf_path = work_dir / "synthetic_book.pdf"
+            write_synthetic_book(pdf_path, args.pages)
+            print(f"✓ Wrote a {args.pages}-page synthetic book")
+        print(f"PDF: {pdf_path} ({os.cpu_count()} CPUs)")
+
+        results = []
+        baseline = baseline_records = None
+        for workers in args.workers:
+            print(f"Analyzing with {workers} workers...")
+            result, records = bench_workers(pdf_path, workers, baseline)
+            if baseline is None:
+                baseline, baseline_records = result, records
+            elif records != baseline_records:
+                print(f"ERROR: {workers} workers returned different page records than {baseline['workers']}")
+                sys.exit(1)
+            results.append(result)
+
+        if args.memory:
+            for pages in (args.pages // 4, args.pages // 2, args.pages):
+                print(f"Measuring peak memory for {pages} pages...")
+                results.append(bench_memory(work_dir, pages, args.workers[0]))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Wrote results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmarks
+Runs the generation pipelines of the novel, Hemingway and poem scripts
+end to end against the offline fake Gemini backend (common/fake_backend.py),
+so pipeline overhead can be measured on a laptop or in CI without an API key.
+
+Each benchmark works in a temporary docs directory and reports wall time,
+API calls and the injected errors that were retried.
+
+The publish benchmarks run the Gist publishing paths (daily novel and
+collection runs, the full-book upload and the farce-drama publish) against
+a local fake Gist API (fake_gist_server.py), and report the requests and
+bytes each publish costs.
+
+Usage:
+    python scripts/benchmarks/benchmark_pipelines.py
+    python scripts/benchmarks/benchmark_pipelines.py --days 30 --chapters 10 --error-rate 0.1
+    python scripts/benchmarks/benchmark_pipelines.py --only poems --json results.json
+    python scripts/benchmarks/benchmark_pipelines.py --only publish --publishes 20 --gist-latency 0.05
+
+The scripts' own requirements (PyGithub, tweepy, pytumblr) must be
+installed, since the benchmarks import the scripts as they are.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_gist_server import FakeGistServer
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+REPO_DIR = SCRIPTS_DIR.parent
+NOVEL_DOCS_DIR = REPO_DIR / "docs" / "novel-gist"
+
+
+def configure_environment(args, work_dir, gist_server=None):
+    """Point every LLM setting at the fake backend and a scratch directory, and the Gist API at the fake server."""
+    if gist_server is not None:
+        os.environ.update({
+            "GIST_API_URL": gist_server.url,
+            "GIST_RAW_URL": gist_server.url,
+            "GIST_OWNER": gist_server.owner,
+            "GIST_TOKEN": "fake",
+        })
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "GEMINI_API_KEY": "fake",
+        "LLM_FAKE_WORDS": str(args.words),
+        "LLM_FAKE_LATENCY": str(args.latency),
+        "LLM_FAKE_TOKENS_PER_SEC": str(args.tokens_per_sec),
+        "LLM_FAKE_ERROR_RATE": str(args.error_rate),
+        "LLM_FAKE_SEED": str(args.seed),
+        "LLM_CACHE_DIR": str(work_dir / "llm-responses"),
+        "LLM_COOLDOWN_FILE": str(work_dir / "llm-cooldown"),
+        "LLM_REQUESTS_PER_MINUTE": "1000000",
+        "LLM_BACKOFF_BASE": "0.01",
+        "LLM_BACKOFF_MAX": "0.1",
+        "POEM_QUEUE_DIR": str(work_dir / "poem-queue"),
+    })
+
+
+def load_script(relative_path):
+    """Import a generator script as a module without running main()."""
+    path = SCRIPTS_DIR / relative_path
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_novel_daily(work_dir, days):
+    """Simulate consecutive daily runs of novel_daily_to_gist."""
+    novel = load_script("novel/novel_daily_to_gist.py")
+    from common import summaries as summary_store
+
+    docs_dir = work_dir / "novel-gist"
+    docs_dir.mkdir()
+    for name in ("series_bible.md", "outline.md"):
+        shutil.copy(NOVEL_DOCS_DIR / name, docs_dir / name)
+    novel.DOCS_DIR = docs_dir
+
+    series_bible = novel.load_file(docs_dir / "series_bible.md")
+    outline = novel.load_file(docs_dir / "outline.md")
+    for chapter_num in range(1, days + 1):
+        summaries = novel.load_file(docs_dir / "summaries.md")
+        previous_summary = summary_store.build_previous_summary(summaries, docs_dir / "summary_digests.json")
+        chapter_text = novel.generate_chapter(chapter_num, series_bible, outline, previous_summary)
+        summary = novel.generate_summary(chapter_text, chapter_num)
+        novel.update_continuity_log(chapter_num, summary)
+        novel.save_file(docs_dir / f"chapter_{chapter_num:03d}.md", chapter_text)
+        summaries_content = (summaries or "# Chapter Summaries\n") + f"\n\n## Chapter {chapter_num}\n\n{summary}"
+        novel.save_file(docs_dir / "summaries.md", summaries_content)
+    return {"chapters": days}
+
+
+def bench_hemingway(work_dir, chapters):
+    """Run the full-book Hemingway pipeline: bible, outline, every chapter and summary."""
+    hemingway = load_script("hemingway-novel/hemingway_novel_to_gist.py")
+    from common import generation
+    from common.context_cache import format_canon
+    from common.summaries import RunningSynopsis
+
+    docs_dir = work_dir / "hemingway-novel"
+    docs_dir.mkdir()
+    hemingway.DOCS_DIR = docs_dir
+
+    series_bible = hemingway.generate_series_bible()
+    outline = hemingway.generate_outline(series_bible)
+    canon = generation.create_context_cache(
+        f"{hemingway.NOVEL_TITLE} canon",
+        format_canon(series_bible=series_bible, outline=outline)
+    )
+    synopsis = RunningSynopsis()
+    for chapter_num in range(1, chapters + 1):
+        chapter_text = hemingway.generate_chapter(chapter_num, series_bible, outline, synopsis.context(), canon)
+        if not chapter_text:
+            raise RuntimeError(f"Chapter {chapter_num} failed")
+        hemingway.save_file(docs_dir / f"chapter_{chapter_num:03d}.md", chapter_text)
+        title = hemingway.extract_chapter_title(chapter_text)
+        summary = hemingway.generate_summary(chapter_num, chapter_text)
+        synopsis.add(chapter_num, f"**Chapter {chapter_num}: {title}**\n{summary}")
+    return {"chapters": chapters}
+
+
+def bench_poems(work_dir, poems):
+    """Generate poems with the Twitter, Tumblr and Of Old Man scripts, and fill a queue."""
+    twitter = load_script("twitter-poem-bot/twitter_poem_bot.py")
+    tumblr = load_script("tumblr-poem-bot/tumblr_poem_bot.py")
+    of_old_man = load_script("of-old-man/of_old_man_daily_to_gist.py")
+    from common.poem_queue import PoemQueue, fill
+
+    poetry_types = twitter.load_poetry_types()
+    for i in range(poems):
+        poetry_type = poetry_types[i % len(poetry_types)]
+        twitter.create_poem(poetry_type)
+        tumblr.create_poem(poetry_type)
+        of_old_man.generate_poem(i + 1, poetry_type)
+
+    queue = PoemQueue("benchmark", work_dir / "poem-queue")
+    queued = fill(queue, poetry_types[:poems], twitter.create_poem, validate_fn=twitter.is_postable)
+    queue.close()
+    return {"poems": poems * 3 + queued}
+
+
+def gist_traffic(server, publishes):
+    """Summarize the fake Gist API traffic since the last reset_stats, per publish."""
+    stats = server.stats()
+    return {
+        "publishes": publishes,
+        "gist_requests": stats["requests"],
+        "requests_per_publish": round(stats["requests"] / publishes, 2),
+        "kb_sent_per_publish": round(stats["bytes_in"] / 1024 / publishes, 1),
+        "kb_received_per_publish": round(stats["bytes_out"] / 1024 / publishes, 1),
+        "gist_routes": stats["routes"],
+    }
+
+
+def run_main(module, *argv):
+    """Run a script's main() with the given command-line arguments."""
+    saved_argv = sys.argv
+    sys.argv = [module.__name__, *argv]
+    try:
+        module.main()
+    finally:
+        sys.argv = saved_argv
+
+
+def bench_publish_novel(work_dir, server, days):
+    """Run novel_daily_to_gist end to end for consecutive days, first chapter included."""
+    novel = load_script("novel/novel_daily_to_gist.py")
+
+    docs_dir = work_dir / "publish-novel-gist"
+    docs_dir.mkdir()
+    for name in ("series_bible.md", "outline.md"):
+        shutil.copy(NOVEL_DOCS_DIR / name, docs_dir / name)
+    novel.DOCS_DIR = docs_dir
+    novel.MANIFEST_FILE = docs_dir / "gist_manifest.json"
+    novel.NUMBERING_FILE = docs_dir / "numbering.json"
+    novel.JOURNAL_FILE = docs_dir / "run_journal.json"
+    novel.GIST_TOKEN = "fake"
+    novel.GIST_ID = server.create_gist({"README.md": "# Daily Novel\n"}, "Daily Dostoevsky-style Novel")
+
+    server.reset_stats()
+    for _ in range(days):
+        run_main(novel, "--force")
+    return gist_traffic(server, days)
+
+
+def bench_publish_collection(work_dir, server, poems):
+    """Run of_old_man_daily_to_gist end to end, one poem per run."""
+    of_old_man = load_script("of-old-man/of_old_man_daily_to_gist.py")
+
+    docs_dir = work_dir / "publish-of-old-man"
+    docs_dir.mkdir()
+    of_old_man.DOCS_DIR = docs_dir
+    of_old_man.INDEX_FILE = docs_dir / "collection_index.jsonl"
+    of_old_man.NUMBERING_FILE = docs_dir / "numbering.json"
+    of_old_man.GIST_TOKEN = "fake"
+    of_old_man.OF_OLD_MAN_GIST_ID = server.create_gist({"README.md": "# Of Old Man\n"}, "Of Old Man")
+
+    server.reset_stats()
+    for _ in range(poems):
+        run_main(of_old_man, "--force")
+    return gist_traffic(server, poems)
+
+
+def bench_publish_book(work_dir, server, chapters):
+    """Upload a finished Hemingway book, then rerun the upload as --upload-only would."""
+    hemingway = load_script("hemingway-novel/hemingway_novel_to_gist.py")
+    from common import gist_publish
+
+    docs_dir = work_dir / "publish-hemingway-novel"
+    docs_dir.mkdir()
+    hemingway.DOCS_DIR = docs_dir
+    hemingway.MANIFEST_FILE = docs_dir / "gist_manifest.json"
+    hemingway.HEMINGWAY_GIST_ID = server.create_gist({"README.md": "# Hemingway\n"}, "Hemingway Novel")
+
+    paragraph = "The sun came up over the river and the men went down to the boats. " * 40
+    chapters_data = []
+    for chapter_num in range(1, chapters + 1):
+        filename = f"chapter_{chapter_num:03d}.md"
+        hemingway.save_file(docs_dir / filename, f"# Chapter {chapter_num}\n\n" + "\n\n".join([paragraph] * 30))
+        chapters_data.append({"chapter": chapter_num, "filename": filename, "chapter_name": f"Chapter {chapter_num}"})
+    for name in ("series_bible.md", "outline.md", "summaries.md", "continuity_log.txt"):
+        hemingway.save_file(docs_dir / name, f"# {name}\n\n{paragraph}")
+    hemingway.save_file(docs_dir / "chapters.json", hemingway.build_chapters_json(chapters_data, completed=True))
+
+    server.reset_stats()
+    filenames = [c["filename"] for c in chapters_data]
+    for _ in range(2):
+        gist = gist_publish.get_gist_metadata(gist_publish.connect("fake"), hemingway.HEMINGWAY_GIST_ID)
+        hemingway.upload_to_gist(gist, filenames)
+    return gist_traffic(server, 2)
+
+
+def bench_publish_farce(work_dir, server, scenes):
+    """Publish a generated farce drama with publish_to_gist."""
+    farce = load_script("farce-drama/farce_drama_to_gist.py")
+
+    docs_dir = work_dir / "publish-farce-drama"
+    docs_dir.mkdir()
+    farce.DOCS_DIR = docs_dir
+    farce.GIST_TOKEN = "fake"
+    farce.GIST_ID = server.create_gist({"README.md": "# Farce\n"}, "Farce Drama")
+
+    line = "HARGREAVES: I assure you, madam, the duck was entirely my own idea.\n"
+    all_scenes = {
+        f"act_{(i // 5) + 1}_scene_{(i % 5) + 1}.md": f"# Scene {i + 1}\n\n" + line * 400
+        for i in range(scenes)
+    }
+    chapters_data = farce.update_chapters_json([
+        {"chapter": i + 1, "filename": filename, "url": "", "gist_url": "", "chapter_name": filename}
+        for i, filename in enumerate(all_scenes)
+    ])
+
+    server.reset_stats()
+    farce.publish_to_gist(all_scenes, chapters_data)
+    return gist_traffic(server, 1)
+
+
+def run_benchmark(name, fn, *args):
+    """Run one benchmark and collect timing and call statistics."""
+    from common import fake_backend, generation
+
+    usage_before = generation.get_usage()
+    fake_before = fake_backend.get_stats()
+    started = time.perf_counter()
+    details = fn(*args)
+    elapsed = time.perf_counter() - started
+    usage = generation.get_usage()
+    fake = fake_backend.get_stats()
+
+    api_calls = usage["api_calls"] - usage_before["api_calls"]
+    result = {
+        "benchmark": name,
+        "seconds": round(elapsed, 3),
+        "api_calls": api_calls,
+        "cache_hits": usage["cache_hits"] - usage_before["cache_hits"],
+        "model_requests": fake["calls"] - fake_before["calls"],
+        "injected_errors": fake["errors"] - fake_before["errors"],
+        "input_tokens": usage["input_tokens"] - usage_before["input_tokens"],
+        "ms_per_call": round(1000 * elapsed / api_calls, 2) if api_calls else None,
+    }
+    result.update(details)
+    return result
+
+
+def print_results(results):
+    print()
+    print("=" * 60)
+    print("Benchmark Results")
+    print("=" * 60)
+    for result in results:
+        print(f"{result['benchmark']}:")
+        for key, value in result.items():
+            if key != "benchmark":
+                print(f"  {key}: {value}")
+
+
+def main():
+    """Main execution flow."""
+    parser = argparse.ArgumentParser(description="Benchmark the generator pipelines offline")
+    parser.add_argument("--only", choices=["novel", "hemingway", "poems", "publish"], action="append",
+                        help="Run only the named benchmark (repeatable)")
+    parser.add_argument("--days", type=int, default=20, help="Daily novel runs to simulate")
+    parser.add_argument("--chapters", type=int, default=10, help="Hemingway chapters to generate")
+    parser.add_argument("--poems", type=int, default=10, help="Poems per poem script")
+    parser.add_argument("--publishes", type=int, default=10, help="Daily runs per publish benchmark")
+    parser.add_argument("--gist-latency", type=float, default=0.0,
+                        help="Seconds the fake Gist API adds to every request")
+    parser.add_argument("--words", type=int, default=400, help="Words per fake response")
+    parser.add_argument("--latency", type=float, default=0.02, help="Median fake latency in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=0, help="Fake output speed (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with 429/500")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency and error injection")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    selected = args.only or ["novel", "hemingway", "poems", "publish"]
+    work_dir = Path(tempfile.mkdtemp(prefix="mockpoet-bench-"))
+    gist_server = FakeGistServer(latency=args.gist_latency).start() if "publish" in selected else None
+    configure_environment(args, work_dir, gist_server)
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+    results = []
+    try:
+        if "novel" in selected:
+            results.append(run_benchmark("novel_daily_to_gist", bench_novel_daily, work_dir, args.days))
+        if "hemingway" in selected:
+            results.append(run_benchmark("hemingway_novel_to_gist", bench_hemingway, work_dir, args.chapters))
+        if "poems" in selected:
+            results.append(run_benchmark("poem_scripts", bench_poems, work_dir, args.poems))
+        if "publish" in selected:
+            results.append(run_benchmark("publish_novel_daily", bench_publish_novel,
+                                         work_dir, gist_server, args.publishes))
+            results.append(run_benchmark("publish_of_old_man", bench_publish_collection,
+                                         work_dir, gist_server, args.publishes))
+            results.append(run_benchmark("publish_hemingway_book", bench_publish_book,
+                                         work_dir, gist_server, args.chapters))
+            results.append(run_benchmark("publish_farce_drama", bench_publish_farce,
+                                         work_dir, gist_server, args.chapters))
+    finally:
+        if gist_server is not None:
+            gist_server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Wrote results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
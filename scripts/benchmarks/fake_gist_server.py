@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Fake Gist API Server
+A local stand-in for the parts of the GitHub REST API that the publishing
+scripts use, so their round trips, payload sizes and latency can be measured
+(and regressions caught) without a token or network access.
+
+Implemented endpoints:
+    GET   /user                          authenticated user
+    GET   /gists, /users/<login>/gists   paginated listing, files without content
+    POST  /gists                         create a gist
+    GET   /gists/<id>                    full gist with history
+    PATCH /gists/<id>                    edit (add, replace, rename, delete files)
+    GET   /gists/<id>/commits            revision list
+    GET   /gists/<id>/<revision>         gist as of a revision
+    GET   /<owner>/<id>/raw/[<sha>/]<filename>   raw file content
+
+As on GitHub, file contents over 1 MB are cut short in API responses and
+flagged "truncated" (the full text stays available from raw_url), a gist
+with more than 300 files only lists the first 300 and is flagged
+"truncated", and every API response carries X-RateLimit-* headers, with a
+403 once the hourly budget is spent. A revision-pinned raw_url embeds the
+file's git blob SHA-1, which gist_publish.remote_hashes relies on.
+
+GET /_fake/stats returns the request and byte counters, and
+POST /_fake/reset clears them.
+
+Usage:
+    python scripts/benchmarks/fake_gist_server.py --port 8765 --gist 0123abcd
+    GIST_API_URL=http://127.0.0.1:8765 GIST_RAW_URL=http://127.0.0.1:8765 \\
+        GIST_TOKEN=fake GIST_ID=0123abcd python scripts/novel/novel_daily_to_gist.py
+
+Benchmarks embed the server with FakeGistServer(...).start().
+"""
+
+import argparse
+import hashlib
+import json
+import mimetypes
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+# GitHub limits mirrored by the fake
+FILE_TRUNCATE_BYTES = 1024 * 1024
+MAX_LISTED_FILES = 300
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+RATE_LIMIT_WINDOW = 3600
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def _blob_sha(data):
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class ApiError(Exception):
+    """An error response with a GitHub-style JSON message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class FakeGistServer:
+    """In-memory gists behind a threaded HTTP server."""
+
+    def __init__(self, host="127.0.0.1", port=0, owner="pappater", rate_limit=5000, latency=0.0):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free one)
+            owner: Login of the authenticated user, used in raw URLs
+            rate_limit: API requests allowed per hour before 403s
+            latency: Seconds added to every request, to model a round trip
+        """
+        self.owner = owner
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.gists = {}
+        self.blobs = {}
+        self._lock = threading.Lock()
+        self._rate_reset = int(time.time()) + RATE_LIMIT_WINDOW
+        self._rate_used = 0
+        self.reset_stats()
+
+        handler = type("Handler", (_Handler,), {"fake": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        """Serve on a background thread and return self."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    # Counters
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0, "routes": Counter()}
+
+    def stats(self):
+        """Return request count, request/response body bytes and per-route counts."""
+        with self._lock:
+            return {
+                "requests": self._stats["requests"],
+                "bytes_in": self._stats["bytes_in"],
+                "bytes_out": self._stats["bytes_out"],
+                "routes": dict(self._stats["routes"]),
+            }
+
+    def _count(self, route, bytes_in, bytes_out):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["bytes_in"] += bytes_in
+            self._stats["bytes_out"] += bytes_out
+            self._stats["routes"][route] += 1
+
+    def _take_rate_limit(self):
+        """Spend one API request; return the rate-limit headers and whether it was allowed."""
+        with self._lock:
+            now = int(time.time())
+            if now >= self._rate_reset:
+                self._rate_reset = now + RATE_LIMIT_WINDOW
+                self._rate_used = 0
+            allowed = self._rate_used < self.rate_limit
+            if allowed:
+                self._rate_used += 1
+            headers = {
+                "X-RateLimit-Limit": str(self.rate_limit),
+                "X-RateLimit-Remaining": str(self.rate_limit - self._rate_used),
+                "X-RateLimit-Reset": str(self._rate_reset),
+                "X-RateLimit-Used": str(self._rate_used),
+                "X-RateLimit-Resource": "core",
+            }
+            return headers, allowed
+
+    # Gist store
+
+    def create_gist(self, files=None, description="", public=True, gist_id=None):
+        """
+        Create a gist directly, e.g. to seed the one a script expects.
+
+        Args:
+            files: Filename to text content
+            description: Gist description
+            public: Whether the gist is public
+            gist_id: ID to use instead of a random one
+
+        Returns:
+            str: The gist ID
+        """
+        with self._lock:
+            gist_id = gist_id or secrets.token_hex(16)
+            now = _now()
+            self.gists[gist_id] = {
+                "id": gist_id, "description": description, "public": public,
+                "created_at": now, "updated_at": now, "files": {}, "history": [],
+            }
+            self._commit(self.gists[gist_id], {name: {"content": content} for name, content in (files or {}).items()})
+            return gist_id
+
+    def gist_files(self, gist_id):
+        """Return a gist's current files as filename to text content."""
+        with self._lock:
+            return {name: self.blobs[sha].decode("utf-8") for name, sha in self.gists[gist_id]["files"].items()}
+
+    def _commit(self, gist, changes):
+        """Apply a files payload to a gist and record a revision if anything changed."""
+        files = dict(gist["files"])
+        for name, change in changes.items():
+            if change is None:
+                files.pop(name, None)
+                continue
+            if not isinstance(change, dict):
+                raise ApiError(422, f"Invalid file entry for {name}")
+            new_name = change.get("filename") or name
+            if "content" in change:
+                content = change["content"]
+                if content is None or content == "":
+                    # An empty file is dropped, as GitHub does
+                    files.pop(name, None)
+                    continue
+                data = content.encode("utf-8")
+                sha = _blob_sha(data)
+                self.blobs[sha] = data
+            elif name in files:
+                sha = files[name]
+            else:
+                raise ApiError(422, f"File {name} does not exist")
+            files.pop(name, None)
+            files[new_name] = sha
+
+        if files == gist["files"] and gist["history"]:
+            return
+        additions = sum(
+            self.blobs[sha].count(b"\n") + 1 for name, sha in files.items() if gist["files"].get(name) != sha
+        )
+        deletions = sum(
+            self.blobs[sha].count(b"\n") + 1 for name, sha in gist["files"].items() if files.get(name) != sha
+        )
+        parent = gist["history"][0]["version"] if gist["history"] else ""
+        version = hashlib.sha1(
+            (parent + json.dumps(files, sort_keys=True)).encode("utf-8")
+        ).hexdigest()
+        gist["files"] = files
+        gist["updated_at"] = _now()
+        gist["history"].insert(0, {
+            "version": version, "committed_at": gist["updated_at"], "files": files,
+            "change_status": {"total": additions + deletions, "additions": additions, "deletions": deletions},
+        })
+
+    # JSON views
+
+    def _user_json(self):
+        return {
+            "login": self.owner, "id": 1, "node_id": "U_fake", "type": "User", "site_admin": False,
+            "url": f"{self.url}/users/{self.owner}", "html_url": f"{self.url}/{self.owner}",
+        }
+
+    def _gist_json(self, gist, revision=None, full=True):
+        """Serialize a gist like the API: full for single-gist reads, content-free for listings."""
+        files = revision["files"] if revision else gist["files"]
+        names = sorted(files)
+        files_json = {}
+        for name in names[:MAX_LISTED_FILES]:
+            sha = files[name]
+            data = self.blobs[sha]
+            entry = {
+                "filename": name,
+                "type": mimetypes.guess_type(name)[0] or "text/plain",
+                "language": None,
+                "raw_url": f"{self.url}/{self.owner}/{gist['id']}/raw/{sha}/{quote(name)}",
+                "size": len(data),
+            }
+            if full:
+                entry["truncated"] = len(data) > FILE_TRUNCATE_BYTES
+                entry["content"] = data[:FILE_TRUNCATE_BYTES].decode("utf-8", "ignore")
+            files_json[name] = entry
+
+        gist_url = f"{self.url}/gists/{gist['id']}"
+        data = {
+            "url": gist_url if revision is None else f"{gist_url}/{revision['version']}",
+            "forks_url": f"{gist_url}/forks",
+            "commits_url": f"{gist_url}/commits",
+            "id": gist["id"],
+            "node_id": f"G_{gist['id']}",
+            "git_pull_url": f"{self.url}/{gist['id']}.git",
+            "git_push_url": f"{self.url}/{gist['id']}.git",
+            "html_url": f"{self.url}/{self.owner}/{gist['id']}",
+            "files": files_json,
+            "public": gist["public"],
+            "created_at": gist["created_at"],
+            "updated_at": gist["updated_at"],
+            "description": gist["description"],
+            "comments": 0,
+            "user": None,
+            "comments_url": f"{gist_url}/comments",
+            "owner": self._user_json(),
+            "truncated": len(names) > MAX_LISTED_FILES,
+        }
+        if full:
+            data["history"] = [self._history_json(gist, entry) for entry in gist["history"]]
+        return data
+
+    def _history_json(self, gist, entry):
+        return {
+            "user": self._user_json(),
+            "version": entry["version"],
+            "committed_at": entry["committed_at"],
+            "change_status": entry["change_status"],
+            "url": f"{self.url}/gists/{gist['id']}/{entry['version']}",
+        }
+
+    # Request handling
+
+    def _find(self, gist_id):
+        gist = self.gists.get(gist_id)
+        if gist is None:
+            raise ApiError(404, "Not Found")
+        return gist
+
+    def _page(self, path, query, items):
+        """Slice a list like the API's page/per_page parameters and build the Link header."""
+        per_page = min(int(query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+        page = max(int(query.get("page", [1])[0]), 1)
+        last = max((len(items) + per_page - 1) // per_page, 1)
+        links = []
+        if page < last:
+            links.append(f'<{self.url}{path}?page={page + 1}&per_page={per_page}>; rel="next"')
+            links.append(f'<{self.url}{path}?page={last}&per_page={per_page}>; rel="last"')
+        headers = {"Link": ", ".join(links)} if links else {}
+        return items[(page - 1) * per_page:page * per_page], headers
+
+    def api(self, method, path, query, body, authorized):
+        """
+        Handle one API request.
+
+        Returns:
+            tuple: (route label, status, JSON-serializable body, extra headers)
+        """
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        with self._lock:
+            if parts == ["user"]:
+                self._require_auth(authorized)
+                return "GET /user", 200, self._user_json(), {}
+
+            if parts == ["gists"] or (len(parts) == 3 and parts[0] == "users" and parts[2] == "gists"):
+                if method == "POST" and parts == ["gists"]:
+                    self._require_auth(authorized)
+                    files = body.get("files") or {}
+                    if not any(isinstance(f, dict) and f.get("content") for f in files.values()):
+                        raise ApiError(422, "Gist files cannot be empty")
+                    gist = self._new_gist(body)
+                    return "POST /gists", 201, self._gist_json(gist), {}
+                if parts == ["gists"]:
+                    self._require_auth(authorized)
+                gists = sorted(self.gists.values(), key=lambda g: g["updated_at"], reverse=True)
+                page, headers = self._page(path, query, gists)
+                return "GET /gists", 200, [self._gist_json(g, full=False) for g in page], headers
+
+            if len(parts) >= 2 and parts[0] == "gists":
+                gist = self._find(parts[1])
+                if len(parts) == 2 and method == "GET":
+                    return "GET /gists/{id}", 200, self._gist_json(gist), {}
+                if len(parts) == 2 and method == "PATCH":
+                    self._require_auth(authorized)
+                    if "description" in body and body["description"] is not None:
+                        gist["description"] = body["description"]
+                    self._commit(gist, body.get("files") or {})
+                    return "PATCH /gists/{id}", 200, self._gist_json(gist), {}
+                if len(parts) == 3 and parts[2] == "commits" and method == "GET":
+                    page, headers = self._page(path, query, gist["history"])
+                    return ("GET /gists/{id}/commits", 200,
+                            [self._history_json(gist, entry) for entry in page], headers)
+                if len(parts) == 3 and method == "GET":
+                    for entry in gist["history"]:
+                        if entry["version"] == parts[2]:
+                            return "GET /gists/{id}/{sha}", 200, self._gist_json(gist, revision=entry), {}
+                    raise ApiError(404, "Not Found")
+
+            raise ApiError(404, "Not Found")
+
+    def _require_auth(self, authorized):
+        if not authorized:
+            raise ApiError(401, "Requires authentication")
+
+    def _new_gist(self, body):
+        gist_id = secrets.token_hex(16)
+        now = _now()
+        gist = {
+            "id": gist_id, "description": body.get("description") or "", "public": bool(body.get("public")),
+            "created_at": now, "updated_at": now, "files": {}, "history": [],
+        }
+        self.gists[gist_id] = gist
+        self._commit(gist, body.get("files") or {})
+        return gist
+
+    def raw(self, path):
+        """Return the bytes of a raw file URL, or None if there is no such file."""
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        if len(parts) not in (4, 5) or parts[2] != "raw":
+            return None
+        with self._lock:
+            gist = self.gists.get(parts[1])
+            if gist is None:
+                return None
+            filename = parts[-1]
+            if len(parts) == 4:
+                sha = gist["files"].get(filename)
+                return self.blobs.get(sha) if sha else None
+            pin = parts[3]
+            if pin in self.blobs:
+                return self.blobs[pin]
+            for entry in gist["history"]:
+                if entry["version"] == pin and filename in entry["files"]:
+                    return self.blobs[entry["files"][filename]]
+            return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Routes HTTP requests to the owning FakeGistServer (set as the ``fake`` class attribute)."""
+
+    protocol_version = "HTTP/1.1"
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        fake = self.fake
+        if fake.latency:
+            time.sleep(fake.latency)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if url.path.startswith("/_fake/"):
+            if url.path == "/_fake/reset" and method == "POST":
+                fake.reset_stats()
+                return self._send(200, b"{}", "application/json")
+            if url.path == "/_fake/stats":
+                return self._send(200, json.dumps(fake.stats()).encode("utf-8"), "application/json")
+            return self._send(404, b"{}", "application/json")
+
+        # Raw files are served without rate limiting, like gist.githubusercontent.com
+        parts = url.path.strip("/").split("/")
+        if len(parts) >= 4 and parts[2] == "raw":
+            data = fake.raw(url.path)
+            status, payload = (200, data) if data is not None else (404, b"404: Not Found")
+            fake._count("GET raw", len(raw_body), len(payload))
+            return self._send(status, payload, "text/plain; charset=utf-8")
+
+        headers, allowed = fake._take_rate_limit()
+        route = f"{method} {url.path}"
+        try:
+            if not allowed:
+                raise ApiError(403, "API rate limit exceeded for user ID 1.")
+            body = json.loads(raw_body) if raw_body else {}
+            route, status, data, extra = fake.api(
+                method, url.path, query, body, authorized=bool(self.headers.get("Authorization"))
+            )
+            headers.update(extra)
+        except ApiError as e:
+            status, data = e.status, {"message": e.message,
+                                      "documentation_url": "https://docs.github.com/rest"}
+        except ValueError as e:
+            status, data = 400, {"message": f"Problems parsing JSON: {e}"}
+        payload = json.dumps(data).encode("utf-8")
+        fake._count(route, len(raw_body), len(payload))
+        self._send(status, payload, "application/json; charset=utf-8", headers)
+
+    def _send(self, status, payload, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+
+def main():
+    """Main execution flow."""
+    parser = argparse.ArgumentParser(description="Serve a local fake of the GitHub Gist API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind")
+    parser.add_argument("--owner", default="pappater", help="Login of the authenticated user")
+    parser.add_argument("--gist", action="append", default=[],
+                        help="Create an empty gist with this ID at startup (repeatable)")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="API requests allowed per hour")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    args = parser.parse_args()
+
+    server = FakeGistServer(args.host, args.port, args.owner, args.rate_limit, args.latency)
+    for gist_id in args.gist:
+        server.create_gist(gist_id=gist_id, description="Fake gist")
+        print(f"✓ Created gist {gist_id}")
+    print(f"✓ Fake Gist API listening on {server.url}")
+    print(f"  export GIST_API_URL={server.url} GIST_RAW_URL={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping")
+        print(json.dumps(server.stats(), indent=2))
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
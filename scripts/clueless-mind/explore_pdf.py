@@ -3,52 +3,59 @@
 Exploration script to understand the structure of the Clueless Mind PDF.
 """
 
-import pdfplumber
+import argparse
 from pathlib import Path
 
+from pdf_layout import PDF_WORKERS, analyze_pdf
+
 PDF_PATH = Path(__file__).parent.parent.parent / "docs" / "archive" / "Aoasm.pdf"
 
-def explore_pdf():
+def explore_pdf(pages=5, workers=PDF_WORKERS):
     """Explore the PDF structure to understand chapter organization."""
     print(f"Opening PDF: {PDF_PATH}")
     
-    with pdfplumber.open(PDF_PATH) as pdf:
-        print(f"Total pages: {len(pdf.pages)}")
-        print("\n" + "="*80)
+    records = list(analyze_pdf(PDF_PATH, workers, end=pages))
+    print(f"Pages explored: {len(records)}")
+    print("\n" + "="*80)
+    
+    # Look at the first few pages to understand the structure
+    for page in records:
+        print(f"\nPAGE {page['page'] + 1}")
+        print("-"*80)
         
-        # Look at first few pages to understand the structure
-        for page_num in range(min(5, len(pdf.pages))):
-            page = pdf.pages[page_num]
-            print(f"\nPAGE {page_num + 1}")
-            print("-"*80)
-            
-            # Extract text
-            text = page.extract_text()
-            if text:
-                lines = text.split('\n')
-                print(f"Lines on this page: {len(lines)}")
-                
-                # Show first 30 lines
-                for i, line in enumerate(lines[:30], 1):
-                    # Show font size if available (indicates bold/big text)
-                    print(f"{i:3d}: {line}")
-            else:
-                print("No text extracted")
+        # Extracted text
+        text = page['text']
+        if text:
+            lines = text.split('\n')
+            print(f"Lines on this page: {len(lines)}")
             
-            print("-"*80)
+            # Show first 30 lines
+            for i, line in enumerate(lines[:30], 1):
+                print(f"{i:3d}: {line}")
+        else:
+            print("No text extracted")
+        
+        print("-"*80)
+        
+        # Font sizes (big text indicates headings)
+        stats = page['font_sizes']
+        if stats['chars']:
+            print(f"\nFont sizes: body {stats['body']:.1f}, range {stats['min']:.1f}-{stats['max']:.1f}, "
+                  f"mean {stats['mean']:.1f} over {stats['chars']} characters")
+            print("Lines by font size (first 10 unique sizes):")
+            font_sizes = {}
+            for line in page['lines']:
+                size = round(line['size'], 1)
+                if size not in font_sizes:
+                    font_sizes[size] = line['text'][:60]
             
-            # Try to get character details to detect font sizes
-            chars = page.chars
-            if chars:
-                print(f"\nCharacter details (first 10 unique font sizes):")
-                font_sizes = {}
-                for char in chars[:100]:  # Sample first 100 chars
-                    size = char.get('size', 0)
-                    if size not in font_sizes:
-                        font_sizes[size] = char.get('text', '')
-                
-                for size in sorted(font_sizes.keys(), reverse=True)[:10]:
-                    print(f"  Size {size:.1f}: '{font_sizes[size]}'")
+            for size in sorted(font_sizes.keys(), reverse=True)[:10]:
+                print(f"  Size {size:.1f}: '{font_sizes[size]}'")
 
 if __name__ == "__main__":
-    explore_pdf()
+    parser = argparse.ArgumentParser(description="Explore the structure of the PDF")
+    parser.add_argument("--pages", type=int, default=5, help="Number of leading pages to show")
+    parser.add_argument("--workers", type=int, default=PDF_WORKERS,
+                        help="Processes analyzing pages in parallel (default: PDF_WORKERS or 1)")
+    args = parser.parse_args()
+    explore_pdf(args.pages, args.workers)
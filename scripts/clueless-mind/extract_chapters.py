@@ -3,85 +3,65 @@
 Extract chapters from Clueless Mind PDF and create necessary files.
 Creates chapter files, chapters.json, and README similar to the Hemingway novel structure.
 Uploads all files to GitHub Gist.
+
+Runs are incremental: page_map.json records each page's content hash and
+each chapter's page range and hash, so a re-run only analyzes changed
+pages, only rewrites chapters whose pages or boundaries changed, and the
+upload manifest only sends chapters whose hash changed. Pass --full to
+ignore the page map.
 """
 
+import argparse
 import os
+import sys
 import json
-import pdfplumber
 from pathlib import Path
 from datetime import datetime, timezone
-from collections import defaultdict
-from github import Github, InputFileContent
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import gist_publish, gist_upload
+from font_tiers import FontProfile
+from page_map import PageMap, changed_ranges, page_hashes
+from pdf_layout import PDF_WORKERS, PageTextSpool, analyze_pdf, peak_memory_mb
 
 # Paths
 SCRIPT_DIR = Path(__file__).parent
 PDF_PATH = SCRIPT_DIR.parent.parent / "docs" / "archive" / "Aoasm.pdf"
 OUTPUT_DIR = SCRIPT_DIR.parent.parent / "docs" / "clueless-mind"
 PUBLIC_DIR = SCRIPT_DIR.parent.parent / "public" / "docs" / "clueless-mind"
+MANIFEST_FILE = OUTPUT_DIR / "gist_manifest.json"
+PAGE_MAP_FILE = OUTPUT_DIR / "page_map.json"
 
 # Book configuration
 NOVEL_TITLE = "Clueless Mind"
 GIST_ID_ENV_VAR = "CLUELESS_MIND_GIST_ID"
 GIST_TOKEN_ENV_VAR = "GIST_TOKEN"
 
-
-def detect_chapter_pages(pdf):
-    """Detect pages where chapters start based on large font size (72pt)."""
-    chapter_pages = []
-    
-    for page_num in range(len(pdf.pages)):
-        page = pdf.pages[page_num]
-        chars = page.chars
-        
-        if not chars:
-            continue
-        
-        # Group characters by line (y-position)
-        lines = defaultdict(list)
-        for char in chars:
-            y = round(char['top'])
-            lines[y].append(char)
-        
-        # Check first few lines for large text
-        for y in sorted(lines.keys())[:5]:
-            line_chars = lines[y]
-            if not line_chars:
-                continue
-            
-            # Get average font size for this line
-            avg_size = sum(c.get('size', 0) for c in line_chars) / len(line_chars)
-            
-            # Get the text content
-            line_text = ''.join(c.get('text', '') for c in line_chars).strip()
-            
-            # Look for 72pt text (chapter starts)
-            if avg_size >= 70 and len(line_text) > 2:
-                # Skip page numbers and very short text
-                if not line_text.isdigit() and len(line_text.split()) >= 2:
-                    chapter_pages.append({
-                        'page': page_num,
-                        'start_text': line_text[:100]
-                    })
-                    break
-    
-    return chapter_pages
+# Chapter headings sit in the first lines of their page
+HEADING_LINES = 5
 
 
-def extract_chapter_text(pdf, start_page, end_page):
-    """Extract text from a range of pages."""
-    chapter_text = []
+def detect_chapter_pages(profile):
+    """
+    Detect pages where chapters start, from the document's own heading tiers.
     
-    for page_num in range(start_page, end_page):
-        if page_num >= len(pdf.pages):
-            break
-        
-        page = pdf.pages[page_num]
-        text = page.extract_text()
-        
-        if text:
-            chapter_text.append(text)
+    A chapter starts on a page whose first lines include a heading in the
+    chapter tier (the largest heading size that opens several pages; 72pt
+    in Aoasm.pdf).
     
-    return '\n\n'.join(chapter_text)
+    Args:
+        profile: FontProfile fed with every page of the book
+    
+    Returns:
+        list: Dicts with the zero-based page index and start text of each chapter
+    """
+    tier = profile.chapter_tier()
+    if tier is None:
+        return []
+    return [
+        {'page': heading['page'], 'start_text': heading['text']}
+        for heading in profile.headings(tier['min'])
+    ]
 
 
 def clean_chapter_text(text):
@@ -134,26 +114,58 @@ def save_file(filepath, content):
         f.write(content)
 
 
-def _sanitize_gist_files(files: dict) -> dict:
+def save_file_if_changed(filepath, content):
+    """Save text content to a file unless it already holds exactly that; return True if written."""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    save_file(filepath, content)
+    return True
+
+
+def spool_pages(page_nums, workers, spool, spooled, page_map=None, hashes=None):
     """
-    Ensure values passed to gist.edit are either None or InputFileContent instances.
+    Analyze pages and spool their texts, optionally caching them in the page map.
+    
+    Args:
+        page_nums: Sorted zero-based page indexes to analyze
+        workers: Processes analyzing pages in parallel
+        spool: PageTextSpool receiving the page texts
+        spooled: Dict of page index to spool index, updated in place
+        page_map: PageMap to cache the pages' detection slices in
+        hashes: Page content hashes, required with page_map
     """
-    sanitized = {}
-    for name, value in (files or {}).items():
-        if value is None:
-            sanitized[name] = None
-        elif isinstance(value, InputFileContent):
-            sanitized[name] = value
-        elif isinstance(value, dict):
-            content = value.get('content', str(value))
-            sanitized[name] = InputFileContent(content)
-        else:
-            sanitized[name] = InputFileContent(str(value))
-    return sanitized
+    for start, end in changed_ranges(page_nums):
+        for page in analyze_pdf(PDF_PATH, workers, start, end):
+            spooled[page['page']] = len(spool)
+            spool.add(page['text'])
+            if page_map is not None:
+                page_map.update_page(page['page'], hashes[page['page']], page)
+
+
+def chapters_index_unchanged(path, chapters_json):
+    """Return True if a saved chapters.json matches chapters_json apart from last_updated."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    saved.pop("last_updated", None)
+    return saved == {key: value for key, value in chapters_json.items() if key != "last_updated"}
 
 
 def main():
     """Main execution function."""
+    parser = argparse.ArgumentParser(description="Extract Clueless Mind chapters from the PDF")
+    parser.add_argument("--workers", type=int, default=PDF_WORKERS,
+                        help="Processes analyzing pages in parallel (default: PDF_WORKERS or 1)")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the page map and re-extract every page and chapter")
+    args = parser.parse_args()
+    
     print("=" * 80)
     print("Clueless Mind - Chapter Extraction")
     print("=" * 80)
@@ -165,30 +177,81 @@ def main():
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     PUBLIC_DIR.mkdir(parents=True, exist_ok=True)
     
-    # Open PDF and detect chapters
-    print("Opening PDF and detecting chapters...")
-    with pdfplumber.open(PDF_PATH) as pdf:
-        total_pages = len(pdf.pages)
-        print(f"Total pages: {total_pages}")
+    # Hash every page (cheap: no layout parse) and compare with the last run
+    page_map = PageMap(PAGE_MAP_FILE, HEADING_LINES)
+    # Chapters of the last run, kept so a --full run can still sweep the stale ones
+    previous = set(page_map.chapters)
+    if args.full:
+        page_map.clear()
+    hashes = page_hashes(PDF_PATH)
+    total_pages = len(hashes)
+    changed = page_map.changed_pages(hashes)
+    page_map.truncate(total_pages)
+    print(f"Total pages: {total_pages} ({len(changed)} changed since the last run)")
+    
+    with PageTextSpool() as spool:
+        # Only changed pages go through layout analysis; their texts wait in a
+        # spool on disk, the rest of the book comes from the page map
+        spooled = {}
+        if changed:
+            print(f"Analyzing page layout of {len(changed)} pages ({args.workers} workers)...")
+            spool_pages(changed, args.workers, spool, spooled, page_map, hashes)
+        
+        profile = FontProfile(heading_lines=HEADING_LINES)
+        for page_num in range(total_pages):
+            profile.add(page_map.cached_record(page_num))
+        print(profile.describe())
         
         # Detect chapter boundaries
-        chapter_pages = detect_chapter_pages(pdf)
-        print(f"Detected {len(chapter_pages)} chapters\n")
+        chapter_pages = detect_chapter_pages(profile)
+        tier = profile.chapter_tier()
+        if tier:
+            print(f"Detected {len(chapter_pages)} chapters (headings of {tier['min']:.1f}pt and up)\n")
+        else:
+            print("⚠ No heading tier found; no chapters detected\n")
         
-        # Process each chapter
+        # Keep chapters whose pages, boundaries and file are all as last recorded
+        changed = set(changed)
         chapters_data = []
-        
         for i, chapter_info in enumerate(chapter_pages, 1):
             start_page = chapter_info['page']
             # End page is start of next chapter (or end of book)
             end_page = chapter_pages[i]['page'] if i < len(chapter_pages) else total_pages
+            chapter_filename = f"chapter_{i:03d}.md"
+            chapter_path = OUTPUT_DIR / chapter_filename
+            file_sha = gist_upload.file_blob_sha(chapter_path) if chapter_path.exists() else None
+            kept = page_map.unchanged_chapter(chapter_filename, start_page, end_page, changed, file_sha)
+            chapters_data.append({
+                "chapter": i,
+                "filename": chapter_filename,
+                "chapter_name": kept["chapter_name"] if kept else None,
+                "start": start_page,
+                "end": end_page,
+                "sha": file_sha,
+                "start_text": chapter_info['start_text'],
+            })
+        
+        # Rebuilt chapters also need the text of their unchanged pages
+        rebuild = [c for c in chapters_data if c["chapter_name"] is None]
+        missing = sorted({
+            page_num for c in rebuild for page_num in range(c["start"], c["end"])
+            if page_num not in spooled
+        })
+        if missing:
+            print(f"Reading the text of {len(missing)} unchanged pages in changed chapters...")
+            spool_pages(missing, args.workers, spool, spooled)
+        
+        # Process each changed chapter
+        written = 0
+        for chapter in rebuild:
+            print(f"Processing Chapter {chapter['chapter']}...")
+            print(f"  Pages: {chapter['start'] + 1} to {chapter['end']}")
+            print(f"  Start text: {chapter['start_text']}")
             
-            print(f"Processing Chapter {i}...")
-            print(f"  Pages: {start_page + 1} to {end_page}")
-            print(f"  Start text: {chapter_info['start_text']}")
-            
-            # Extract chapter text
-            chapter_text = extract_chapter_text(pdf, start_page, end_page)
+            # Read the chapter's page texts back from the spool
+            chapter_text = '\n\n'.join(
+                text for text in (spool.get(spooled[n]) for n in range(chapter['start'], chapter['end'])) if text
+            )
             
             # Clean the chapter text (remove standalone numbers)
             cleaned_text = clean_chapter_text(chapter_text)
@@ -199,22 +262,32 @@ def main():
             # Create chapter markdown with first three words as title
             chapter_md = f"# {first_three_words}\n\n{cleaned_text}"
             
-            # Save chapter file
-            chapter_filename = f"chapter_{i:03d}.md"
-            chapter_path = OUTPUT_DIR / chapter_filename
-            save_file(chapter_path, chapter_md)
-            
-            print(f"  Saved: {chapter_filename} ({len(cleaned_text)} characters)")
+            # Save chapter file, unless a shifted boundary left its content as it was
+            if save_file_if_changed(OUTPUT_DIR / chapter['filename'], chapter_md):
+                written += 1
+                print(f"  Saved: {chapter['filename']} ({len(cleaned_text)} characters)")
+            else:
+                print(f"  Unchanged: {chapter['filename']}")
             print(f"  Title: {first_three_words}")
             
-            # Add to chapters data
-            chapters_data.append({
-                "chapter": i,
-                "filename": chapter_filename,
-                "chapter_name": first_three_words
-            })
+            chapter["chapter_name"] = first_three_words
+            chapter["sha"] = gist_publish.blob_sha(chapter_md)
     
-    print(f"\n✓ Extracted {len(chapters_data)} chapters")
+    # Chapter files past the end of a book that lost chapters are stale
+    current = {c["filename"] for c in chapters_data}
+    for filename in sorted(previous - current):
+        (OUTPUT_DIR / filename).unlink(missing_ok=True)
+        print(f"Removed stale {filename}")
+    
+    page_map.save([
+        {key: c[key] for key in ("filename", "start", "end", "chapter_name", "sha")}
+        for c in chapters_data
+    ])
+    print(f"\n✓ Extracted {len(chapters_data)} chapters from {total_pages} pages "
+          f"({written} written, {len(chapters_data) - len(rebuild)} unchanged)")
+    own_mb, worker_mb = peak_memory_mb()
+    if own_mb is not None:
+        print(f"  Peak memory: {own_mb:.1f} MB" + (f" (largest worker {worker_mb:.1f} MB)" if args.workers > 1 else ""))
     
     # Create README.md
     readme_content = f"""# {NOVEL_TITLE}
@@ -228,8 +301,8 @@ Generated by the mockpoet platform.
 This book contains {len(chapters_data)} chapters.
 
 """
-    save_file(OUTPUT_DIR / "README.md", readme_content)
-    print("✓ Created README.md")
+    if save_file_if_changed(OUTPUT_DIR / "README.md", readme_content):
+        print("✓ Created README.md")
     
     # Create chapters.json
     timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
@@ -251,16 +324,19 @@ This book contains {len(chapters_data)} chapters.
         chapters_json["chapters"].append({
             "chapter": chapter_info["chapter"],
             "filename": chapter_info["filename"],
-            "url": f"https://gist.githubusercontent.com/pappater/{gist_id}/raw/{chapter_info['filename']}",
-            "gist_url": f"https://gist.github.com/{gist_id}#{chapter_info['filename']}",
+            "url": gist_publish.raw_url(gist_id, chapter_info["filename"]),
+            "gist_url": gist_publish.html_url(gist_id, chapter_info["filename"]),
             "chapter_name": chapter_info["chapter_name"]
         })
     
-    # Save chapters.json
-    chapters_json_str = json.dumps(chapters_json, indent=2)
-    save_file(OUTPUT_DIR / "chapters.json", chapters_json_str)
-    save_file(PUBLIC_DIR / "chapters.json", chapters_json_str)
-    print("✓ Created chapters.json")
+    # Save chapters.json, unless only its timestamp would change
+    if chapters_index_unchanged(OUTPUT_DIR / "chapters.json", chapters_json):
+        print("✓ chapters.json is up to date")
+    else:
+        chapters_json_str = json.dumps(chapters_json, indent=2)
+        save_file(OUTPUT_DIR / "chapters.json", chapters_json_str)
+        save_file(PUBLIC_DIR / "chapters.json", chapters_json_str)
+        print("✓ Created chapters.json")
     
     # Upload to Gist if credentials are available
     gist_token = os.environ.get(GIST_TOKEN_ENV_VAR)
@@ -272,36 +348,36 @@ This book contains {len(chapters_data)} chapters.
         
         try:
             # Connect to GitHub
-            gh = Github(gist_token)
-            gist = gh.get_gist(gist_id)
+            gh = gist_publish.connect(gist_token)
+            gist = gist_publish.get_gist_metadata(gh, gist_id)
             print(f"Connected to Gist: {gist.html_url}")
             
-            # Prepare files for upload
-            gist_files = {
-                "README.md": InputFileContent(readme_content)
-            }
-            
-            # Add all chapter files
+            # Chapter files are streamed from disk in size-bounded batches;
+            # chapters.json goes last, once every chapter has landed. The
+            # manifest skips every chapter whose hash did not change
+            gist_files = {"README.md": OUTPUT_DIR / "README.md"}
             for chapter_info in chapters_data:
-                chapter_filename = chapter_info["filename"]
-                chapter_path = OUTPUT_DIR / chapter_filename
-                with open(chapter_path, 'r', encoding='utf-8') as f:
-                    chapter_content = f.read()
-                gist_files[chapter_filename] = InputFileContent(chapter_content)
+                gist_files[chapter_info["filename"]] = OUTPUT_DIR / chapter_info["filename"]
             
-            # Add chapters.json
-            gist_files["chapters.json"] = InputFileContent(chapters_json_str)
+            # Chapters the book no longer has are deleted from the Gist (after
+            # chapters.json stops listing them); the manifest knows what it holds
+            published = gist_publish.GistManifest(MANIFEST_FILE, gist).hashes
+            for filename in sorted(published):
+                if filename.startswith("chapter_") and filename.endswith(".md") and filename not in gist_files:
+                    gist_files[filename] = None
             
-            # Upload all files to Gist
-            print(f"Uploading {len(gist_files)} files to Gist...")
-            sanitized_files = _sanitize_gist_files(gist_files)
-            gist.edit(files=sanitized_files)
-            print(f"✓ Successfully uploaded {len(gist_files)} files to Gist")
+            upload = gist_upload.upload_files(
+                gist, gist_files, MANIFEST_FILE,
+                index_files={"chapters.json": OUTPUT_DIR / "chapters.json"}
+            )
+            print(f"✓ Successfully uploaded {upload['sent']} files to Gist in {upload['batches']} batches "
+                  f"({upload['deleted']} deleted, {upload['skipped']} already up to date)")
             print(f"✓ Gist URL: {gist.html_url}")
             
         except Exception as e:
             print(f"ERROR uploading to Gist: {e}")
-            print("Files were saved locally but not uploaded to Gist.")
+            print("Files were saved locally; batches that landed are recorded in "
+                  f"{MANIFEST_FILE.name}, so a rerun only uploads the rest.")
     else:
         print()
         print("=" * 80)
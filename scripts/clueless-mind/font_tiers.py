@@ -0,0 +1,147 @@
+"""
+Adaptive heading detection from a document-wide font-size histogram.
+
+Chapter detection used to rely on hand-tuned thresholds (72pt headings in
+extract_chapters.py, anything over 13pt in detect_chapters.py), which had
+to be re-tuned for every new PDF. FontProfile instead learns the sizes
+from the document itself:
+
+- the body size is the peak of the document's font-size histogram
+  (HISTOGRAM_BIN wide bins, weighted by character count)
+- heading candidates are lines that read like a heading (more than two
+  characters, not a bare number, at least two words) and are at least
+  HEADING_MIN_RATIO times the body size
+- the candidate sizes are split into tiers wherever two neighbouring
+  sizes are more than TIER_GAP_RATIO apart, largest tier first
+- the chapter tier is the largest tier that opens at least
+  MIN_CHAPTER_PAGES pages, so a one-off title page does not count
+
+The profile is fed one page record (see pdf_layout) at a time and keeps
+only the per-page size histograms and the heading-like lines, so it works
+on a streamed book.
+"""
+
+from collections import Counter
+
+import numpy as np
+
+# Width of the document histogram's bins, in points
+HISTOGRAM_BIN = 0.5
+
+# A heading is at least this many times the body text size
+HEADING_MIN_RATIO = 1.15
+
+# Neighbouring heading sizes further apart than this ratio form separate tiers
+TIER_GAP_RATIO = 1.1
+
+# The chapter tier must open at least this many pages
+MIN_CHAPTER_PAGES = 2
+
+
+def is_heading_text(text):
+    """Return True if a line reads like a heading rather than a page number or fragment."""
+    return len(text) > 2 and not text.isdigit() and len(text.split()) >= 2
+
+
+class FontProfile:
+    """Font-size histogram and heading tiers of one document."""
+
+    def __init__(self, heading_lines=None):
+        """
+        Args:
+            heading_lines: Only the first this many lines of a page can be
+                headings (None considers every line)
+        """
+        self.heading_lines = heading_lines
+        self.histogram = Counter()
+        self._pages = []
+        self._sizes = []
+        self._texts = []
+
+    def add(self, page):
+        """Add a page record's font sizes and heading-like lines."""
+        self.histogram.update(page['font_sizes']['histogram'])
+        for line in page['lines'][:self.heading_lines]:
+            if is_heading_text(line['text']):
+                self._pages.append(page['page'])
+                self._sizes.append(line['size'])
+                self._texts.append(line['text'][:100])
+
+    def body_size(self):
+        """Return the most common font size, from the binned document histogram (None if empty)."""
+        if not self.histogram:
+            return None
+        sizes = np.fromiter(self.histogram.keys(), dtype=float, count=len(self.histogram))
+        counts = np.fromiter(self.histogram.values(), dtype=float, count=len(self.histogram))
+        low = np.floor(sizes.min() / HISTOGRAM_BIN) * HISTOGRAM_BIN
+        edges = np.arange(low, sizes.max() + 2 * HISTOGRAM_BIN, HISTOGRAM_BIN)
+        binned, edges = np.histogram(sizes, bins=edges, weights=counts)
+        peak = np.argmax(binned)
+        # Report the most common exact size inside the peak bin
+        in_peak = (sizes >= edges[peak]) & (sizes < edges[peak + 1])
+        return float(sizes[in_peak][np.argmax(counts[in_peak])])
+
+    def tiers(self):
+        """
+        Return the heading tiers, largest first.
+
+        Returns:
+            list: Dicts with the tier's min and max size (points) and the
+                number of pages it appears on
+        """
+        body = self.body_size()
+        if body is None or not self._sizes:
+            return []
+
+        pages = np.asarray(self._pages)
+        sizes = np.round(np.asarray(self._sizes), 1)
+        heading_sizes = np.unique(sizes[sizes >= body * HEADING_MIN_RATIO])
+        if not heading_sizes.size:
+            return []
+
+        splits = np.nonzero(heading_sizes[1:] / heading_sizes[:-1] > TIER_GAP_RATIO)[0] + 1
+        tiers = []
+        for group in np.split(heading_sizes, splits):
+            in_tier = (sizes >= group[0]) & (sizes <= group[-1])
+            tiers.append({
+                'min': float(group[0]),
+                'max': float(group[-1]),
+                'pages': int(np.unique(pages[in_tier]).size),
+            })
+        return tiers[::-1]
+
+    def chapter_tier(self):
+        """Return the largest tier that opens at least MIN_CHAPTER_PAGES pages (or the largest one), or None."""
+        tiers = self.tiers()
+        for tier in tiers:
+            if tier['pages'] >= MIN_CHAPTER_PAGES:
+                return tier
+        return tiers[0] if tiers else None
+
+    def headings(self, min_size):
+        """
+        Return the first heading of each page set in at least min_size points.
+
+        Args:
+            min_size: Smallest heading size, e.g. a tier's min
+
+        Returns:
+            list: Dicts with the zero-based page index, text and font size, in page order
+        """
+        found = {}
+        for page_num, size, text in zip(self._pages, self._sizes, self._texts):
+            if page_num not in found and round(size, 1) >= min_size:
+                found[page_num] = {'page': page_num, 'text': text, 'font_size': size}
+        return [found[page_num] for page_num in sorted(found)]
+
+    def describe(self):
+        """Return a one-line summary of the body size and heading tiers."""
+        body = self.body_size()
+        if body is None:
+            return "No text found"
+        tiers = ", ".join(
+            f"{t['min']:.1f}pt ({t['pages']} pages)" if t['min'] == t['max']
+            else f"{t['min']:.1f}-{t['max']:.1f}pt ({t['pages']} pages)"
+            for t in self.tiers()
+        )
+        return f"Body text {body:.1f}pt; heading tiers: {tiers or 'none'}"
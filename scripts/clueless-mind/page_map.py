@@ -0,0 +1,227 @@
+"""
+Page-map sidecar for incremental Clueless Mind extraction.
+
+Every run used to re-analyze every page of the PDF, rewrite every chapter
+file and hand every chapter to the uploader. The page map records what the
+last run saw, so a re-run only redoes the work a changed page causes:
+
+- pages: each page's content hash, plus the slice of its analysis that
+  chapter detection needs (its font-size histogram and first heading
+  lines), so unchanged pages are never parsed again
+- chapters: each chapter file's page range, title and blob hash, so a
+  chapter whose pages and boundaries are unchanged is neither rebuilt nor
+  rewritten
+
+A page's hash covers its size, its decoded content streams and
+everything its text depends on through its resources: the font
+dictionaries (encodings, ToUnicode maps, widths, descendant fonts) and
+the Form XObjects it draws, recursively with their own resources. Only
+embedded font programs and image data are left out, since neither changes
+the extracted text. pdfminer decodes all of this without the layout parse
+that makes up most of an extraction's runtime. The map is dropped (and
+the whole book re-analyzed) when it was written for a different number of
+heading lines or by an older format.
+"""
+
+import hashlib
+import json
+
+import pdfplumber
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
+from pdfminer.psparser import LIT
+
+# Bump when the cached page slice or the page hash changes
+PAGE_MAP_VERSION = 2
+
+# Resource types that can change a page's text
+TEXT_RESOURCES = ("Font", "XObject")
+
+# Image data and font programs (glyph shapes only) never change the text
+IMAGE = LIT("Image")
+FONT_PROGRAM_KEYS = {"FontFile", "FontFile2", "FontFile3"}
+
+# Heading lines are cached truncated, as FontProfile keeps them
+CACHED_TEXT_CHARS = 100
+
+
+def _hash_object(digest, value, seen):
+    """
+    Feed a PDF object into a digest, following references and stream data.
+
+    Args:
+        digest: hashlib object to update
+        value: PDF object (reference, dict, list, stream or plain value)
+        seen: Object ids already hashed on this page, to stop at cycles
+    """
+    if isinstance(value, PDFObjRef):
+        if value.objid in seen:
+            digest.update(b"<seen>")
+            return
+        seen.add(value.objid)
+        value = resolve1(value)
+    if isinstance(value, PDFStream):
+        # Form XObjects, ToUnicode maps and encoding streams: their decoded data counts
+        if resolve1(value.attrs.get("Subtype")) is IMAGE:
+            digest.update(b"<image>")
+        else:
+            digest.update(value.get_data())
+        value = {key: item for key, item in value.attrs.items() if key not in ("Length", "Filter", "DecodeParms")}
+    if isinstance(value, dict):
+        for key in sorted(value, key=str):
+            if key in FONT_PROGRAM_KEYS:
+                continue
+            digest.update(f"{key}:".encode("utf-8"))
+            _hash_object(digest, value[key], seen)
+        digest.update(b";")
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _hash_object(digest, item, seen)
+        digest.update(b";")
+    else:
+        digest.update(repr(value).encode("utf-8"))
+
+
+def page_hash(page):
+    """
+    Return a content hash of a pdfplumber page without parsing its layout.
+
+    Args:
+        page: pdfplumber Page
+
+    Returns:
+        str: SHA-256 hex digest of the page's size, content streams, fonts
+            and Form XObjects
+    """
+    page_obj = page.page_obj
+    digest = hashlib.sha256(repr(tuple(page_obj.mediabox)).encode("ascii"))
+    resources = page_obj.resources or {}
+    seen = set()
+    for kind in TEXT_RESOURCES:
+        digest.update(f"{kind}=".encode("ascii"))
+        _hash_object(digest, resources.get(kind), seen)
+    for stream in page_obj.contents:
+        _hash_object(digest, stream, seen)
+    return digest.hexdigest()
+
+
+def page_hashes(pdf_path):
+    """Return the content hash of every page of a PDF, in page order."""
+    with pdfplumber.open(pdf_path) as pdf:
+        return [page_hash(page) for page in pdf.pages]
+
+
+def changed_ranges(page_nums):
+    """Group sorted page indexes into contiguous (start, end) ranges."""
+    ranges = []
+    for page_num in page_nums:
+        if ranges and ranges[-1][1] == page_num:
+            ranges[-1][1] = page_num + 1
+        else:
+            ranges.append([page_num, page_num + 1])
+    return [tuple(r) for r in ranges]
+
+
+class PageMap:
+    """Page hashes, cached page slices and chapter boundaries of the last extraction, kept in a JSON sidecar."""
+
+    def __init__(self, path, heading_lines):
+        """
+        Load the page map, starting empty when it is missing or stale.
+
+        Args:
+            path: Path of the JSON sidecar
+            heading_lines: Heading lines cached per page (HEADING_LINES of the extractor)
+        """
+        self.path = path
+        self.heading_lines = heading_lines
+        self.pages = []
+        self.chapters = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("version") != PAGE_MAP_VERSION or data.get("heading_lines") != heading_lines:
+            return
+        self.pages = data.get("pages", [])
+        self.chapters = {chapter["filename"]: chapter for chapter in data.get("chapters", [])}
+
+    def clear(self):
+        """Forget every recorded page and chapter, forcing a full extraction."""
+        self.pages = []
+        self.chapters = {}
+
+    def changed_pages(self, hashes):
+        """Return the indexes of pages whose hash differs from the map (or that it lacks)."""
+        return [
+            page_num for page_num, page_hash in enumerate(hashes)
+            if page_num >= len(self.pages) or self.pages[page_num]["hash"] != page_hash
+        ]
+
+    def cached_record(self, page_num):
+        """
+        Return an unchanged page's cached slice as a page record for FontProfile.add.
+
+        The record has no text; the text is only read again when a chapter
+        containing the page is rebuilt.
+        """
+        cached = self.pages[page_num]
+        return {
+            'page': page_num,
+            'lines': cached["lines"],
+            'font_sizes': {'histogram': {float(size): count for size, count in cached["histogram"].items()}},
+        }
+
+    def update_page(self, page_num, page_hash, record):
+        """Cache the detection slice of a freshly analyzed page record."""
+        cached = {
+            "hash": page_hash,
+            "histogram": {str(size): count for size, count in record['font_sizes']['histogram'].items()},
+            "lines": [
+                {"text": line['text'][:CACHED_TEXT_CHARS], "size": line['size']}
+                for line in record['lines'][:self.heading_lines]
+            ],
+        }
+        if page_num < len(self.pages):
+            self.pages[page_num] = cached
+        else:
+            self.pages.append(cached)
+
+    def truncate(self, total_pages):
+        """Drop pages past the end of a book that got shorter."""
+        del self.pages[total_pages:]
+
+    def unchanged_chapter(self, filename, start_page, end_page, changed, file_sha):
+        """
+        Return the recorded chapter if its file can be kept as it is, else None.
+
+        Args:
+            filename: Chapter file name
+            start_page: First page index of the chapter in this run
+            end_page: Page index the chapter stops before
+            changed: Set of page indexes whose content changed
+            file_sha: Blob hash of the chapter file on disk (None if missing)
+        """
+        chapter = self.chapters.get(filename)
+        if (chapter is None or chapter["start"] != start_page or chapter["end"] != end_page
+                or chapter["sha"] != file_sha):
+            return None
+        if any(page_num in changed for page_num in range(start_page, end_page)):
+            return None
+        return chapter
+
+    def save(self, chapters):
+        """
+        Record this run's chapters and save the page map.
+
+        Args:
+            chapters: Dicts with each chapter's filename, start, end, chapter_name and sha
+        """
+        self.chapters = {chapter["filename"]: chapter for chapter in chapters}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": PAGE_MAP_VERSION,
+                "heading_lines": self.heading_lines,
+                "pages": self.pages,
+                "chapters": chapters,
+            }, f, indent=2)
@@ -0,0 +1,255 @@
+"""
+Single-pass layout analysis of a PDF.
+
+Chapter detection needs each page's lines of characters with their font
+sizes, and chapter assembly needs each page's extracted text. Both used to
+walk the book separately. analyze_page reads a page once and returns a
+compact record holding everything later steps use:
+
+- page: zero-based page index
+- lines: character runs grouped by rounded top position, top to bottom,
+  each with its text, average font size and character count
+- font_sizes: character count, smallest, largest and mean size, the
+  most common (body text) size, and a size histogram
+- text: the page's extract_text() output ("" for an empty page)
+
+Per-page statistics are computed with NumPy over arrays of the page's
+character sizes and positions.
+
+The records are plain dicts, so they can be cached, compared or sent
+between processes without keeping pdfplumber's layout objects alive.
+
+pdfplumber caches each page's parsed layout objects for as long as the
+document is open, so a long book used to hold every page's chars in
+memory at once. iter_page_layouts closes each page as soon as its record
+is built, which flushes those caches and keeps memory flat however many
+pages the book has.
+
+Layout parsing is CPU-bound and independent per page, so analyze_pdf can
+split the page range into chunks across a process pool. Each worker opens
+its own handle on the PDF, and the chunks' records are merged back in page
+order.
+"""
+
+import math
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pdfplumber
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Configuration
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", 1))
+
+# Chunks per worker: more chunks even out pages that take longer to parse
+CHUNKS_PER_WORKER = 4
+
+
+def char_arrays(chars):
+    """
+    Load a page's character positions, sizes and texts for vectorized analysis.
+
+    Args:
+        chars: pdfplumber char dicts of one page
+
+    Returns:
+        tuple: (tops, sizes) as float arrays, and the list of char texts
+    """
+    count = len(chars)
+    tops = np.fromiter((c['top'] for c in chars), dtype=float, count=count)
+    sizes = np.fromiter((c.get('size', 0) for c in chars), dtype=float, count=count)
+    return tops, sizes, [c.get('text', '') for c in chars]
+
+
+def group_lines(tops, sizes, texts):
+    """
+    Group characters into lines by their rounded top position.
+
+    Args:
+        tops, sizes, texts: A page's char arrays from char_arrays
+
+    Returns:
+        list: Lines from top to bottom, each a dict with top, text, size and chars
+    """
+    if not texts:
+        return []
+
+    keys, inverse, counts = np.unique(np.round(tops), return_inverse=True, return_counts=True)
+    mean_sizes = np.bincount(inverse, weights=sizes) / counts
+    # A stable sort keeps each line's chars in their original order
+    order = np.argsort(inverse, kind='stable')
+
+    lines = []
+    for y, size, count, indexes in zip(keys.tolist(), mean_sizes.tolist(), counts.tolist(),
+                                       np.split(order, np.cumsum(counts)[:-1])):
+        lines.append({
+            'top': int(y),
+            'text': ''.join(texts[i] for i in indexes).strip(),
+            'size': size,
+            'chars': count,
+        })
+    return lines
+
+
+def font_size_stats(sizes):
+    """
+    Return the character count, min, max, mean and most common font size of a page,
+    and its size histogram (size rounded to 0.1pt, to character count).
+    """
+    if not sizes.size:
+        return {'chars': 0, 'min': None, 'max': None, 'mean': None, 'body': None, 'histogram': {}}
+
+    values, counts = np.unique(np.round(sizes, 1), return_counts=True)
+    return {
+        'chars': int(sizes.size),
+        'min': float(values[0]),
+        'max': float(values[-1]),
+        'mean': round(float(np.dot(values, counts)) / int(sizes.size), 2),
+        'body': float(values[np.argmax(counts)]),
+        'histogram': dict(zip(values.tolist(), counts.tolist())),
+    }
+
+
+def analyze_page(page, page_num):
+    """
+    Analyze one page: its lines, font sizes and text, from a single layout parse.
+
+    Args:
+        page: pdfplumber Page
+        page_num: Zero-based page index
+
+    Returns:
+        dict: Page record (see module docstring)
+    """
+    chars = page.chars
+    tops, sizes, texts = char_arrays(chars)
+    return {
+        'page': page_num,
+        'lines': group_lines(tops, sizes, texts),
+        'font_sizes': font_size_stats(sizes),
+        'text': (page.extract_text() if chars else None) or '',
+    }
+
+
+def iter_page_layouts(pdf, start=0, end=None):
+    """
+    Yield a record for each page in a range, in page order.
+
+    Each page is closed once its record is built, flushing pdfplumber's
+    cached layout objects, so memory does not grow with the page count.
+
+    Args:
+        pdf: Open pdfplumber PDF
+        start: First page index
+        end: Page index to stop before (default: end of the document)
+    """
+    end = len(pdf.pages) if end is None else min(end, len(pdf.pages))
+    for page_num in range(start, end):
+        page = pdf.pages[page_num]
+        try:
+            yield analyze_page(page, page_num)
+        finally:
+            page.close()
+
+
+def _analyze_range(task):
+    """Worker entry point: analyze a page range on a handle of its own."""
+    pdf_path, start, end = task
+    with pdfplumber.open(pdf_path) as pdf:
+        return list(iter_page_layouts(pdf, start, end))
+
+
+def page_ranges(total_pages, chunks):
+    """Split range(total_pages) into at most chunks contiguous (start, end) ranges."""
+    size = max(1, math.ceil(total_pages / max(1, chunks)))
+    return [(start, min(start + size, total_pages)) for start in range(0, total_pages, size)]
+
+
+def analyze_pdf(pdf_path, workers=PDF_WORKERS, start=0, end=None):
+    """
+    Yield a record for each page of a PDF, in page order, using up to workers processes.
+
+    Args:
+        pdf_path: Path of the PDF
+        workers: Worker processes (1 analyzes in this process)
+        start: First page index
+        end: Page index to stop before (default: end of the document)
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        total_pages = len(pdf.pages)
+        end = total_pages if end is None else min(end, total_pages)
+        if workers <= 1 or end - start <= 1:
+            yield from iter_page_layouts(pdf, start, end)
+            return
+
+    tasks = [
+        (str(pdf_path), start + chunk_start, start + chunk_end)
+        for chunk_start, chunk_end in page_ranges(end - start, workers * CHUNKS_PER_WORKER)
+    ]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        # map returns chunks in submission order, which is page order
+        for records in pool.map(_analyze_range, tasks):
+            yield from records
+
+
+def peak_memory_mb():
+    """
+    Return the peak resident memory of this process and of its finished worker processes.
+
+    Returns:
+        tuple: (own MB, largest worker MB), or (None, None) where getrusage is unavailable
+    """
+    if resource is None:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(workers, 1)
+
+
+class PageTextSpool:
+    """
+    Page texts kept in a temporary file while a book is streamed.
+
+    Chapter boundaries are only known once the whole document's font sizes
+    have been seen, so the text has to wait; spooling it to disk keeps
+    memory flat instead of holding the book.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._spans = []
+
+    def __len__(self):
+        return len(self._spans)
+
+    def add(self, text):
+        """Append the next page's text."""
+        data = text.encode('utf-8')
+        self._spans.append((self._file.tell(), len(data)))
+        self._file.write(data)
+
+    def get(self, page_num):
+        """Return the text of a page, by zero-based index."""
+        offset, length = self._spans[page_num]
+        self._file.seek(offset)
+        data = self._file.read(length)
+        self._file.seek(0, os.SEEK_END)
+        return data.decode('utf-8')
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
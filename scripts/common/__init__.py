@@ -0,0 +1,10 @@
+"""
+Shared helpers for the mockpoet generator scripts.
+
+Each generator lives in its own directory under scripts/ and is run directly
+(e.g. ``python scripts/novel/novel_daily_to_gist.py``), so scripts put the
+parent scripts/ directory on sys.path and import from here:
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from common import generation
+"""
@@ -0,0 +1,89 @@
+"""
+Incremental metadata index for the poem and story collections.
+
+The collection scripts used to rebuild chapters.json by reading the content
+of every published item from the gist on every run, to recover its title
+and the metadata comments appended to it. The index keeps that metadata in
+a JSON Lines sidecar instead: each run appends one record for the item it
+publishes, and chapters.json is built from the sidecar without touching
+the gist's file contents. ``rebuild`` regenerates the sidecar from the gist
+when it is missing or needs repair.
+"""
+
+import json
+import os
+
+# Metadata comments appended to published items, e.g. <!-- Published: ... -->
+METADATA_PREFIX = "<!-- "
+METADATA_SUFFIX = " -->"
+
+
+def parse_metadata(content, fields, tail_lines=5):
+    """
+    Read metadata comments from the end of a published item.
+
+    Args:
+        content: Item text as published
+        fields: Mapping of comment label (e.g. "Published") to record key
+        tail_lines: Number of trailing lines to search
+
+    Returns:
+        dict: Record keys to values for every label found
+    """
+    metadata = {}
+    for line in content.split("\n")[-tail_lines:]:
+        line = line.strip()
+        if not (line.startswith(METADATA_PREFIX) and line.endswith(METADATA_SUFFIX)):
+            continue
+        label, _, value = line[len(METADATA_PREFIX):-len(METADATA_SUFFIX)].partition(": ")
+        if label in fields:
+            metadata[fields[label]] = value.strip()
+    return metadata
+
+
+class CollectionIndex:
+    """Per-item metadata records stored one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def records(self):
+        """
+        Load every record, ordered by item number.
+
+        Returns:
+            list: Record dicts; when an item appears twice the last record wins
+        """
+        by_number = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from an interrupted append
+                        continue
+                    by_number[record["chapter"]] = record
+        except FileNotFoundError:
+            pass
+        return [by_number[n] for n in sorted(by_number)]
+
+    def append(self, record):
+        """Append the record for a newly published item."""
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def rebuild(self, records):
+        """Replace the index with the given records."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in sorted(records, key=lambda r: r["chapter"]):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,94 @@
+"""
+Context caching for static canon documents (series bible, outline).
+
+Full-book runs resend the same canon on every chapter call. A context cache
+uploads that canon once per run and lets each call reference it, so only
+the per-chapter part of the prompt is sent (and billed) as fresh input.
+
+Two implementations share one interface:
+
+- ProviderContextCache uses Gemini's cached content API
+- LocalContextCache is an offline stand-in that emulates the same contract
+  (TTL, expiry, token accounting) by prepending the canon to each prompt
+
+LLM_CONTEXT_CACHE selects ``provider`` (default, falling back to local when
+the provider rejects the cache, e.g. below its minimum size), ``local`` or
+``off``.
+"""
+
+import hashlib
+import os
+import time
+from datetime import timedelta
+
+# Configuration
+LLM_CONTEXT_CACHE = os.environ.get("LLM_CONTEXT_CACHE", "provider")
+LLM_CONTEXT_CACHE_TTL = int(os.environ.get("LLM_CONTEXT_CACHE_TTL", 4 * 60 * 60))
+
+# Substituted for canon placeholders in prompt templates when the canon is cached
+CACHED_CANON_REFERENCE = "(Provided in full in the cached canon documents above.)"
+
+
+def format_canon(**documents):
+    """Join named canon documents into one text block for caching."""
+    sections = []
+    for name, content in documents.items():
+        title = name.replace("_", " ").upper()
+        sections.append(f"{title}:\n{content}")
+    return "\n\n".join(sections)
+
+
+class LocalContextCache:
+    """Offline stand-in for a provider-side context cache."""
+
+    def __init__(self, name, text, ttl_seconds=LLM_CONTEXT_CACHE_TTL):
+        self.name = name
+        self.text = text
+        self.digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self.expires_at = time.time() + ttl_seconds
+        self.uses = 0
+
+    @property
+    def expired(self):
+        return time.time() >= self.expires_at
+
+    def _check(self):
+        if self.expired:
+            raise RuntimeError(f"Context cache '{self.name}' expired; increase LLM_CONTEXT_CACHE_TTL")
+        self.uses += 1
+
+    def prepare(self, model_factory, model_name, prompt):
+        """Return (model, prompt) to send for a call that references this cache."""
+        self._check()
+        return model_factory(model_name), f"{self.text}\n\n{prompt}"
+
+    def delete(self):
+        self.expires_at = 0
+
+
+class ProviderContextCache(LocalContextCache):
+    """Context cache stored by Gemini and referenced from each call."""
+
+    def __init__(self, genai, name, text, model_name, ttl_seconds=LLM_CONTEXT_CACHE_TTL):
+        super().__init__(name, text, ttl_seconds)
+        caching = getattr(genai, "caching", None)
+        if caching is None:
+            from google.generativeai import caching
+        self._cached_content = caching.CachedContent.create(
+            model=f"models/{model_name}",
+            display_name=name,
+            contents=[text],
+            ttl=timedelta(seconds=ttl_seconds),
+        )
+        self._model = genai.GenerativeModel.from_cached_content(cached_content=self._cached_content)
+
+    def prepare(self, model_factory, model_name, prompt):
+        self._check()
+        return self._model, prompt
+
+    def delete(self):
+        super().delete()
+        try:
+            self._cached_content.delete()
+        except Exception as e:
+            print(f"  Unable to delete context cache '{self.name}': {e}")
@@ -0,0 +1,206 @@
+"""
+Offline stand-in for the google.generativeai SDK.
+
+Selected with LLM_BACKEND=fake. It implements the part of the SDK that
+common.generation uses (configure, GenerativeModel.generate_content with
+streaming and multiple candidates, cached content, list_models), so every
+generator script can run end to end without a GEMINI_API_KEY or network.
+
+Responses are deterministic: the text depends only on the prompt and the
+candidate index, so repeated runs and the response cache behave as they do
+against the real API. Latency, streaming speed and injected errors are
+drawn from a generator seeded with LLM_FAKE_SEED, so a benchmark run is
+repeatable too.
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+# Configuration
+LLM_FAKE_WORDS = int(os.environ.get("LLM_FAKE_WORDS", 400))
+LLM_FAKE_LATENCY = float(os.environ.get("LLM_FAKE_LATENCY", 0.05))
+LLM_FAKE_LATENCY_SIGMA = float(os.environ.get("LLM_FAKE_LATENCY_SIGMA", 0.5))
+LLM_FAKE_TOKENS_PER_SEC = float(os.environ.get("LLM_FAKE_TOKENS_PER_SEC", 0))
+LLM_FAKE_ERROR_RATE = float(os.environ.get("LLM_FAKE_ERROR_RATE", 0))
+LLM_FAKE_ERROR_CODES = [int(c) for c in os.environ.get("LLM_FAKE_ERROR_CODES", "429,500").split(",") if c]
+LLM_FAKE_SEED = int(os.environ.get("LLM_FAKE_SEED", 0))
+
+WORDS = (
+    "the a river morning light old man sea wind road city night rain house "
+    "door window silence voice hand heart fire stone bread wine war letter "
+    "train station bridge field winter summer walked waited remembered said "
+    "looked turned held knew slowly quietly again still there nothing "
+    "everything before after under over between against toward"
+).split()
+
+ERROR_MESSAGES = {
+    429: "Resource has been exhausted (fake quota)",
+    500: "Internal error encountered (fake)",
+    503: "The service is currently unavailable (fake)",
+}
+
+_rng = random.Random(LLM_FAKE_SEED)
+_rng_lock = threading.Lock()
+_stats = {"calls": 0, "errors": 0, "output_words": 0}
+
+
+class FakeAPIError(Exception):
+    """Error carrying an HTTP status code, like google.api_core exceptions."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def configure(api_key=None, **kwargs):
+    pass
+
+
+def get_stats():
+    """Return call, injected error and output word counts so far."""
+    return dict(_stats)
+
+
+def _draw(fn):
+    with _rng_lock:
+        return fn(_rng)
+
+
+def fake_text(prompt, index=0, words=LLM_FAKE_WORDS):
+    """
+    Deterministic pseudo-prose for a prompt.
+
+    Args:
+        prompt: Prompt text (seeds the output)
+        index: Candidate index, so candidates differ from each other
+        words: Number of words to produce
+
+    Returns:
+        str: A markdown title followed by paragraphs of words
+    """
+    seed = hashlib.sha256(f"{index}:{prompt}".encode("utf-8")).digest()
+    rng = random.Random(seed)
+    title = " ".join(rng.choice(WORDS) for _ in range(3)).title()
+    paragraphs = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(40, 90))
+        sentence_words = [rng.choice(WORDS) for _ in range(length)]
+        paragraph = " ".join(sentence_words).capitalize() + "."
+        paragraphs.append(paragraph)
+        remaining -= length
+    return f"# {title}\n\n" + "\n\n".join(paragraphs)
+
+
+def _maybe_fail():
+    if LLM_FAKE_ERROR_RATE and _draw(lambda r: r.random()) < LLM_FAKE_ERROR_RATE:
+        code = _draw(lambda r: r.choice(LLM_FAKE_ERROR_CODES))
+        _stats["errors"] += 1
+        raise FakeAPIError(code, ERROR_MESSAGES.get(code, "Fake error"))
+
+
+def _latency():
+    if LLM_FAKE_LATENCY <= 0:
+        return 0.0
+    return _draw(lambda r: r.lognormvariate(0, LLM_FAKE_LATENCY_SIGMA)) * LLM_FAKE_LATENCY
+
+
+def _word_budget(generation_config):
+    max_tokens = (generation_config or {}).get("max_output_tokens")
+    if max_tokens:
+        # About three words per four tokens
+        return max(1, min(LLM_FAKE_WORDS, max_tokens * 3 // 4))
+    return LLM_FAKE_WORDS
+
+
+def _candidate(text):
+    return SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text=text)]))
+
+
+class FakeResponse:
+    """Non-streaming response with .text, .candidates and .usage_metadata."""
+
+    def __init__(self, texts):
+        self.candidates = [_candidate(text) for text in texts]
+        self.usage_metadata = SimpleNamespace(candidates_token_count=sum(len(t) // 4 for t in texts))
+
+    @property
+    def text(self):
+        if len(self.candidates) != 1:
+            raise ValueError("The `response.text` quick accessor only works for a single candidate.")
+        return self.candidates[0].content.parts[0].text
+
+
+class FakeStream:
+    """Streaming response: iterate to receive chunks with a .text attribute."""
+
+    def __init__(self, text):
+        self._text = text
+        self.usage_metadata = SimpleNamespace(candidates_token_count=len(text) // 4)
+
+    def __iter__(self):
+        pieces = self._text.split(" ")
+        chunk_words = 16
+        for start in range(0, len(pieces), chunk_words):
+            piece = " ".join(pieces[start:start + chunk_words])
+            if start + chunk_words < len(pieces):
+                piece += " "
+            if LLM_FAKE_TOKENS_PER_SEC > 0:
+                time.sleep((len(piece) / 4) / LLM_FAKE_TOKENS_PER_SEC)
+            yield SimpleNamespace(text=piece)
+
+
+class GenerativeModel:
+    """Fake model; generate_content mirrors the SDK signature."""
+
+    def __init__(self, model_name="fake-model", cached_content=None):
+        self.model_name = model_name
+        self._prefix = ""
+        if cached_content is not None:
+            self._prefix = "\n\n".join(cached_content.contents)
+
+    @classmethod
+    def from_cached_content(cls, cached_content):
+        return cls(cached_content.model, cached_content=cached_content)
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        _stats["calls"] += 1
+        time.sleep(_latency())
+        _maybe_fail()
+
+        seed_prompt = f"{self._prefix}{prompt}"
+        words = _word_budget(generation_config)
+        count = (generation_config or {}).get("candidate_count") or 1
+        texts = [fake_text(seed_prompt, i, words) for i in range(count)]
+        _stats["output_words"] += words * count
+        if stream:
+            return FakeStream(texts[0])
+        if LLM_FAKE_TOKENS_PER_SEC > 0:
+            time.sleep(sum(len(t) / 4 for t in texts) / LLM_FAKE_TOKENS_PER_SEC)
+        return FakeResponse(texts)
+
+
+class _CachedContent:
+    def __init__(self, model, display_name, contents, ttl=None):
+        self.model = model
+        self.display_name = display_name
+        self.contents = list(contents)
+        self.ttl = ttl
+
+    @classmethod
+    def create(cls, model, display_name=None, contents=(), ttl=None):
+        return cls(model, display_name, contents, ttl)
+
+    def delete(self):
+        self.contents = []
+
+
+caching = SimpleNamespace(CachedContent=_CachedContent)
+
+
+def list_models():
+    return [SimpleNamespace(name="models/fake-model", supported_generation_methods=["generateContent"])]
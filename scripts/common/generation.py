@@ -0,0 +1,358 @@
+"""
+Shared Gemini generation engine.
+
+Configures the Gemini SDK once per process, keeps one GenerativeModel per
+model name (so the underlying transport stays warm across calls), and caches
+prompt templates after the first read. All generator scripts call
+``generate(prompt, **opts)`` instead of building their own model per call.
+
+Calls made with ``cache=True`` are served from the on-disk response cache
+when the same (model, prompt, config) was generated before, so re-running a
+crashed full-book job does not pay again for the parts that already exist.
+Once the book is complete, the script calls ``clear_response_cache()`` so
+the next run writes a new book instead of replaying this one.
+
+Calls made with ``stream=True`` append chunks to a ``.partial`` checkpoint
+file as they arrive, report time-to-first-token and throughput, and can
+resume from (or discard) a checkpoint left behind by an interrupted run.
+
+Calls made with ``context=<cache>`` reference static canon uploaded once via
+``create_context_cache`` instead of resending it in every prompt.
+
+``generate_candidates(prompt, n)`` asks for several candidates in a single
+call, for callers that pick the best of a few short outputs.
+
+Every API call goes through common.rate_limit, which retries transient
+errors with backoff and keeps concurrent jobs under a shared rate limit.
+
+LLM_BACKEND=fake swaps the Gemini SDK for common.fake_backend, an offline
+model with deterministic output, for benchmarks and local runs without an
+API key.
+"""
+
+import atexit
+import os
+import threading
+import time
+from pathlib import Path
+
+from common import rate_limit
+from common.context_cache import LLM_CONTEXT_CACHE, LocalContextCache, ProviderContextCache
+from common.response_cache import LLM_CACHE_ENABLED, ResponseCache, cache_key
+
+# Configuration
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+# SDK behind generate(): gemini (google.generativeai) or fake (common.fake_backend)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+# What to do with a .partial checkpoint from an interrupted stream: resume or discard
+LLM_PARTIAL_POLICY = os.environ.get("LLM_PARTIAL_POLICY", "resume")
+
+# Appended to the prompt when resuming from a partial checkpoint
+RESUME_INSTRUCTION = (
+    "\n\n---\n\nA previous attempt was interrupted. The text generated so far is "
+    "below. Continue it exactly where it stops, without repeating any of it and "
+    "without any preamble.\n\n{partial}"
+)
+
+# Keys accepted by GenerationConfig; anything else passed to generate() is an error
+GENERATION_CONFIG_KEYS = (
+    "candidate_count",
+    "max_output_tokens",
+    "stop_sequences",
+    "temperature",
+    "top_k",
+    "top_p",
+)
+
+_lock = threading.Lock()
+_genai = None
+_models = {}
+_templates = {}
+_response_cache = None
+_usage = {"api_calls": 0, "cache_hits": 0, "input_tokens": 0, "cached_input_tokens": 0}
+
+
+def _get_genai():
+    """Import and configure the Gemini SDK (or the fake backend) on first use."""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                if LLM_BACKEND == "fake":
+                    from common import fake_backend as genai
+                else:
+                    import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY)
+                _genai = genai
+    return _genai
+
+
+def get_model(model_name=None):
+    """
+    Return the shared GenerativeModel for a model name, creating it once.
+
+    Args:
+        model_name: Gemini model name (defaults to GEMINI_MODEL)
+
+    Returns:
+        genai.GenerativeModel: Model reused for every call in this process
+    """
+    model_name = model_name or GEMINI_MODEL
+    model = _models.get(model_name)
+    if model is None:
+        genai = _get_genai()
+        with _lock:
+            model = _models.get(model_name)
+            if model is None:
+                model = genai.GenerativeModel(model_name)
+                _models[model_name] = model
+    return model
+
+
+def load_template(filepath):
+    """Load a prompt template, reading it from disk only the first time."""
+    key = str(filepath)
+    template = _templates.get(key)
+    if template is None:
+        with open(filepath, "r", encoding="utf-8") as f:
+            template = f.read()
+        _templates[key] = template
+    return template
+
+
+def render_prompt(filepath, **fields):
+    """Load a prompt template (cached) and fill in its placeholders."""
+    return load_template(filepath).format(**fields)
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting prompts (about four characters per token)."""
+    return len(text or "") // 4
+
+
+def get_usage():
+    """Return API call count and estimated input tokens (fresh and cached) so far this run."""
+    return dict(_usage)
+
+
+def get_response_cache():
+    """Return the process-wide response cache, reporting its stats at exit."""
+    global _response_cache
+    if _response_cache is None:
+        with _lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+                atexit.register(lambda: print(_response_cache.stats()))
+    return _response_cache
+
+
+def clear_response_cache():
+    """
+    Empty the on-disk response cache once a book is complete.
+
+    The cache exists to resume an unfinished book after a crash; left in
+    place, it would make the next run replay the finished one.
+    """
+    if LLM_CACHE_ENABLED:
+        get_response_cache().clear()
+        print("✓ Cleared the LLM response cache (book complete)")
+
+
+def create_context_cache(name, text, model_name=None):
+    """
+    Upload static canon once so later calls can reference it with context=.
+
+    Args:
+        name: Display name for the cache
+        text: Canon text (see context_cache.format_canon)
+        model_name: Model the cache is created for (defaults to GEMINI_MODEL)
+
+    Returns:
+        LocalContextCache or ProviderContextCache, or None when disabled
+    """
+    if LLM_CONTEXT_CACHE == "off":
+        return None
+
+    model_name = model_name or GEMINI_MODEL
+    context = None
+    if LLM_CONTEXT_CACHE == "provider":
+        try:
+            context = ProviderContextCache(_get_genai(), name, text, model_name)
+            print(f"✓ Cached canon '{name}' with provider (~{estimate_tokens(text)} tokens)")
+        except Exception as e:
+            print(f"  Provider context cache unavailable ({e}); using local stand-in")
+    if context is None:
+        context = LocalContextCache(name, text)
+        print(f"✓ Cached canon '{name}' locally (~{estimate_tokens(text)} tokens)")
+    atexit.register(context.delete)
+    return context
+
+
+def _split_opts(opts):
+    """Split generate() keyword options into (model_name, generation_config)."""
+    model_name = opts.pop("model", None)
+    unknown = set(opts) - set(GENERATION_CONFIG_KEYS)
+    if unknown:
+        raise TypeError(f"Unknown generation options: {', '.join(sorted(unknown))}")
+    generation_config = {k: v for k, v in opts.items() if v is not None}
+    return model_name, generation_config
+
+
+def generate(prompt, **opts):
+    """
+    Generate text for a fully rendered prompt.
+
+    Args:
+        prompt: Prompt text
+        **opts: ``model`` to override GEMINI_MODEL, ``cache=True`` to use the
+            on-disk response cache, ``stream=True`` with ``partial_path`` to
+            stream into a checkpoint file, ``context`` to reference a cache
+            from create_context_cache(), plus any GenerationConfig field
+            (temperature, max_output_tokens, ...)
+
+    Returns:
+        str: The response text
+    """
+    use_cache = opts.pop("cache", False) and LLM_CACHE_ENABLED
+    stream = opts.pop("stream", False)
+    partial_path = opts.pop("partial_path", None)
+    context = opts.pop("context", None)
+    model_name, generation_config = _split_opts(opts)
+    model_name = model_name or GEMINI_MODEL
+
+    if use_cache:
+        response_cache = get_response_cache()
+        key_config = dict(generation_config, context=context.digest) if context else generation_config
+        key = cache_key(model_name, prompt, key_config)
+        cached = response_cache.get(key)
+        if cached is not None:
+            _usage["cache_hits"] += 1
+            return cached
+
+    _usage["api_calls"] += 1
+    if context:
+        model, prompt = context.prepare(get_model, model_name, prompt)
+        if isinstance(context, ProviderContextCache):
+            _usage["cached_input_tokens"] += estimate_tokens(context.text)
+    else:
+        model = get_model(model_name)
+    _usage["input_tokens"] += estimate_tokens(prompt)
+    if stream:
+        text = rate_limit.call(_generate_streaming, model, prompt, generation_config, partial_path)
+    else:
+        text = rate_limit.call(_generate_once, model, prompt, generation_config)
+
+    if use_cache:
+        response_cache.put(key, text, model_name)
+    return text
+
+
+def generate_candidates(prompt, candidate_count, **opts):
+    """
+    Request several candidate responses in one call.
+
+    Candidates are never served from the response cache, since the point is
+    to get fresh alternatives.
+
+    Args:
+        prompt: Prompt text
+        candidate_count: Number of candidates to request
+        **opts: ``model`` plus any GenerationConfig field (max_output_tokens, ...)
+
+    Returns:
+        list: Text of every candidate that produced any (may be shorter than
+        candidate_count, e.g. when a candidate hit max_output_tokens first)
+    """
+    model_name, generation_config = _split_opts(dict(opts, candidate_count=candidate_count))
+    model = get_model(model_name)
+    _usage["api_calls"] += 1
+    _usage["input_tokens"] += estimate_tokens(prompt)
+    return rate_limit.call(_generate_candidates, model, prompt, generation_config)
+
+
+def _generate_once(model, prompt, generation_config):
+    response = model.generate_content(prompt, generation_config=generation_config or None)
+    return response.text
+
+
+def _generate_candidates(model, prompt, generation_config):
+    response = model.generate_content(prompt, generation_config=generation_config)
+    texts = []
+    for candidate in response.candidates:
+        # response.text refuses to pick between candidates, so read the parts directly
+        parts = getattr(candidate.content, "parts", None) or []
+        text = "".join(getattr(part, "text", "") for part in parts)
+        if text.strip():
+            texts.append(text)
+    return texts
+
+
+def _generate_streaming(model, prompt, generation_config, partial_path):
+    """
+    Stream a response, appending each chunk to partial_path as it arrives.
+
+    An existing checkpoint is resumed (the model is asked to continue it) or
+    discarded according to LLM_PARTIAL_POLICY. The checkpoint is removed once
+    the full response has been received.
+    """
+    partial_path = Path(partial_path) if partial_path else None
+    existing = ""
+    if partial_path and partial_path.exists():
+        if LLM_PARTIAL_POLICY == "resume":
+            existing = partial_path.read_text(encoding="utf-8")
+            print(f"Resuming from partial checkpoint {partial_path.name} ({len(existing)} characters)")
+            if existing:
+                prompt = prompt + RESUME_INSTRUCTION.format(partial=existing)
+        else:
+            print(f"Discarding partial checkpoint {partial_path.name}")
+            partial_path.unlink()
+
+    chunks = [existing]
+    started = time.monotonic()
+    first_token_at = None
+    response = model.generate_content(prompt, generation_config=generation_config or None, stream=True)
+
+    checkpoint = open(partial_path, "a", encoding="utf-8") if partial_path else None
+    try:
+        for chunk in response:
+            try:
+                piece = chunk.text
+            except ValueError:
+                # Chunks carrying only safety/finish metadata have no text
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            chunks.append(piece)
+            if checkpoint:
+                checkpoint.write(piece)
+                checkpoint.flush()
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    elapsed = time.monotonic() - started
+    text = "".join(chunks)
+    usage = getattr(response, "usage_metadata", None)
+    output_tokens = getattr(usage, "candidates_token_count", 0) or len(text) // 4
+    ttft = (first_token_at - started) if first_token_at else elapsed
+    generating = max(elapsed - ttft, 1e-6)
+    print(f"  Streamed {len(text)} characters: time to first token {ttft:.2f}s, "
+          f"{output_tokens / generating:.1f} tokens/sec")
+
+    if partial_path and partial_path.exists():
+        partial_path.unlink()
+    return text
+
+
+def print_available_models():
+    """List available Gemini models for debugging purposes."""
+    try:
+        genai = _get_genai()
+        print("\nAvailable Gemini models:")
+        for model in genai.list_models():
+            print(f"  - {model.name}")
+            if hasattr(model, 'supported_generation_methods'):
+                print(f"    Supported methods: {model.supported_generation_methods}")
+    except Exception as e:
+        print(f"  Unable to list models: {e}")
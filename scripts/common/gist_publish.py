@@ -0,0 +1,235 @@
+"""
+Helpers for publishing generated works to GitHub Gists.
+
+Raw file URLs follow a fixed scheme (owner, gist ID and file name, without a
+revision), so an index such as chapters.json can be built locally and sent
+in the same edit as the files it points to, instead of re-fetching the gist
+after the edit to read back each file's raw_url.
+
+GistManifest records the git blob SHA-1 of every file last published, so an
+edit only sends the files whose content changed. The same hash is embedded
+in each file's revision-pinned raw_url, which lets ``verify`` compare the
+manifest with the remote gist from its file listing alone, without
+downloading any content.
+
+get_gist_metadata finds a gist in the authenticated user's gist listing,
+which carries file names, sizes and raw URLs but no file contents, so a run
+can number, index and edit a gist without downloading all of its prose.
+The listing is read with a raw request and each entry is built as a
+completed Gist object: iterating get_user().get_gists() instead yields lazy
+objects that newer PyGithub releases re-fetch in full, contents included,
+on the first ``files`` access.
+
+Every script connects through ``connect``, which talks to GIST_API_URL, and
+raw URLs are built on GIST_RAW_URL. Pointing both at a local stand-in such
+as scripts/benchmarks/fake_gist_server.py runs the publishing paths offline.
+"""
+
+import hashlib
+import json
+import os
+import re
+import urllib.request
+
+from github import Github
+from github.Gist import Gist
+
+# Configuration
+GIST_OWNER = os.environ.get("GIST_OWNER", "pappater")
+GIST_API_URL = os.environ.get("GIST_API_URL", "https://api.github.com").rstrip("/")
+GIST_RAW_URL = os.environ.get("GIST_RAW_URL", "https://gist.githubusercontent.com").rstrip("/")
+
+# Page size of the gist listing (the API maximum)
+LISTING_PER_PAGE = 100
+
+RAW_URL_TEMPLATE = GIST_RAW_URL + "/{owner}/{gist_id}/raw/{filename}"
+HTML_URL_TEMPLATE = "https://gist.github.com/{gist_id}#{filename}"
+
+# Revision-pinned raw URLs end in /raw/<blob sha>/<filename>
+RAW_URL_SHA = re.compile(r"/raw/([0-9a-f]{40})/")
+
+
+def connect(token):
+    """Return a PyGithub client for the Gist API at GIST_API_URL."""
+    return Github(token, base_url=GIST_API_URL)
+
+
+def raw_url(gist_id, filename):
+    """Return the revision-independent raw URL of a gist file."""
+    return RAW_URL_TEMPLATE.format(owner=GIST_OWNER, gist_id=gist_id, filename=filename)
+
+
+def html_url(gist_id, filename):
+    """Return the gist page URL anchored at a file."""
+    return HTML_URL_TEMPLATE.format(gist_id=gist_id, filename=filename)
+
+
+def get_gist_metadata(github, gist_id, full_fetch_fallback=True):
+    """
+    Return a gist object carrying file metadata but no file contents.
+
+    The object can be edited like one from get_gist(). Falls back to a full
+    fetch if the gist is not in the authenticated user's listing.
+
+    Args:
+        github: Authenticated PyGithub Github client
+        gist_id: ID of the gist
+        full_fetch_fallback: False returns None instead of downloading a
+            gist missing from the listing
+
+    Returns:
+        github.Gist.Gist: The gist (None if missing and not fetched)
+    """
+    return get_gists_metadata(github, [gist_id], full_fetch_fallback).get(gist_id)
+
+
+def get_gists_metadata(github, gist_ids, full_fetch_fallback=True):
+    """
+    Return metadata-only gist objects for several gists from one listing pass.
+
+    Args:
+        github: Authenticated PyGithub Github client
+        gist_ids: IDs of the gists
+        full_fetch_fallback: False leaves out gists missing from the listing
+            instead of downloading them
+
+    Returns:
+        dict: Gist ID to github.Gist.Gist
+    """
+    wanted = set(gist_ids)
+    found = {}
+    for raw in _list_gists(github):
+        if raw["id"] in wanted:
+            # Built as a completed object: newer PyGithub releases otherwise
+            # re-fetch the whole gist, contents included, on the first .files access
+            found[raw["id"]] = github.create_from_raw_data(Gist, raw)
+            if len(found) == len(wanted):
+                break
+    if full_fetch_fallback:
+        for gist_id in wanted - set(found):
+            found[gist_id] = github.get_gist(gist_id)
+    return found
+
+
+def _list_gists(github):
+    """Yield the authenticated user's gists from the listing, as raw JSON without file contents."""
+    page = 1
+    while True:
+        _, data = github.requester.requestJsonAndCheck(
+            "GET", "/gists", parameters={"per_page": LISTING_PER_PAGE, "page": page}
+        )
+        yield from data
+        if len(data) < LISTING_PER_PAGE:
+            return
+        page += 1
+
+
+def read_file(gist_file):
+    """Return a gist file's content, downloading it from its raw URL if the listing omitted it."""
+    if gist_file.content is not None:
+        return gist_file.content
+    with urllib.request.urlopen(gist_file.raw_url, timeout=60) as response:
+        return response.read().decode("utf-8")
+
+
+def blob_sha(content):
+    """Return the git blob SHA-1 of text content, as GitHub computes it."""
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def remote_hashes(gist):
+    """
+    Read each file's blob SHA-1 from the gist's file listing.
+
+    Args:
+        gist: PyGithub Gist object
+
+    Returns:
+        dict: Filename to blob SHA-1 (None when the raw_url carries no hash)
+    """
+    hashes = {}
+    for filename, gist_file in gist.files.items():
+        match = RAW_URL_SHA.search(gist_file.raw_url or "")
+        hashes[filename] = match.group(1) if match else None
+    return hashes
+
+
+class GistManifest:
+    """Content hashes of the files last published to a gist, kept in a JSON sidecar."""
+
+    def __init__(self, path, gist=None):
+        """
+        Load the manifest, seeding it from the gist's file listing when missing.
+
+        Args:
+            path: Path of the JSON sidecar
+            gist: Optional PyGithub Gist object already fetched this run
+        """
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.hashes = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.hashes = {}
+            if gist is not None:
+                self.hashes = {name: sha for name, sha in remote_hashes(gist).items() if sha}
+
+    def changed(self, files):
+        """
+        Return only the files whose content differs from the last publish.
+
+        Args:
+            files: Filename to text content (None deletes a file)
+
+        Returns:
+            dict: The subset of files that needs to be sent
+        """
+        changed = {}
+        for filename, content in files.items():
+            if content is None:
+                if filename in self.hashes:
+                    changed[filename] = None
+            elif self.hashes.get(filename) != blob_sha(content):
+                changed[filename] = content
+        return changed
+
+    def record(self, files):
+        """Record files as published and save the manifest."""
+        self.record_hashes({
+            filename: None if content is None else blob_sha(content)
+            for filename, content in files.items()
+        })
+
+    def record_hashes(self, hashes):
+        """Record already-computed blob hashes (None for deleted files) and save the manifest."""
+        for filename, sha in hashes.items():
+            if sha is None:
+                self.hashes.pop(filename, None)
+            else:
+                self.hashes[filename] = sha
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.hashes, f, indent=2, sort_keys=True)
+
+    def verify(self, gist):
+        """
+        Compare the manifest with the remote gist without downloading content.
+
+        Args:
+            gist: PyGithub Gist object
+
+        Returns:
+            list: (filename, problem) pairs; empty when everything matches
+        """
+        remote = remote_hashes(gist)
+        problems = []
+        for filename in sorted(set(self.hashes) | set(remote)):
+            if filename not in remote:
+                problems.append((filename, "missing from gist"))
+            elif filename not in self.hashes:
+                problems.append((filename, "not in manifest"))
+            elif remote[filename] is None:
+                problems.append((filename, "remote hash unavailable"))
+            elif remote[filename] != self.hashes[filename]:
+                problems.append((filename, "content differs"))
+        return problems
@@ -0,0 +1,157 @@
+"""
+Volume sharding for collections that outgrow a single gist.
+
+The GitHub API truncates a gist's file listing at 300 files, and both the
+API and the web view slow down well before that as a gist grows. A
+collection is therefore spread over volumes: the first volume is the gist
+the reader already knows (it keeps chapters.json and the README), and when
+the active volume reaches GIST_SHARD_MAX_FILES files or GIST_SHARD_MAX_BYTES
+bytes the next item opens a new gist.
+
+The volumes are listed under "shards" in chapters.json, one entry per gist
+with the range of item numbers it holds, so readers and later runs can map
+an item number to its gist without listing every volume. Every chapter
+entry still carries its own raw URL, so readers that only use "chapters"
+keep working.
+"""
+
+import json
+import os
+
+from common import gist_publish
+from common.numbering import parse_number
+
+# Configuration
+GIST_SHARD_MAX_FILES = int(os.environ.get("GIST_SHARD_MAX_FILES", 250))
+GIST_SHARD_MAX_BYTES = int(os.environ.get("GIST_SHARD_MAX_BYTES", 10_000_000))
+
+
+def load_shard_index(chapters_file):
+    """Return the "shards" list from a local chapters.json, or [] if there is none."""
+    try:
+        with open(chapters_file, "r", encoding="utf-8") as f:
+            return json.load(f).get("shards", [])
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+class ShardSet:
+    """The gists a collection is spread over, first volume first."""
+
+    def __init__(self, github, gist, prefix, chapters_file,
+                 max_files=GIST_SHARD_MAX_FILES, max_bytes=GIST_SHARD_MAX_BYTES):
+        """
+        Load the volume list and each volume's file metadata.
+
+        Args:
+            github: Authenticated PyGithub Github client
+            gist: First-volume gist from gist_publish.get_gist_metadata
+            prefix: File name prefix of numbered items (e.g. "poem_")
+            chapters_file: Local chapters.json holding the "shards" list
+            max_files: Roll over when a volume would exceed this many files
+            max_bytes: Roll over when a volume would exceed this many bytes
+        """
+        self.github = github
+        self.gist = gist
+        self.prefix = prefix
+        self.chapters_file = chapters_file
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+        shards = [s for s in load_shard_index(chapters_file) if s["gist_id"] != gist.id]
+        self.gists = {gist.id: gist}
+        if shards:
+            # Volumes beyond the first come from the same metadata-only listing
+            self.gists.update(gist_publish.get_gists_metadata(github, [s["gist_id"] for s in shards]))
+        self.shards = [{"volume": 1, "gist_id": gist.id}] + [
+            {"volume": i, "gist_id": s["gist_id"]} for i, s in enumerate(shards, start=2)
+        ]
+        for shard in self.shards:
+            self._measure(shard)
+
+    def _measure(self, shard):
+        """Fill in a volume's file count, byte size and item number range from its listing."""
+        files = self.gists[shard["gist_id"]].files
+        numbers = [n for n in (parse_number(f, self.prefix) for f in files) if n is not None]
+        shard["files"] = len(files)
+        shard["bytes"] = sum(f.size or 0 for f in files.values())
+        shard["first"] = min(numbers, default=None)
+        shard["last"] = max(numbers, default=None)
+
+    @property
+    def first(self):
+        return self.shards[0]
+
+    @property
+    def files(self):
+        """File metadata of every volume, keyed by file name (the first volume wins on clashes)."""
+        merged = {}
+        for shard in reversed(self.shards):
+            merged.update(self.gists[shard["gist_id"]].files)
+        return merged
+
+    def gist_id_for(self, number):
+        """Return the ID of the gist holding an item number."""
+        for shard in reversed(self.shards):
+            if shard["first"] is not None and number >= shard["first"]:
+                return shard["gist_id"]
+        return self.first["gist_id"]
+
+    def volume_for(self, size):
+        """
+        Return the volume a new item of the given size goes to.
+
+        Args:
+            size: Item size in bytes
+
+        Returns:
+            dict: The active volume, or a new one (gist_id None) when it is full
+        """
+        active = self.shards[-1]
+        if active["files"] + 1 <= self.max_files and active["bytes"] + size <= self.max_bytes:
+            return active
+        return {"volume": active["volume"] + 1, "gist_id": None,
+                "files": 0, "bytes": 0, "first": None, "last": None}
+
+    def publish(self, shard, files, description):
+        """
+        Send files to a volume other than the first, creating its gist if it is new.
+
+        A new volume is written to the local chapters.json straight away, so
+        the gist is not lost if the later chapters.json edit fails.
+
+        Args:
+            shard: Volume from volume_for
+            files: Filename to InputFileContent
+            description: Gist description
+        """
+        if shard["gist_id"] is None:
+            gist = self.github.get_user().create_gist(True, files, description)
+            shard["gist_id"] = gist.id
+            self.gists[gist.id] = gist
+            self.shards.append(shard)
+            self._save_index()
+            print(f"✓ Opened volume {shard['volume']} in new Gist {gist.id}")
+        else:
+            self.gists[shard["gist_id"]].edit(description=description, files=files)
+
+    def record(self, shard, number, content):
+        """Count a published item against its volume."""
+        shard["files"] += 1
+        shard["bytes"] += len(content.encode("utf-8"))
+        shard["first"] = number if shard["first"] is None else min(shard["first"], number)
+        shard["last"] = number if shard["last"] is None else max(shard["last"], number)
+
+    def index(self):
+        """Return the "shards" list for chapters.json."""
+        return [dict(shard) for shard in self.shards]
+
+    def _save_index(self):
+        try:
+            with open(self.chapters_file, "r", encoding="utf-8") as f:
+                chapters_data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            chapters_data = {}
+        chapters_data["shards"] = self.index()
+        with open(self.chapters_file, "w", encoding="utf-8") as f:
+            json.dump(chapters_data, f, indent=2)
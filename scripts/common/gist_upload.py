@@ -0,0 +1,264 @@
+"""
+Batched, resumable bulk upload of many files to one gist.
+
+The full-book publishers (Hemingway, Clueless Mind) used to hold every
+chapter in memory and send them all in a single gist.edit at the end. One
+failure lost the whole upload, and the payload easily grew past what the
+API accepts.
+
+upload_files splits the files into batches bounded by GIST_BATCH_MAX_BYTES
+and GIST_BATCH_MAX_FILES. A batch's files are read from disk only when the
+batch is sent. Content batches run on up to GIST_UPLOAD_WORKERS threads,
+and conflicting or transient failures are retried with backoff. Index files
+such as chapters.json go in a final batch once every content batch has
+landed (or in the same edit, when everything fits in one), so the index
+never points at a missing file. Deletions (a None source) go out after
+the index, for the same reason. BackgroundUploader runs such uploads on a
+thread while a generator keeps working.
+
+Each landed batch is recorded in a GistManifest, which serves as the
+checkpoint. A rerun hashes the files on disk and sends only those the
+manifest does not already have. When the manifest file is missing, it is
+seeded from the gist's own file hashes, so a fresh checkout still resumes
+from the last good batch.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from github import InputFileContent
+
+from common import gist_publish
+from common.rate_limit import RETRYABLE_STATUS, backoff_delay
+
+# Configuration
+GIST_BATCH_MAX_BYTES = int(os.environ.get("GIST_BATCH_MAX_BYTES", 900_000))
+GIST_BATCH_MAX_FILES = int(os.environ.get("GIST_BATCH_MAX_FILES", 20))
+GIST_UPLOAD_WORKERS = int(os.environ.get("GIST_UPLOAD_WORKERS", 2))
+GIST_UPLOAD_RETRIES = int(os.environ.get("GIST_UPLOAD_RETRIES", 4))
+
+# A concurrent edit of the same gist can be rejected with 409 Conflict; it succeeds on retry
+UPLOAD_RETRY_STATUS = RETRYABLE_STATUS | {409}
+
+
+def file_blob_sha(path, chunk_size=1 << 16):
+    """Return the git blob SHA-1 of a file, reading it in chunks."""
+    digest = hashlib.sha1(b"blob %d\0" % os.path.getsize(path))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _size(source):
+    if source is None:
+        return 0
+    return os.path.getsize(source) if isinstance(source, Path) else len(source.encode("utf-8"))
+
+
+def _sha(source):
+    if source is None:
+        return None
+    return file_blob_sha(source) if isinstance(source, Path) else gist_publish.blob_sha(source)
+
+
+def _read(source):
+    if source is None:
+        return None
+    if isinstance(source, Path):
+        with open(source, "r", encoding="utf-8") as f:
+            return f.read()
+    return source
+
+
+def plan_batches(files, max_bytes=GIST_BATCH_MAX_BYTES, max_files=GIST_BATCH_MAX_FILES):
+    """
+    Split files into batches that stay under both limits.
+
+    Args:
+        files: List of (filename, source) pairs; a source is a Path to read
+            from disk, a str holding the content, or None to delete the file
+        max_bytes: Maximum total content size of a batch
+        max_files: Maximum number of files in a batch
+
+    Returns:
+        list: Batches, each a list of (filename, source) pairs in input order
+    """
+    batches = []
+    batch, batch_bytes = [], 0
+    for filename, source in files:
+        size = _size(source)
+        if batch and (len(batch) >= max_files or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        # A single file over max_bytes still goes out, alone in its batch
+        batch.append((filename, source))
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _status(exc):
+    return getattr(exc, "status", None) or getattr(exc, "code", None)
+
+
+def _send(gist, batch, label):
+    """Send one batch, retrying conflicts and transient errors."""
+    attempt = 0
+    while True:
+        files = {
+            filename: None if source is None else InputFileContent(_read(source))
+            for filename, source in batch
+        }
+        try:
+            gist.edit(files=files)
+            return
+        except Exception as e:
+            attempt += 1
+            if _status(e) not in UPLOAD_RETRY_STATUS or attempt > GIST_UPLOAD_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"  {label}: {e}; retry {attempt}/{GIST_UPLOAD_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def upload_files(gist, files, manifest_path, index_files=(), workers=GIST_UPLOAD_WORKERS,
+                 max_bytes=GIST_BATCH_MAX_BYTES, max_files=GIST_BATCH_MAX_FILES):
+    """
+    Upload files to a gist in size-bounded, checkpointed batches.
+
+    Args:
+        gist: PyGithub Gist object (a metadata-only one is enough)
+        files: Dict of filename to source (Path to stream from disk, str
+            content, or None to delete a file the manifest has)
+        manifest_path: GistManifest sidecar used as the upload checkpoint
+        index_files: Dict of filename to source sent after every other batch landed
+        workers: Maximum number of batches in flight
+        max_bytes: Maximum total content size of a batch
+        max_files: Maximum number of files in a batch
+
+    Returns:
+        dict: Counts of files sent, files skipped as already uploaded, and batches
+
+    Raises:
+        The first batch error once its retries are exhausted; batches that
+        landed before it stay recorded in the manifest
+    """
+    manifest = gist_publish.GistManifest(manifest_path, gist)
+    manifest_lock = threading.Lock()
+    hashes = {}
+
+    def pending(entries):
+        result = []
+        for name, source in entries.items():
+            hashes[name] = _sha(source)
+            # A deletion is only pending while the gist still has the file
+            if source is None and name not in manifest.hashes:
+                continue
+            if manifest.hashes.get(name) != hashes[name]:
+                result.append((name, source))
+        return result
+
+    def land(batch, label):
+        _send(gist, batch, label)
+        with manifest_lock:
+            manifest.record_hashes({name: hashes[name] for name, _ in batch})
+        print(f"  ✓ {label}: {len(batch)} files")
+
+    content = pending(files)
+    index = pending(dict(index_files))
+    skipped = len(files) + len(index_files) - len(content) - len(index)
+    if skipped:
+        print(f"Skipping {skipped} files already uploaded")
+
+    # Deletions follow the index, so the index never points at a deleted file
+    deletions = [(name, source) for name, source in content if source is None]
+    content = [(name, source) for name, source in content if source is not None]
+    index += deletions
+
+    # A single edit is atomic, so when everything fits in one batch the index rides along
+    if len(plan_batches(content + index, max_bytes, max_files)) == 1:
+        content, index = content + index, []
+
+    batches = plan_batches(content, max_bytes, max_files)
+    if batches:
+        print(f"Uploading {len(content)} files in {len(batches)} batches "
+              f"({max(1, min(workers, len(batches)))} at a time)...")
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [
+                pool.submit(land, batch, f"Batch {i}/{len(batches)}")
+                for i, batch in enumerate(batches, 1)
+            ]
+            for future in as_completed(futures):
+                future.result()
+
+    index_batches = plan_batches(index, max_bytes, max_files)
+    for i, batch in enumerate(index_batches, 1):
+        land(batch, f"Index batch {i}/{len(index_batches)}")
+
+    return {"sent": len(content) + len(index) - len(deletions), "deleted": len(deletions),
+            "skipped": skipped, "batches": len(batches) + len(index_batches)}
+
+
+class BackgroundUploader:
+    """
+    Runs upload_files on a background thread while the caller keeps working.
+
+    Uploads run one at a time, so edits never race each other. A submit made
+    while an upload is running replaces any upload still waiting, because the
+    newer file set supersedes it; files that already landed are skipped via
+    the manifest either way. Failures are reported and kept in ``errors``
+    instead of being raised, so a final upload_files call can retry them.
+    """
+
+    def __init__(self, gist, manifest_path, **upload_options):
+        """
+        Args:
+            gist: PyGithub Gist object
+            manifest_path: GistManifest sidecar shared with any final upload
+            upload_options: Extra keyword arguments for upload_files
+        """
+        self.gist = gist
+        self.manifest_path = manifest_path
+        self.upload_options = upload_options
+        self.uploads = 0
+        self.errors = []
+        self._lock = threading.Lock()
+        self._next = None
+        self._running = False
+        self._thread = None
+
+    def submit(self, files, index_files=None):
+        """Queue an upload of files (and index_files after them), replacing any waiting one."""
+        with self._lock:
+            self._next = (dict(files), dict(index_files or {}))
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                job, self._next = self._next, None
+                if job is None:
+                    self._running = False
+                    return
+            files, index_files = job
+            try:
+                upload_files(self.gist, files, self.manifest_path, index_files,
+                             workers=1, **self.upload_options)
+                self.uploads += 1
+            except Exception as e:
+                self.errors.append(e)
+                print(f"⚠ Background upload failed ({e}); the final upload will retry it")
+
+    def close(self):
+        """Wait for the running and waiting uploads to finish."""
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,68 @@
+"""
+Idempotency keys for scheduled runs.
+
+A scheduled workflow that is retried, or dispatched by hand on the same
+day, used to generate and publish a second item. Each daily script now
+derives a key from its work ID and the schedule slot the run falls in,
+stores it with its numbering state when it publishes, and returns early
+when a run finds its own key already there. The check reads one small
+local JSON file, so a repeat invocation finishes before any LLM or GitHub
+client is created.
+
+The local state is only committed after the publish, and "Re-run failed
+jobs" checks out the original commit, so a run that published and then
+failed to commit would not find its key locally. The key is therefore also
+published as last_run_key in the gist's chapters.json, and
+published_run_key reads it back once the gist has been fetched.
+"""
+
+import json
+from datetime import datetime, timezone
+
+from common import gist_publish
+
+# chapters.json field holding the key of the run that published it
+RUN_KEY_FIELD = "last_run_key"
+
+
+def schedule_slot(slot_hours=24, now=None):
+    """
+    Return the label of the schedule slot a time falls in.
+
+    Args:
+        slot_hours: Slot length in hours (24 for daily, 12 for twice daily)
+        now: Optional UTC datetime (defaults to the current time)
+
+    Returns:
+        str: "YYYY-MM-DD" for daily slots, "YYYY-MM-DDTHH" otherwise
+    """
+    now = now or datetime.now(timezone.utc)
+    if slot_hours >= 24:
+        return now.strftime("%Y-%m-%d")
+    start_hour = now.hour - now.hour % slot_hours
+    return f"{now.strftime('%Y-%m-%d')}T{start_hour:02d}"
+
+
+def run_key(work_id, slot_hours=24, now=None):
+    """Return the idempotency key of a run, e.g. "flying-banana:2025-11-06"."""
+    return f"{work_id}:{schedule_slot(slot_hours, now)}"
+
+
+def published_run_key(gist, index_filename="chapters.json"):
+    """
+    Return the run key recorded in a gist's published index.
+
+    Args:
+        gist: PyGithub Gist object (a metadata-only one is enough)
+        index_filename: Index file the key is published in
+
+    Returns:
+        str: The key of the run that last published, or None if there is none
+    """
+    gist_file = gist.files.get(index_filename)
+    if gist_file is None:
+        return None
+    try:
+        return json.loads(gist_publish.read_file(gist_file)).get(RUN_KEY_FIELD)
+    except (OSError, ValueError, AttributeError):
+        return None
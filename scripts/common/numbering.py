@@ -0,0 +1,153 @@
+"""
+Durable numbering state for the daily works.
+
+The scripts used to pick the next chapter/poem/story number by fetching the
+whole gist (file contents included) and parsing every file name. Each work
+now keeps a small JSON state file next to its docs:
+
+- next_number: the number the next run will publish
+- published: every number published so far
+- last_published: UTC timestamp of the last publish
+- last_run_key: idempotency key of the run that published last (see
+  common/idempotency.py)
+
+The state is reconciled against the gist's file names (from the metadata-only
+listing, see gist_publish.get_gist_metadata) only when it is missing, older
+than NUMBERING_MAX_AGE_HOURS, or contradicted by the listing.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+# Configuration
+NUMBERING_MAX_AGE_HOURS = float(os.environ.get("NUMBERING_MAX_AGE_HOURS", 48))
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def parse_number(filename, prefix, suffix=".md"):
+    """Return the number in a name like chapter_007.md, or None if it does not match."""
+    if not (filename.startswith(prefix) and filename.endswith(suffix)):
+        return None
+    try:
+        return int(filename[len(prefix):-len(suffix)])
+    except ValueError:
+        return None
+
+
+class NumberingState:
+    """Next number, published numbers and last publish time for one work."""
+
+    def __init__(self, path, prefix):
+        """
+        Args:
+            path: Path of the JSON state file
+            prefix: File name prefix of numbered items (e.g. "chapter_")
+        """
+        self.path = path
+        self.prefix = prefix
+        self.exists = False
+        self.next_number = 1
+        self.published = set()
+        self.last_published = None
+        self.last_run_key = None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.next_number = data["next_number"]
+            self.published = set(data["published"])
+            self.last_published = data.get("last_published")
+            self.last_run_key = data.get("last_run_key")
+            self.exists = True
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+    def save(self):
+        data = {
+            "next_number": self.next_number,
+            "published": sorted(self.published),
+            "last_published": self.last_published,
+            "last_run_key": self.last_run_key,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_stale(self, filenames=None, max_age_hours=NUMBERING_MAX_AGE_HOURS):
+        """
+        Return True when the state should be reconciled with the gist.
+
+        Args:
+            filenames: Optional file names already known from the gist; the
+                state is stale if the number it would publish next is there
+            max_age_hours: Reconcile when the last publish is older than this
+        """
+        if not self.exists or not self.last_published:
+            return True
+        last = datetime.strptime(self.last_published, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+        if datetime.now(timezone.utc) - last > timedelta(hours=max_age_hours):
+            return True
+        if filenames is not None:
+            next_file = f"{self.prefix}{self.next_number:03d}.md"
+            return next_file in filenames
+        return False
+
+    def reconcile(self, filenames):
+        """Rebuild the state from the gist's file names and save it."""
+        self.published = {
+            n for n in (parse_number(f, self.prefix) for f in filenames) if n is not None
+        }
+        self.next_number = max(self.published, default=0) + 1
+        if not self.last_published:
+            self.last_published = datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+        self.exists = True
+        self.save()
+        print(f"✓ Reconciled numbering with Gist ({len(self.published)} published, next is {self.next_number})")
+
+    def first_gap(self):
+        """Return the lowest unpublished number below next_number, or None."""
+        for number in range(1, self.next_number):
+            if number not in self.published:
+                return number
+        return None
+
+    def record(self, number, run_key=None):
+        """
+        Record a successful publish and save the state.
+
+        Args:
+            number: Number that was published
+            run_key: Idempotency key of the publishing run
+        """
+        self.published.add(number)
+        if run_key is not None:
+            self.last_run_key = run_key
+        self.next_number = max(self.next_number, number + 1)
+        self.last_published = datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+        self.save()
+
+
+def next_number(state, gist, fill_gaps=False):
+    """
+    Return the number to publish next, reconciling the state first if needed.
+
+    Args:
+        state: NumberingState for the work
+        gist: Gist object from gist_publish.get_gist_metadata, or a
+            gist_shards.ShardSet (only its file names are used)
+        fill_gaps: Return the first missing number before continuing the sequence
+
+    Returns:
+        int: Number to publish
+    """
+    filenames = set(gist.files.keys())
+    if state.is_stale(filenames):
+        state.reconcile(filenames)
+    if fill_gaps:
+        gap = state.first_gap()
+        if gap is not None:
+            print(f"⚠ Found missing {state.prefix.rstrip('_').title()} {gap} in sequence. Will generate it.")
+            return gap
+    return state.next_number
@@ -0,0 +1,111 @@
+"""
+Persistent on-disk queue of pre-generated poems for the posting bots.
+
+The Twitter and Tumblr bots used to generate a poem on every scheduled run
+before posting it. Instead, a batch producer fills this SQLite queue with
+validated poems, and the posting entry points just dequeue and post. When
+the queue falls below a low watermark it is topped up after posting, so a
+Gemini outage never blocks the posting schedule while poems remain queued.
+"""
+
+import os
+import random
+import sqlite3
+import time
+from pathlib import Path
+
+# Configuration
+DEFAULT_QUEUE_DIR = Path(__file__).resolve().parent.parent.parent / ".cache" / "poem-queue"
+POEM_QUEUE_DIR = Path(os.environ.get("POEM_QUEUE_DIR", DEFAULT_QUEUE_DIR))
+POEM_QUEUE_LOW_WATERMARK = int(os.environ.get("POEM_QUEUE_LOW_WATERMARK", 12))
+POEM_QUEUE_REFILL_BATCH = int(os.environ.get("POEM_QUEUE_REFILL_BATCH", 24))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS poems (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    poetry_type TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    posted_at REAL
+)
+"""
+
+
+class PoemQueue:
+    """FIFO queue of poems for one posting channel, stored in SQLite."""
+
+    def __init__(self, channel, queue_dir=POEM_QUEUE_DIR):
+        queue_dir = Path(queue_dir)
+        queue_dir.mkdir(parents=True, exist_ok=True)
+        self.path = queue_dir / f"{channel}.sqlite"
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def count(self):
+        """Number of poems waiting to be posted."""
+        row = self._conn.execute("SELECT COUNT(*) FROM poems WHERE posted_at IS NULL").fetchone()
+        return row[0]
+
+    def enqueue(self, poetry_type, text):
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO poems (poetry_type, text, created_at) VALUES (?, ?, ?)",
+                (poetry_type, text, time.time()),
+            )
+
+    def peek(self):
+        """
+        Return the oldest unposted poem without removing it.
+
+        Returns:
+            tuple: (id, poetry_type, text), or None if the queue is empty
+        """
+        return self._conn.execute(
+            "SELECT id, poetry_type, text FROM poems WHERE posted_at IS NULL ORDER BY id LIMIT 1"
+        ).fetchone()
+
+    def mark_posted(self, poem_id):
+        """Remove a poem from the queue once it has been posted."""
+        with self._conn:
+            self._conn.execute("UPDATE poems SET posted_at = ? WHERE id = ?", (time.time(), poem_id))
+
+    def close(self):
+        self._conn.close()
+
+
+def fill(queue, poetry_types, generate_fn, validate_fn=None, per_type=1, limit=None):
+    """
+    Generate validated poems into the queue.
+
+    Args:
+        queue: PoemQueue to fill
+        poetry_types: Poetry types to generate for
+        generate_fn: Callable(poetry_type) -> poem text
+        validate_fn: Optional callable(poem text) -> bool; rejected poems are skipped
+        per_type: Poems to generate for each poetry type
+        limit: Optional cap on the number of poetry types used (sampled at random)
+
+    Returns:
+        int: Number of poems added
+    """
+    types = list(poetry_types)
+    random.shuffle(types)
+    if limit is not None:
+        types = types[:limit]
+
+    added = 0
+    for poetry_type in types:
+        for _ in range(per_type):
+            try:
+                poem_text = generate_fn(poetry_type)
+            except Exception as e:
+                print(f"⚠ Failed to generate {poetry_type} poem: {e}")
+                continue
+            if validate_fn and not validate_fn(poem_text):
+                print(f"⚠ Rejected {poetry_type} poem that failed validation")
+                continue
+            queue.enqueue(poetry_type, poem_text)
+            added += 1
+    print(f"✓ Added {added} poems to the queue ({queue.count()} waiting)")
+    return added
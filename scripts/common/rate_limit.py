@@ -0,0 +1,160 @@
+"""
+Retry, backoff and rate limiting for Gemini calls.
+
+Every API call made through common.generation goes through ``call()``:
+
+- a token bucket caps the request rate for the process
+- a semaphore caps the number of calls in flight
+- retryable errors (429, 5xx, timeouts, dropped connections) are retried with
+  exponential backoff and full jitter; fatal errors (bad key, unknown model,
+  invalid request) are raised immediately
+- a 429 also writes a cooldown deadline to a shared file in the temp
+  directory, so every generator process on the machine backs off together
+  instead of piling onto the quota
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Configuration
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 60))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 4))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 5))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 2.0))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 60.0))
+COOLDOWN_FILE = Path(os.environ.get(
+    "LLM_COOLDOWN_FILE", Path(tempfile.gettempdir()) / "mockpoet-llm-cooldown"
+))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+FATAL_STATUS = {400, 401, 403, 404}
+RETRYABLE_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway", "Aborted", "RetryError",
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a fixed rate."""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE / 60.0, max(1.0, LLM_REQUESTS_PER_MINUTE / 6))
+_in_flight = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+
+def _status_code(exc):
+    code = getattr(exc, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    code = getattr(code, "value", code)
+    if isinstance(code, tuple):
+        code = code[0]
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(exc):
+    """Return True for transient errors worth retrying (rate limits, 5xx, timeouts)."""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    status = _status_code(exc)
+    if status in RETRYABLE_STATUS:
+        return True
+    if status in FATAL_STATUS:
+        return False
+    return type(exc).__name__ in RETRYABLE_NAMES
+
+
+def is_model_error(exc):
+    """Return True when the error suggests the model name is wrong or unavailable."""
+    return _status_code(exc) == 404 or type(exc).__name__ == "NotFound"
+
+
+def _is_rate_limit(exc):
+    return _status_code(exc) == 429 or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def _read_cooldown():
+    try:
+        return float(COOLDOWN_FILE.read_text())
+    except (FileNotFoundError, ValueError):
+        return 0.0
+
+
+def _write_cooldown(until):
+    # Only ever extend the shared deadline
+    if until <= _read_cooldown():
+        return
+    try:
+        tmp_path = COOLDOWN_FILE.with_name(f"{COOLDOWN_FILE.name}.{os.getpid()}")
+        tmp_path.write_text(str(until))
+        os.replace(tmp_path, COOLDOWN_FILE)
+    except OSError:
+        pass
+
+
+def _wait_for_cooldown():
+    remaining = _read_cooldown() - time.time()
+    if remaining > 0:
+        print(f"  Rate limited: waiting {remaining:.1f}s for shared cooldown...")
+        time.sleep(remaining)
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given (1-based) retry attempt."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** (attempt - 1))))
+
+
+def call(fn, *args, **kwargs):
+    """
+    Call fn under the rate limiter, retrying transient failures.
+
+    Raises:
+        The last exception once retries are exhausted, or any fatal error
+        immediately.
+    """
+    attempt = 0
+    while True:
+        _wait_for_cooldown()
+        _bucket.acquire()
+        try:
+            with _in_flight:
+                return fn(*args, **kwargs)
+        except Exception as e:
+            attempt += 1
+            if not is_retryable(e) or attempt > LLM_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            if _is_rate_limit(e):
+                # Make every process on this machine wait at least as long
+                delay = max(delay, LLM_BACKOFF_BASE)
+                _write_cooldown(time.time() + delay)
+            print(f"  Transient error ({type(e).__name__}: {e}); "
+                  f"retry {attempt}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
@@ -0,0 +1,114 @@
+"""
+Content-addressed on-disk cache for LLM responses.
+
+Entries are keyed on a SHA-256 of (model name, rendered prompt, generation
+config) and stored as one JSON file each under the cache directory. The
+cache is bounded by total size; when it grows past the limit the least
+recently used entries (oldest mtime, refreshed on every hit) are evicted.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# Configuration
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent.parent / ".cache" / "llm-responses"
+LLM_CACHE_DIR = Path(os.environ.get("LLM_CACHE_DIR", DEFAULT_CACHE_DIR))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") != "0"
+
+
+def cache_key(model_name, prompt, generation_config=None):
+    """Return the hex digest identifying a (model, prompt, config) request."""
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "config": generation_config or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of response texts stored on disk."""
+
+    def __init__(self, cache_dir=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        """Return the cached text for a key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        # Touch the entry so eviction treats it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry["text"]
+
+    def put(self, key, text, model_name=None):
+        """Store a response text and evict old entries if over the size limit."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"model": model_name, "created": time.time(), "text": text}
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """Delete every entry, keeping the (now empty) cache directory."""
+        with self._lock:
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def stats(self):
+        """Return a one-line hit/miss summary."""
+        lookups = self.hits + self.misses
+        rate = (self.hits / lookups * 100) if lookups else 0.0
+        return f"LLM cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
@@ -0,0 +1,91 @@
+"""
+Write-ahead journal for the daily generate-then-publish runs.
+
+A daily run generates a chapter and its summary, writes the summary and
+continuity log locally, then publishes to the gist. If the publish fails,
+the next run used to pick the chapter number again from the gist and
+regenerate the same chapter, paying for it twice and appending a second
+continuity log entry.
+
+The journal records each stage as it completes, together with the content
+that stage produced, in a small JSON file committed next to the novel's
+docs. A run that finds an unfinished journal resumes its chapter and only
+replays the stages that are missing.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+# Stages of a daily run, in order
+STAGES = ("chapter", "summary", "local", "publish")
+
+
+class RunJournal:
+    """Completed stages of the current (or last) daily run."""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Path of the JSON journal file
+        """
+        self.path = path
+        self.chapter = None
+        self.stages = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.chapter = data["chapter"]
+            self.stages = data["stages"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+    @property
+    def pending(self):
+        """True when the last run stopped before publishing its chapter."""
+        return self.chapter is not None and "publish" not in self.stages
+
+    def completed(self):
+        """Return the names of the completed stages, in order."""
+        return [stage for stage in STAGES if stage in self.stages]
+
+    def begin(self, chapter_num):
+        """Start a journal for a new chapter, discarding the finished one."""
+        self.chapter = chapter_num
+        self.stages = {}
+        self._save()
+
+    def done(self, stage):
+        return stage in self.stages
+
+    def get(self, stage):
+        """Return the content recorded for a stage, or None."""
+        entry = self.stages.get(stage)
+        return entry.get("content") if entry else None
+
+    def record(self, stage, content=None):
+        """
+        Mark a stage as completed and save the journal.
+
+        Args:
+            stage: One of STAGES
+            content: Text the stage produced, kept so it is never paid for twice
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown journal stage: {stage}")
+        entry = {"completed_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}
+        if content is not None:
+            entry["content"] = content
+        if stage == "publish":
+            # Once published the content lives in the gist; keep the committed journal small
+            for other in self.stages.values():
+                other.pop("content", None)
+        self.stages[stage] = entry
+        self._save()
+
+    def _save(self):
+        data = {"chapter": self.chapter, "stages": self.stages}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
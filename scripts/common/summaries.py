@@ -0,0 +1,223 @@
+"""
+Hierarchical rolling summary store for the daily novel scripts.
+
+The chapter prompt used to receive the whole of summaries.md, which grows by
+one summary per day. This module instead builds a bounded context:
+
+- the most recent chapter summaries, verbatim
+- arc digests, each condensing ARC_SIZE older chapter summaries
+- a single book digest that absorbs the oldest arcs once there are more
+  than MAX_ARCS of them
+
+Digests are generated once and persisted in a JSON sidecar next to
+summaries.md, so each day costs at most one or two small digest calls and
+the chapter prompt stays roughly the same size however long the book gets.
+
+Full-book runs (which generate every chapter in one process) use
+RunningSynopsis, the in-memory equivalent updated once per chapter.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+from common import generation
+
+# Configuration
+SUMMARY_RECENT_CHAPTERS = int(os.environ.get("SUMMARY_RECENT_CHAPTERS", 5))
+SUMMARY_ARC_SIZE = int(os.environ.get("SUMMARY_ARC_SIZE", 10))
+SUMMARY_MAX_ARCS = int(os.environ.get("SUMMARY_MAX_ARCS", 4))
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("SUMMARY_TOKEN_BUDGET", 6000))
+
+ARC_DIGEST_WORDS = 400
+BOOK_DIGEST_WORDS = 800
+
+DIGEST_PROMPT = Path(__file__).parent / "prompts" / "digest_prompt.txt"
+
+CHAPTER_HEADING = re.compile(r"^## Chapter (\d+)\s*$", re.MULTILINE)
+
+
+def parse_chapter_summaries(summaries_md):
+    """
+    Parse summaries.md into a {chapter number: summary} mapping.
+
+    When a chapter appears more than once (e.g. after a rerun) the last
+    entry wins.
+
+    Args:
+        summaries_md: Content of summaries.md (may be None)
+
+    Returns:
+        dict: Mapping of chapter number to summary text
+    """
+    summaries = {}
+    if not summaries_md:
+        return summaries
+
+    matches = list(CHAPTER_HEADING.finditer(summaries_md))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(summaries_md)
+        summaries[int(match.group(1))] = summaries_md[match.end():end].strip()
+    return summaries
+
+
+def _load_digests(digests_path):
+    try:
+        with open(digests_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"book": None, "book_through": 0, "arcs": []}
+
+
+def _save_digests(digests_path, digests):
+    with open(digests_path, "w", encoding="utf-8") as f:
+        json.dump(digests, f, indent=2, ensure_ascii=False)
+
+
+def _digest(scope, material, max_words):
+    prompt = generation.render_prompt(
+        DIGEST_PROMPT,
+        scope=scope,
+        material=material,
+        max_words=max_words
+    )
+    return generation.generate(prompt, cache=True).strip()
+
+
+def _format_chapters(summaries, numbers):
+    return "\n\n".join(f"## Chapter {n}\n\n{summaries[n]}" for n in numbers)
+
+
+def _fold_oldest_arc(digests):
+    """Roll the oldest arc digest into the book digest."""
+    arc = digests["arcs"].pop(0)
+    print(f"Rolling arc (Chapters {arc['start']}-{arc['end']}) into the book digest...")
+    parts = []
+    if digests["book"]:
+        parts.append(f"BOOK SO FAR (Chapters 1-{digests['book_through']}):\n{digests['book']}")
+    parts.append(f"NEXT ARC (Chapters {arc['start']}-{arc['end']}):\n{arc['digest']}")
+    digests["book"] = _digest("book digest and the arc that follows it", "\n\n".join(parts), BOOK_DIGEST_WORDS)
+    digests["book_through"] = arc["end"]
+
+
+def _render(digests, summaries, recent):
+    sections = []
+    if digests["book"]:
+        sections.append(f"# Story So Far (Chapters 1-{digests['book_through']})\n\n{digests['book']}")
+    for arc in digests["arcs"]:
+        sections.append(f"# Chapters {arc['start']}-{arc['end']}\n\n{arc['digest']}")
+    if recent:
+        sections.append(f"# Recent Chapters\n\n{_format_chapters(summaries, recent)}")
+    return "\n\n".join(sections)
+
+
+def build_previous_summary(summaries_md, digests_path,
+                           recent_chapters=SUMMARY_RECENT_CHAPTERS,
+                           arc_size=SUMMARY_ARC_SIZE,
+                           max_arcs=SUMMARY_MAX_ARCS,
+                           token_budget=SUMMARY_TOKEN_BUDGET):
+    """
+    Build the bounded previous-summary context for the next chapter prompt.
+
+    Args:
+        summaries_md: Content of summaries.md (may be None)
+        digests_path: Path of the JSON sidecar holding arc/book digests
+        recent_chapters: Number of latest chapter summaries kept verbatim
+        arc_size: Number of chapter summaries condensed into one arc digest
+        max_arcs: Arc digests kept before the oldest rolls into the book digest
+        token_budget: Approximate token limit for the assembled context
+
+    Returns:
+        str: Context text, or None if there are no summaries yet
+    """
+    summaries = parse_chapter_summaries(summaries_md)
+    if not summaries:
+        return None
+
+    digests = _load_digests(digests_path)
+    changed = False
+    covered = max([digests["book_through"]] + [arc["end"] for arc in digests["arcs"]])
+    chapters = sorted(summaries)
+
+    # Condense every complete arc that has fallen out of the recent window
+    while True:
+        pending = [n for n in chapters if n > covered]
+        if len(pending) - recent_chapters < arc_size:
+            break
+        arc_chapters = pending[:arc_size]
+        print(f"Condensing Chapters {arc_chapters[0]}-{arc_chapters[-1]} into an arc digest...")
+        digests["arcs"].append({
+            "start": arc_chapters[0],
+            "end": arc_chapters[-1],
+            "digest": _digest("run of chapter summaries", _format_chapters(summaries, arc_chapters), ARC_DIGEST_WORDS)
+        })
+        covered = arc_chapters[-1]
+        changed = True
+
+    while len(digests["arcs"]) > max_arcs:
+        _fold_oldest_arc(digests)
+        changed = True
+
+    recent = [n for n in chapters if n > covered]
+    context = _render(digests, summaries, recent)
+
+    # Enforce the token budget: roll arcs up first, then drop the oldest verbatim summaries
+    while generation.estimate_tokens(context) > token_budget and digests["arcs"]:
+        _fold_oldest_arc(digests)
+        changed = True
+        context = _render(digests, summaries, recent)
+    while generation.estimate_tokens(context) > token_budget and len(recent) > 1:
+        recent = recent[1:]
+        context = _render(digests, summaries, recent)
+
+    if changed:
+        _save_digests(digests_path, digests)
+
+    print(f"Previous-summary context: ~{generation.estimate_tokens(context)} tokens "
+          f"({len(recent)} recent chapters, {len(digests['arcs'])} arcs"
+          f"{', book digest' if digests['book'] else ''})")
+    return context
+
+
+class RunningSynopsis:
+    """
+    Incrementally maintained context for full-book runs.
+
+    Keeps the last ``recent_chapters`` summaries verbatim and folds each
+    summary that leaves that window into a compressed running synopsis, so
+    every chapter costs one small synopsis update instead of resending the
+    whole summary history.
+    """
+
+    def __init__(self, recent_chapters=SUMMARY_RECENT_CHAPTERS, max_words=BOOK_DIGEST_WORDS):
+        self.recent_chapters = recent_chapters
+        self.max_words = max_words
+        self.synopsis = None
+        self.synopsis_through = 0
+        self.recent = []
+
+    def add(self, chapter_num, summary):
+        """Record a chapter summary, folding the oldest recent one into the synopsis."""
+        self.recent.append((chapter_num, summary))
+        if len(self.recent) <= self.recent_chapters:
+            return
+
+        oldest_num, oldest_summary = self.recent.pop(0)
+        parts = []
+        if self.synopsis:
+            parts.append(f"SYNOPSIS SO FAR (Chapters 1-{self.synopsis_through}):\n{self.synopsis}")
+        parts.append(f"NEXT CHAPTER ({oldest_num}):\n{oldest_summary}")
+        print(f"Folding Chapter {oldest_num} into the running synopsis...")
+        self.synopsis = _digest("story synopsis and the chapter summary that follows it",
+                                "\n\n".join(parts), self.max_words)
+        self.synopsis_through = oldest_num
+
+    def context(self):
+        """Return the context for the next chapter prompt, or None before Chapter 1."""
+        sections = []
+        if self.synopsis:
+            sections.append(f"# Story So Far (Chapters 1-{self.synopsis_through})\n\n{self.synopsis}")
+        if self.recent:
+            sections.append("# Recent Chapters\n\n" + "\n\n".join(summary for _, summary in self.recent))
+        return "\n\n".join(sections) or None
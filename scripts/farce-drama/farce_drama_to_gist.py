@@ -11,8 +11,11 @@ import json
 from datetime import datetime
 from pathlib import Path
 
-import google.generativeai as genai
-from github import Github, InputFileContent
+from github import InputFileContent
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import generation, gist_publish
+from common.context_cache import CACHED_CANON_REFERENCE, format_canon
 
 # Configuration
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
@@ -60,14 +63,15 @@ def _sanitize_gist_files(files: dict) -> dict:
     return sanitized
 
 
-def generate_scene(act_num, scene_num, series_bible, outline, previous_summary):
+def generate_scene(act_num, scene_num, series_bible, outline, previous_summary, canon=None):
     """Generate a scene using Gemini AI."""
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
+        if canon:
+            # Series bible and outline are referenced from the context cache
+            series_bible = outline = CACHED_CANON_REFERENCE
         
         # Load scene prompt template
-        scene_prompt_template = load_file(PROMPTS_DIR / "scene_prompt.txt")
+        scene_prompt_template = generation.load_template(PROMPTS_DIR / "scene_prompt.txt")
         
         # Build the prompt
         prompt = scene_prompt_template.format(
@@ -80,9 +84,13 @@ def generate_scene(act_num, scene_num, series_bible, outline, previous_summary):
         )
         
         print(f"Generating Act {act_num}, Scene {scene_num}...")
-        response = model.generate_content(prompt)
-        
-        return response.text
+        return generation.generate(
+            prompt,
+            cache=True,
+            stream=True,
+            partial_path=DOCS_DIR / f"act_{act_num}_scene_{scene_num:02d}.md.partial",
+            context=canon
+        )
     except Exception as e:
         print(f"ERROR: Failed to generate scene: {e}")
         sys.exit(1)
@@ -91,11 +99,8 @@ def generate_scene(act_num, scene_num, series_bible, outline, previous_summary):
 def generate_summary(scene_text, act_num, scene_num):
     """Generate a summary of the scene for continuity."""
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
         # Load summary prompt template
-        summary_prompt_template = load_file(PROMPTS_DIR / "summary_prompt.txt")
+        summary_prompt_template = generation.load_template(PROMPTS_DIR / "summary_prompt.txt")
         
         prompt = summary_prompt_template.format(
             act_num=act_num,
@@ -104,9 +109,7 @@ def generate_summary(scene_text, act_num, scene_num):
         )
         
         print(f"Generating summary for Act {act_num}, Scene {scene_num}...")
-        response = model.generate_content(prompt)
-        
-        return response.text
+        return generation.generate(prompt, cache=True)
     except Exception as e:
         print(f"ERROR: Failed to generate summary: {e}")
         sys.exit(1)
@@ -232,8 +235,8 @@ def load_existing_drama_data(drama_structure, scene_names):
             
             # Add to chapters data
             if GIST_ID:
-                gist_url_base = f"https://gist.github.com/{GIST_ID}#{scene_filename}"
-                raw_url = f"https://gist.githubusercontent.com/pappater/{GIST_ID}/raw/{scene_filename}"
+                gist_url_base = gist_publish.html_url(GIST_ID, scene_filename)
+                raw_url = gist_publish.raw_url(GIST_ID, scene_filename)
             else:
                 gist_url_base = ""
                 raw_url = ""
@@ -287,6 +290,12 @@ def generate_complete_drama():
     # If scenes don't all exist, generate them
     print("\n⚠ Some scenes are missing. Generating all scenes...")
     
+    # Upload the canon once; every scene call references it instead of resending it
+    canon = generation.create_context_cache(
+        "The Absurd Ascent canon",
+        format_canon(series_bible=series_bible, outline=outline)
+    )
+    
     all_scenes = {}
     summaries_content = "# Scene Summaries\n\n"
     continuity_log = "# Continuity Log\n\n"
@@ -299,7 +308,7 @@ def generate_complete_drama():
         
         for scene_num in range(1, num_scenes + 1):
             # Generate scene
-            scene_text = generate_scene(act_num, scene_num, series_bible, outline, previous_summary)
+            scene_text = generate_scene(act_num, scene_num, series_bible, outline, previous_summary, canon)
             
             # Generate summary
             summary = generate_summary(scene_text, act_num, scene_num)
@@ -324,8 +333,8 @@ def generate_complete_drama():
             
             # Add to chapters data
             if GIST_ID:
-                gist_url_base = f"https://gist.github.com/{GIST_ID}#{scene_filename}"
-                raw_url = f"https://gist.githubusercontent.com/pappater/{GIST_ID}/raw/{scene_filename}"
+                gist_url_base = gist_publish.html_url(GIST_ID, scene_filename)
+                raw_url = gist_publish.raw_url(GIST_ID, scene_filename)
             else:
                 gist_url_base = ""
                 raw_url = ""
@@ -354,17 +363,22 @@ def generate_complete_drama():
 
 
 def publish_to_gist(all_scenes, chapters_data):
-    """Publish all drama content to GitHub Gist."""
+    """
+    Publish all drama content to GitHub Gist.
+    
+    Returns:
+        bool: True if the drama was published, False if publication was skipped
+    """
     if not GIST_TOKEN:
         print("WARNING: GIST_TOKEN not set. Skipping gist publication.")
-        return
+        return False
     
     if not GIST_ID:
         print("WARNING: FARCE_DRAMA_GIST_ID not set. Skipping gist publication.")
-        return
+        return False
     
     try:
-        g = Github(GIST_TOKEN)
+        g = gist_publish.connect(GIST_TOKEN)
         gist = g.get_gist(GIST_ID)
         
         # Prepare files for upload
@@ -387,6 +401,7 @@ def publish_to_gist(all_scenes, chapters_data):
         gist.edit(files=sanitized_files)
         
         print(f"\n✓ Drama published to gist: https://gist.github.com/{GIST_ID}")
+        return True
         
     except Exception as e:
         print(f"ERROR: Failed to publish to gist: {e}")
@@ -413,7 +428,12 @@ def main():
     print(f"\n✓ Generated {len(all_scenes)} scenes successfully!")
     
     # Publish to gist
-    publish_to_gist(all_scenes, chapters_data)
+    published = publish_to_gist(all_scenes, chapters_data)
+    
+    # The drama is published; a later run must write a new one, not replay this one.
+    # A skipped publish keeps the cache so the same drama can still go out.
+    if published:
+        generation.clear_response_cache()
     
     print("\n" + "=" * 60)
     print("Drama generation complete!")
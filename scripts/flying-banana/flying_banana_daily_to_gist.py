@@ -5,6 +5,7 @@ Generates one short story per day using Google Gemini AI in the style of a rando
 modern classic author, and publishes all outputs to a single public GitHub Gist.
 """
 
+import argparse
 import os
 import sys
 import json
@@ -12,8 +13,14 @@ import random
 from datetime import datetime
 from pathlib import Path
 
-import google.generativeai as genai
-from github import Github, InputFileContent
+from github import InputFileContent
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import collection_index, generation, gist_publish, idempotency, numbering
+from common.collection_index import CollectionIndex
+from common.gist_shards import ShardSet
+from common.numbering import NumberingState
+from common.rate_limit import is_model_error
 
 # Configuration
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
@@ -24,6 +31,14 @@ FLYING_BANANA_GIST_ID = os.environ.get("FLYING_BANANA_GIST_ID")
 SCRIPTS_DIR = Path(__file__).parent
 DOCS_DIR = Path(__file__).parent.parent.parent / "docs" / "flying-banana"
 PROMPTS_DIR = SCRIPTS_DIR / "prompts"
+INDEX_FILE = DOCS_DIR / "collection_index.jsonl"
+NUMBERING_FILE = DOCS_DIR / "numbering.json"
+
+# Idempotency key of this run: one publish per work and schedule slot
+RUN_KEY = idempotency.run_key(DOCS_DIR.name)
+
+# Metadata comments appended to each published story, and their index keys
+METADATA_FIELDS = {"Published": "published_date"}
 
 # Configuration files
 AUTHORS_FILE = SCRIPTS_DIR / "authors.json"
@@ -55,19 +70,6 @@ def load_json(filepath):
         return None
 
 
-def _list_and_print_models():
-    """List available Gemini models for debugging purposes."""
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        print("\nAvailable Gemini models:")
-        for model in genai.list_models():
-            print(f"  - {model.name}")
-            if hasattr(model, 'supported_generation_methods'):
-                print(f"    Supported methods: {model.supported_generation_methods}")
-    except Exception as e:
-        print(f"  Unable to list models: {e}")
-
-
 def _sanitize_gist_files(files: dict) -> dict:
     """
     Ensure values passed to gist.edit are either None or InputFileContent instances.
@@ -86,33 +88,19 @@ def _sanitize_gist_files(files: dict) -> dict:
     return sanitized
 
 
-def get_story_number(gist):
+def get_story_number(shards):
     """
-    Determine the next story number by checking what stories exist in the Gist.
+    Determine the next story number from the local numbering state.
+    The state is reconciled with the Gist's file names only when it is
+    missing or stale.
     
     Args:
-        gist: PyGithub Gist object
+        shards: ShardSet spanning every volume of the collection
     
     Returns:
         int: The next story number to generate
     """
-    story_files = [f for f in gist.files.keys() if f.startswith("story_") and f.endswith(".md")]
-    
-    if not story_files:
-        return 1
-    
-    story_numbers = []
-    for filename in story_files:
-        try:
-            num_str = filename.replace("story_", "").replace(".md", "")
-            story_numbers.append(int(num_str))
-        except ValueError:
-            continue
-    
-    if not story_numbers:
-        return 1
-    
-    return max(story_numbers) + 1
+    return numbering.next_number(NumberingState(NUMBERING_FILE, "story_"), shards)
 
 
 def select_random_author():
@@ -140,10 +128,7 @@ def select_random_author():
 def generate_short_story(story_num, author, min_words, max_words):
     """Generate a new short story using Gemini AI in the style of the selected author."""
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        story_prompt_template = load_file(PROMPTS_DIR / "story_prompt.txt")
+        story_prompt_template = generation.load_template(PROMPTS_DIR / "story_prompt.txt")
         
         prompt = story_prompt_template.format(
             author=author,
@@ -152,13 +137,12 @@ def generate_short_story(story_num, author, min_words, max_words):
         )
         
         print(f"Generating Short Story #{story_num} in the style of {author}...")
-        response = model.generate_content(prompt)
-        
-        return response.text
+        return generation.generate(prompt)
     except Exception as e:
         print(f"ERROR: Failed to generate story using model '{GEMINI_MODEL}': {e}")
-        print(f"Check if the model name is correct and available.")
-        _list_and_print_models()
+        if is_model_error(e):
+            print(f"Check if the model name is correct and available.")
+            generation.print_available_models()
         sys.exit(1)
 
 
@@ -179,69 +163,111 @@ def extract_story_title(story_text):
     return f"Story {datetime.now().strftime('%Y-%m-%d')}"
 
 
-def update_chapters_json(gist):
+def build_story_record(filename, content):
+    """
+    Build the metadata index record for a published story.
+    
+    Args:
+        filename: Story filename in the Gist (e.g. "story_001.md")
+        content: Story content as published, including metadata comments
+    
+    Returns:
+        dict: Index record with number, filename, title and metadata
+    """
+    record = {
+        "chapter": int(filename.replace("story_", "").replace(".md", "")),
+        "filename": filename
+    }
+    title = extract_story_title(content)
+    if title:
+        record["chapter_name"] = title
+    record.update(collection_index.parse_metadata(content, METADATA_FIELDS))
+    return record
+
+
+def load_index(gist):
+    """
+    Return the metadata index records, first indexing any stories in the Gist
+    that are missing from it.
+    Only the file listing is checked, so this reads no story content unless
+    the index is missing entries (e.g. on first use).
+    
+    Args:
+        gist: PyGithub Gist object, or a ShardSet spanning every volume
+    
+    Returns:
+        list: Index records ordered by story number
+    """
+    index = CollectionIndex(INDEX_FILE)
+    records = index.records()
+    indexed = {record["filename"] for record in records}
+    missing = sorted(
+        f for f in gist.files.keys()
+        if f.startswith("story_") and f.endswith(".md") and f not in indexed
+    )
+    if not missing:
+        return records
+    
+    print(f"Indexing {len(missing)} stories missing from {INDEX_FILE.name}...")
+    for filename in missing:
+        try:
+            index.append(build_story_record(filename, gist_publish.read_file(gist.files[filename])))
+        except ValueError:
+            continue
+    return index.records()
+
+
+def rebuild_index(gist):
+    """
+    Rebuild the metadata index from scratch by reading every story in the Gist.
+    
+    Args:
+        gist: PyGithub Gist object, or a ShardSet spanning every volume
+    """
+    CollectionIndex(INDEX_FILE).rebuild([])
+    records = load_index(gist)
+    print(f"✓ Rebuilt {INDEX_FILE.name} with {len(records)} stories")
+
+
+def update_chapters_json(records, shards):
     """
     Create/update chapters.json with all story mappings and their Gist URLs.
     Note: Using 'chapters' key for compatibility with existing reader UI.
     
     Args:
-        gist: PyGithub Gist object
+        records: Story records from the metadata index
+        shards: ShardSet the collection is published to
     
     Returns:
         str: JSON string of stories mapping
     """
-    story_files = sorted([f for f in gist.files.keys() if f.startswith("story_") and f.endswith(".md")])
-    
     stories = []
-    for filename in story_files:
-        try:
-            num_str = filename.replace("story_", "").replace(".md", "")
-            story_num = int(num_str)
-            
-            raw_url = gist.files[filename].raw_url
-            
-            # Try to extract story metadata from tracking file
-            story_data = {
-                "chapter": story_num,  # Using 'chapter' for compatibility with UI
-                "filename": filename,
-                "url": raw_url,
-                "gist_url": f"https://gist.github.com/{FLYING_BANANA_GIST_ID}#{filename}"
-            }
-            
-            # Try to get story title and metadata from the file content
-            try:
-                file_content = gist.files[filename].content
-                title = extract_story_title(file_content)
-                if title:
-                    story_data["chapter_name"] = title
-                
-                # Look for publish date in metadata comment at end of file
-                lines = file_content.split('\n')
-                for line in reversed(lines[-5:]):  # Check last 5 lines
-                    if line.startswith('<!-- Published: ') and line.endswith(' -->'):
-                        date_str = line.replace('<!-- Published: ', '').replace(' -->', '').strip()
-                        story_data["published_date"] = date_str
-                        break
-            except Exception:
-                pass
-            
-            stories.append(story_data)
-        except (ValueError, KeyError):
-            continue
+    for record in records:
+        story_data = {
+            "chapter": record["chapter"],  # Using 'chapter' for compatibility with UI
+            "filename": record["filename"],
+            "url": gist_publish.raw_url(shards.gist_id_for(record["chapter"]), record["filename"]),
+            "gist_url": gist_publish.html_url(shards.gist_id_for(record["chapter"]), record["filename"])
+        }
+        # Title and metadata recorded in the index when the story was published
+        story_data.update({k: v for k, v in record.items() if k not in story_data})
+        stories.append(story_data)
     
     chapters_data = {
         "novel_title": "Flying Banana",
         "total_chapters": len(stories),
         "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC"),
         "gist_id": FLYING_BANANA_GIST_ID,
+        "last_run_key": RUN_KEY,
         "completed": False,  # Short stories never complete - they continue indefinitely
+        "shards": shards.index(),
         "chapters": stories
     }
     
     return json.dumps(chapters_data, indent=2)
 
 
-def update_gist(story_num, story_text, author, gist):
+def update_gist(story_num, story_text, author, shards):
     """
     Update the GitHub Gist with new short story and chapters.json.
     
@@ -249,7 +275,7 @@ def update_gist(story_num, story_text, author, gist):
         story_num: Story number being added
         story_text: Story content
         author: Author whose style was emulated
-        gist: PyGithub Gist object
+        shards: ShardSet the collection is published to
     """
     files = {}
     
@@ -259,32 +285,45 @@ def update_gist(story_num, story_text, author, gist):
     
     # Add metadata comment at the end for tracking
     story_content = f"{story_text}\n\n<!-- Author Style: {author} -->\n<!-- Published: {publish_datetime} -->"
-    files[story_filename] = story_content
     
     # Also update README if it exists
     readme = load_file(DOCS_DIR / "README.md")
     if readme:
         files["README.md"] = readme
     
+    # Index the new story and build chapters.json locally, so everything goes out in one edit
+    record = build_story_record(story_filename, story_content)
+    records = [r for r in load_index(shards) if r["chapter"] != story_num] + [record]
+    
+    # The first volume takes the story in the same edit as chapters.json; once it is
+    # full, the story goes to the active (or a new) volume gist first
+    shard = shards.volume_for(len(story_content.encode("utf-8")))
+    if shard is shards.first:
+        files[story_filename] = story_content
+    else:
+        print(f"Publishing {story_filename} to volume {shard['volume']}...")
+        shards.publish(
+            shard,
+            _sanitize_gist_files({story_filename: story_content}),
+            f"Flying Banana - Short Story Collection - Volume {shard['volume']}"
+        )
+    shards.record(shard, story_num, story_content)
+    
+    chapters_json = update_chapters_json(records, shards)
+    chapters_data = json.loads(chapters_json)
+    files["chapters.json"] = chapters_json
+    
     print(f"Updating Gist {FLYING_BANANA_GIST_ID}...")
     
     sanitized_files = _sanitize_gist_files(files)
     
-    gist.edit(
+    shards.gist.edit(
         description=f"Flying Banana - Short Story Collection - {story_num} Stories",
         files=sanitized_files
     )
     
-    # Refresh gist to get updated file information
-    g = Github(GIST_TOKEN)
-    refreshed_gist = g.get_gist(FLYING_BANANA_GIST_ID)
-    
-    # Update chapters.json with all story mappings
-    chapters_json = update_chapters_json(refreshed_gist)
-    chapters_data = json.loads(chapters_json)
-    files_json = {"chapters.json": chapters_json}
-    sanitized_json = _sanitize_gist_files(files_json)
-    refreshed_gist.edit(files=sanitized_json)
+    CollectionIndex(INDEX_FILE).append(record)
+    NumberingState(NUMBERING_FILE, "story_").record(story_num, run_key=RUN_KEY)
     
     # Save chapters.json locally
     save_file(DOCS_DIR / "chapters.json", chapters_json)
@@ -296,6 +335,26 @@ def update_gist(story_num, story_text, author, gist):
 
 def main():
     """Main execution flow."""
+    parser = argparse.ArgumentParser(description="Daily Flying Banana Short Story Generator")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Rebuild collection_index.jsonl from the Gist instead of generating")
+    parser.add_argument("--force", action="store_true",
+                        help="Publish even if this schedule slot already has a publish")
+    args = parser.parse_args()
+    
+    if args.rebuild_index:
+        if not GIST_TOKEN or not FLYING_BANANA_GIST_ID:
+            print("ERROR: GIST_TOKEN and FLYING_BANANA_GIST_ID environment variables must be set")
+            sys.exit(1)
+        g = gist_publish.connect(GIST_TOKEN)
+        rebuild_index(ShardSet(g, gist_publish.get_gist_metadata(g, FLYING_BANANA_GIST_ID), "story_", DOCS_DIR / "chapters.json"))
+        return
+    
+    # A retried or repeated run in the same schedule slot has nothing to do
+    if not args.force and NumberingState(NUMBERING_FILE, "story_").last_run_key == RUN_KEY:
+        print(f"✓ Already published for this schedule slot ({RUN_KEY}). Use --force to publish another story.")
+        return
+    
     # Validate environment variables
     if not GEMINI_API_KEY:
         print("ERROR: GEMINI_API_KEY environment variable not set")
@@ -324,12 +383,22 @@ def main():
     print(f"Word count range: {min_words} - {max_words}")
     
     # Get Gist object
-    g = Github(GIST_TOKEN)
-    gist = g.get_gist(FLYING_BANANA_GIST_ID)
+    g = gist_publish.connect(GIST_TOKEN)
+    gist = gist_publish.get_gist_metadata(g, FLYING_BANANA_GIST_ID)
     print(f"✓ Connected to Gist {FLYING_BANANA_GIST_ID}")
     
+    # The local state of a run that published but failed to commit is lost;
+    # the key published in chapters.json still marks this slot as done
+    if not args.force and idempotency.published_run_key(gist) == RUN_KEY:
+        print(f"✓ Already published for this schedule slot ({RUN_KEY}, per the Gist). Use --force to publish another story.")
+        return
+    
+    shards = ShardSet(g, gist, "story_", DOCS_DIR / "chapters.json")
+    if len(shards.shards) > 1:
+        print(f"✓ Collection spans {len(shards.shards)} volumes")
+    
     # Determine story number
-    story_num = get_story_number(gist)
+    story_num = get_story_number(shards)
     print(f"\nGenerating Short Story #{story_num}")
     
     # Select random author
@@ -339,7 +408,7 @@ def main():
     story_text = generate_short_story(story_num, author, min_words, max_words)
     
     # Update Gist with new story and chapters.json
-    update_gist(story_num, story_text, author, gist)
+    update_gist(story_num, story_text, author, shards)
     
     print("\n" + "=" * 60)
     print("✓ Daily short story generation complete!")
@@ -5,14 +5,17 @@ Generates all chapters at once using Google Gemini AI in a Hemingway-like voice,
 and publishes all outputs to a single public GitHub Gist.
 """
 
+import argparse
 import os
 import sys
 import json
 from datetime import datetime, timezone
 from pathlib import Path
 
-import google.generativeai as genai
-from github import Github, InputFileContent
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import generation, gist_publish, gist_upload
+from common.context_cache import CACHED_CANON_REFERENCE, format_canon
+from common.summaries import RunningSynopsis
 
 # Configuration
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
@@ -22,6 +25,7 @@ HEMINGWAY_GIST_ID = os.environ.get("HEMINGWAY_GIST_ID")
 
 DOCS_DIR = Path(__file__).parent.parent.parent / "docs" / "hemingway-novel"
 PROMPTS_DIR = Path(__file__).parent / "prompts"
+MANIFEST_FILE = DOCS_DIR / "gist_manifest.json"
 
 # Novel configuration
 NOVEL_TITLE = "The Sun Also Rises Again"
@@ -44,53 +48,19 @@ def save_file(filepath, content):
         f.write(content)
 
 
-def _list_and_print_models():
-    """List available Gemini models for debugging purposes."""
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        print("\nAvailable Gemini models:")
-        for model in genai.list_models():
-            print(f"  - {model.name}")
-            if hasattr(model, 'supported_generation_methods'):
-                print(f"    Supported methods: {model.supported_generation_methods}")
-    except Exception as e:
-        print(f"  Unable to list models: {e}")
-
-
-def _sanitize_gist_files(files: dict) -> dict:
-    """
-    Ensure values passed to gist.edit are either None or InputFileContent instances.
-    """
-    sanitized = {}
-    for name, value in (files or {}).items():
-        if value is None:
-            sanitized[name] = None
-        elif isinstance(value, InputFileContent):
-            sanitized[name] = value
-        elif isinstance(value, dict):
-            content = value.get('content', str(value))
-            sanitized[name] = InputFileContent(content)
-        else:
-            sanitized[name] = InputFileContent(str(value))
-    return sanitized
-
-
 def generate_series_bible():
     """Generate the series bible with characters, setting, and themes."""
     print("Generating series bible...")
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        bible_prompt = load_file(PROMPTS_DIR / "bible_prompt.txt")
+        bible_prompt = generation.load_template(PROMPTS_DIR / "bible_prompt.txt")
         
         prompt = bible_prompt.format(
             novel_title=NOVEL_TITLE,
             theme=THEME
         )
         
-        response = model.generate_content(prompt)
-        series_bible = response.text.strip()
+        response_text = generation.generate(prompt, cache=True)
+        series_bible = response_text.strip()
         
         print(f"Generated series bible ({len(series_bible)} characters)")
         return series_bible
@@ -103,10 +73,7 @@ def generate_outline(series_bible):
     """Generate the complete outline for all chapters."""
     print("Generating novel outline...")
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        outline_prompt = load_file(PROMPTS_DIR / "outline_prompt.txt")
+        outline_prompt = generation.load_template(PROMPTS_DIR / "outline_prompt.txt")
         
         prompt = outline_prompt.format(
             novel_title=NOVEL_TITLE,
@@ -115,8 +82,8 @@ def generate_outline(series_bible):
             series_bible=series_bible
         )
         
-        response = model.generate_content(prompt)
-        outline = response.text.strip()
+        response_text = generation.generate(prompt, cache=True)
+        outline = response_text.strip()
         
         print(f"Generated outline ({len(outline)} characters)")
         return outline
@@ -125,14 +92,15 @@ def generate_outline(series_bible):
         sys.exit(1)
 
 
-def generate_chapter(chapter_num, series_bible, outline, previous_summaries):
+def generate_chapter(chapter_num, series_bible, outline, previous_summaries, canon=None):
     """Generate a single chapter using Gemini AI in Hemingway style."""
     print(f"Generating Chapter {chapter_num}...")
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
+        if canon:
+            # Series bible and outline are referenced from the context cache
+            series_bible = outline = CACHED_CANON_REFERENCE
         
-        chapter_prompt_template = load_file(PROMPTS_DIR / "chapter_prompt.txt")
+        chapter_prompt_template = generation.load_template(PROMPTS_DIR / "chapter_prompt.txt")
         
         prompt = chapter_prompt_template.format(
             chapter_number=chapter_num,
@@ -143,8 +111,14 @@ def generate_chapter(chapter_num, series_bible, outline, previous_summaries):
             previous_summaries=previous_summaries or "This is the first chapter."
         )
         
-        response = model.generate_content(prompt)
-        chapter_text = response.text.strip()
+        response_text = generation.generate(
+            prompt,
+            cache=True,
+            stream=True,
+            partial_path=DOCS_DIR / f"chapter_{chapter_num:03d}.md.partial",
+            context=canon
+        )
+        chapter_text = response_text.strip()
         
         print(f"Generated Chapter {chapter_num} ({len(chapter_text)} characters)")
         return chapter_text
@@ -157,18 +131,15 @@ def generate_summary(chapter_num, chapter_text):
     """Generate a summary of the chapter for continuity."""
     print(f"Generating summary for Chapter {chapter_num}...")
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        summary_prompt_template = load_file(PROMPTS_DIR / "summary_prompt.txt")
+        summary_prompt_template = generation.load_template(PROMPTS_DIR / "summary_prompt.txt")
         
         prompt = summary_prompt_template.format(
             chapter_number=chapter_num,
             chapter_text=chapter_text
         )
         
-        response = model.generate_content(prompt)
-        summary = response.text.strip()
+        response_text = generation.generate(prompt, cache=True)
+        summary = response_text.strip()
         
         print(f"Generated summary for Chapter {chapter_num}")
         return summary
@@ -194,12 +165,109 @@ def extract_chapter_title(chapter_text):
     return f"Chapter {chapter_text.split()[1] if len(chapter_text.split()) > 1 else ''}"
 
 
+def build_chapters_json(chapters_data, completed):
+    """
+    Build chapters.json for the chapters finished so far.
+    
+    Args:
+        chapters_data: Chapter number, filename and name of each finished chapter
+        completed: Whether the whole book is done
+    
+    Returns:
+        str: JSON string of chapters mapping
+    """
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+    chapters_json = {
+        "novel_title": NOVEL_TITLE,
+        "total_chapters": len(chapters_data),
+        "last_updated": timestamp,
+        "gist_id": HEMINGWAY_GIST_ID,
+        "completed": completed,
+        "chapters": []
+    }
+    
+    for chapter_info in chapters_data:
+        chapters_json["chapters"].append({
+            "chapter": chapter_info["chapter"],
+            "filename": chapter_info["filename"],
+            "url": gist_publish.raw_url(HEMINGWAY_GIST_ID, chapter_info["filename"]),
+            "gist_url": gist_publish.html_url(HEMINGWAY_GIST_ID, chapter_info["filename"]),
+            "chapter_name": chapter_info["chapter_name"]
+        })
+    
+    return json.dumps(chapters_json, indent=2)
+
+
+def book_files(chapter_filenames):
+    """
+    Return the Gist files of the book, as local paths to stream from disk.
+    
+    Args:
+        chapter_filenames: Chapter files in DOCS_DIR
+    
+    Returns:
+        dict: Gist filename to Path (or str content for the README)
+    """
+    gist_files = {
+        "README.md": f"# {NOVEL_TITLE}\n\nA complete novel in the style of Ernest Hemingway.\n\nGenerated by the mockpoet platform.",
+        "series_bible.md": DOCS_DIR / "series_bible.md",
+        "outline.md": DOCS_DIR / "outline.md"
+    }
+    for chapter_filename in chapter_filenames:
+        gist_files[chapter_filename] = DOCS_DIR / chapter_filename
+    gist_files["summaries.md"] = DOCS_DIR / "summaries.md"
+    gist_files["continuity_log.txt"] = DOCS_DIR / "continuity_log.txt"
+    return gist_files
+
+
+def upload_to_gist(gist, chapter_filenames):
+    """
+    Upload the book to the Gist from its local files, in size-bounded batches.
+    
+    chapters.json goes last, once every chapter has landed. Landed batches are
+    recorded in the manifest, so a rerun (see --upload-only) sends only what
+    is still missing; after a full run that is usually just chapters.json,
+    since each chapter was already published in the background.
+    
+    Args:
+        gist: PyGithub Gist object
+        chapter_filenames: Chapter files in DOCS_DIR to upload
+    """
+    print("Uploading all files to Gist...")
+    try:
+        upload = gist_upload.upload_files(
+            gist, book_files(chapter_filenames), MANIFEST_FILE,
+            index_files={"chapters.json": DOCS_DIR / "chapters.json"}
+        )
+        print(f"Successfully uploaded {upload['sent']} files to Gist in {upload['batches']} batches "
+              f"({upload['skipped']} already up to date)")
+        print(f"Gist URL: {gist.html_url}")
+    except Exception as e:
+        print(f"ERROR uploading to Gist: {e}")
+        print(f"Landed batches are recorded in {MANIFEST_FILE.name}; rerun with --upload-only to resume.")
+        sys.exit(1)
+
+
 def main():
     """Main execution function."""
+    parser = argparse.ArgumentParser(description="Complete Hemingway-style Novel Generator")
+    parser.add_argument("--upload-only", action="store_true",
+                        help="Upload the book already in docs/hemingway-novel instead of generating")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Complete Hemingway-style Novel Generator")
     print("=" * 60)
     
+    if args.upload_only:
+        chapters = json.loads(load_file(DOCS_DIR / "chapters.json") or "{}").get("chapters", [])
+        if not GIST_TOKEN or not HEMINGWAY_GIST_ID or not chapters:
+            print("ERROR: --upload-only needs GIST_TOKEN, HEMINGWAY_GIST_ID and a generated chapters.json")
+            sys.exit(1)
+        gist = gist_publish.get_gist_metadata(gist_publish.connect(GIST_TOKEN), HEMINGWAY_GIST_ID)
+        upload_to_gist(gist, [c["filename"] for c in chapters])
+        return
+    
     # Validate environment variables
     if not GEMINI_API_KEY:
         print("ERROR: GEMINI_API_KEY environment variable not set")
@@ -219,8 +287,8 @@ def main():
     
     # Connect to GitHub
     try:
-        gh = Github(GIST_TOKEN)
-        gist = gh.get_gist(HEMINGWAY_GIST_ID)
+        gh = gist_publish.connect(GIST_TOKEN)
+        gist = gist_publish.get_gist_metadata(gh, HEMINGWAY_GIST_ID)
         print(f"Connected to Gist: {gist.html_url}")
     except Exception as e:
         print(f"ERROR: Failed to connect to Gist: {e}")
@@ -234,15 +302,22 @@ def main():
     outline = generate_outline(series_bible)
     save_file(DOCS_DIR / "outline.md", outline)
     
+    # Upload the canon once; every chapter call references it instead of resending it
+    canon = generation.create_context_cache(
+        f"{NOVEL_TITLE} canon",
+        format_canon(series_bible=series_bible, outline=outline)
+    )
+    
+    # Publishes each finished chapter while the next one is generated
+    publisher = gist_upload.BackgroundUploader(gist, MANIFEST_FILE)
+    
     # Initialize tracking structures
     all_summaries = []
+    synopsis = RunningSynopsis()
+    context_tokens = 0
+    full_history_tokens = 0
     continuity_log = []
     chapters_data = []
-    gist_files = {
-        "README.md": InputFileContent(f"# {NOVEL_TITLE}\n\nA complete novel in the style of Ernest Hemingway.\n\nGenerated by the mockpoet platform."),
-        "series_bible.md": InputFileContent(series_bible),
-        "outline.md": InputFileContent(outline)
-    }
     
     # Generate all chapters
     for chapter_num in range(1, TOTAL_CHAPTERS + 1):
@@ -251,9 +326,13 @@ def main():
             print(f"Processing Chapter {chapter_num} of {TOTAL_CHAPTERS}")
             print(f"{'='*60}")
             
+            # Constant-size context: running synopsis plus the latest summaries
+            previous_summaries = synopsis.context()
+            context_tokens += generation.estimate_tokens(previous_summaries)
+            full_history_tokens += generation.estimate_tokens("\n\n".join(all_summaries))
+            
             # Generate chapter
-            previous_summaries = "\n\n".join(all_summaries) if all_summaries else None
-            chapter_text = generate_chapter(chapter_num, series_bible, outline, previous_summaries)
+            chapter_text = generate_chapter(chapter_num, series_bible, outline, previous_summaries, canon)
             
             if not chapter_text:
                 print(f"ERROR: Failed to generate chapter {chapter_num}.")
@@ -272,6 +351,7 @@ def main():
             # Generate summary
             summary = generate_summary(chapter_num, chapter_text)
             all_summaries.append(f"**Chapter {chapter_num}: {chapter_title}**\n{summary}")
+            synopsis.add(chapter_num, all_summaries[-1])
             
             # Update continuity log
             timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
@@ -284,21 +364,19 @@ def main():
                 "chapter_name": chapter_title
             })
             
-            # Add to gist files
-            gist_files[chapter_filename] = InputFileContent(chapter_text)
-            
             print(f"✓ Completed Chapter {chapter_num}: {chapter_title}")
             
-            # Save progress periodically (every 5 chapters)
-            if chapter_num % 5 == 0:
-                print(f"\n--- Checkpoint: Saving progress after {chapter_num} chapters ---")
-                # Save summaries so far
-                summaries_content = "\n\n---\n\n".join(all_summaries)
-                save_file(DOCS_DIR / "summaries.md", summaries_content)
-                # Save continuity log so far
-                continuity_content = "\n".join(continuity_log)
-                save_file(DOCS_DIR / "continuity_log.txt", continuity_content)
-                print(f"--- Checkpoint saved ---\n")
+            # Checkpoint summaries and continuity log after every chapter
+            summaries_content = "\n\n---\n\n".join(all_summaries)
+            save_file(DOCS_DIR / "summaries.md", summaries_content)
+            continuity_content = "\n".join(continuity_log)
+            save_file(DOCS_DIR / "continuity_log.txt", continuity_content)
+            
+            # Publish the chapter and an updated chapters.json in the background
+            publisher.submit(
+                book_files([c["filename"] for c in chapters_data]),
+                {"chapters.json": build_chapters_json(chapters_data, completed=False)}
+            )
             
         except Exception as e:
             print(f"\n{'!'*60}")
@@ -314,55 +392,44 @@ def main():
     # Save summaries
     summaries_content = "\n\n---\n\n".join(all_summaries)
     save_file(DOCS_DIR / "summaries.md", summaries_content)
-    gist_files["summaries.md"] = InputFileContent(summaries_content)
     
     # Save continuity log
     continuity_content = "\n".join(continuity_log)
     save_file(DOCS_DIR / "continuity_log.txt", continuity_content)
-    gist_files["continuity_log.txt"] = InputFileContent(continuity_content)
     
-    # Create chapters.json
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-    chapters_json = {
-        "novel_title": NOVEL_TITLE,
-        "total_chapters": len(chapters_data),
-        "last_updated": timestamp,
-        "gist_id": HEMINGWAY_GIST_ID,
-        "completed": True,
-        "chapters": []
-    }
+    # A loop that broke early leaves the book unfinished
+    finished = len(chapters_data) == TOTAL_CHAPTERS
+    if not finished:
+        print(f"⚠ Only {len(chapters_data)} of {TOTAL_CHAPTERS} chapters were generated; "
+              f"the book stays marked as in progress")
     
-    # Update chapter URLs after gist update
-    for chapter_info in chapters_data:
-        chapters_json["chapters"].append({
-            "chapter": chapter_info["chapter"],
-            "filename": chapter_info["filename"],
-            "url": f"https://gist.githubusercontent.com/pappater/{HEMINGWAY_GIST_ID}/raw/{chapter_info['filename']}",
-            "gist_url": f"https://gist.github.com/{HEMINGWAY_GIST_ID}#{chapter_info['filename']}",
-            "chapter_name": chapter_info["chapter_name"]
-        })
-    
-    # Save chapters.json locally
-    chapters_json_str = json.dumps(chapters_json, indent=2)
+    # Create chapters.json and save it locally
+    chapters_json_str = build_chapters_json(chapters_data, completed=finished)
     save_file(DOCS_DIR / "chapters.json", chapters_json_str)
-    gist_files["chapters.json"] = InputFileContent(chapters_json_str)
     
     # Also save to public directory
     public_chapters_dir = Path(__file__).parent.parent.parent / "public" / "docs" / "hemingway-novel"
     public_chapters_dir.mkdir(parents=True, exist_ok=True)
     save_file(public_chapters_dir / "chapters.json", chapters_json_str)
     
-    # Upload all files to Gist
-    print("Uploading all files to Gist...")
-    try:
-        sanitized_files = _sanitize_gist_files(gist_files)
-        gist.edit(files=sanitized_files)
-        print(f"Successfully uploaded {len(gist_files)} files to Gist")
-        print(f"Gist URL: {gist.html_url}")
-    except Exception as e:
-        print(f"ERROR uploading to Gist: {e}")
-        sys.exit(1)
+    # Let the background publisher finish, then upload whatever it has not sent
+    publisher.close()
+    print(f"Published {publisher.uploads} background updates during generation"
+          + (f" ({len(publisher.errors)} failed)" if publisher.errors else ""))
+    upload_to_gist(gist, [c["filename"] for c in chapters_data])
     
+    # The book is published; a later run must write a new one, not replay this one.
+    # An unfinished book keeps its cache so the next run can resume it.
+    if finished:
+        generation.clear_response_cache()
+    
+    usage = generation.get_usage()
+    print()
+    print(f"Previous-summary context sent: ~{context_tokens} tokens "
+          f"(full summary history would have been ~{full_history_tokens} tokens)")
+    print(f"Total input this run: ~{usage['input_tokens']} tokens over {usage['api_calls']} API calls "
+          f"({usage['cache_hits']} served from cache, ~{usage['cached_input_tokens']} canon tokens "
+          f"read from the context cache)")
     print()
     print("=" * 60)
     print(f"Novel generation complete!")
@@ -6,14 +6,20 @@ maintains continuity via series bible, outline, summaries, and a continuity log,
 and publishes all outputs to a single public GitHub Gist.
 """
 
+import argparse
 import os
 import sys
 import json
 from datetime import datetime
 from pathlib import Path
 
-import google.generativeai as genai
-from github import Github, InputFileContent
+from github import InputFileContent
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import generation, gist_publish, idempotency, numbering, summaries as summary_store
+from common.numbering import NumberingState
+from common.rate_limit import is_model_error
+from common.run_journal import RunJournal
 
 # Configuration
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
@@ -23,6 +29,12 @@ GIST_ID = os.environ.get("GIST_ID")
 
 DOCS_DIR = Path(__file__).parent.parent.parent / "docs" / "novel-gist"
 PROMPTS_DIR = Path(__file__).parent / "prompts"
+MANIFEST_FILE = DOCS_DIR / "gist_manifest.json"
+NUMBERING_FILE = DOCS_DIR / "numbering.json"
+JOURNAL_FILE = DOCS_DIR / "run_journal.json"
+
+# Idempotency key of this run: one publish per work and schedule slot
+RUN_KEY = idempotency.run_key(DOCS_DIR.name)
 
 # Theme for the novel
 THEME = "Debt, mercy, and the burden of promises"
@@ -43,19 +55,6 @@ def save_file(filepath, content):
         f.write(content)
 
 
-def _list_and_print_models():
-    """List available Gemini models for debugging purposes."""
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        print("\nAvailable Gemini models:")
-        for model in genai.list_models():
-            print(f"  - {model.name}")
-            if hasattr(model, 'supported_generation_methods'):
-                print(f"    Supported methods: {model.supported_generation_methods}")
-    except Exception as e:
-        print(f"  Unable to list models: {e}")
-
-
 def _sanitize_gist_files(files: dict) -> dict:
     """
     Ensure values passed to gist.edit are either None or InputFileContent instances.
@@ -83,45 +82,24 @@ def _sanitize_gist_files(files: dict) -> dict:
 
 def get_chapter_number(gist):
     """
-    Determine the next chapter number by checking what chapters exist in the Gist.
+    Determine the next chapter number from the local numbering state.
+    The state is reconciled with the Gist's file names only when it is
+    missing or stale.
     
     Args:
-        gist: PyGithub Gist object
+        gist: Gist object from gist_publish.get_gist_metadata
     
     Returns:
         int: The next chapter number to generate
     """
-    # Get all chapter files from the Gist
-    chapter_files = [f for f in gist.files.keys() if f.startswith("chapter_") and f.endswith(".md")]
-    
-    if not chapter_files:
-        return 1
-    
-    # Extract chapter numbers from filenames (e.g., "chapter_001.md" -> 1)
-    chapter_numbers = []
-    for filename in chapter_files:
-        try:
-            # Extract the number part between "chapter_" and ".md"
-            num_str = filename.replace("chapter_", "").replace(".md", "")
-            chapter_numbers.append(int(num_str))
-        except ValueError:
-            continue
-    
-    if not chapter_numbers:
-        return 1
-    
-    # Return the next sequential chapter number
-    return max(chapter_numbers) + 1
+    return numbering.next_number(NumberingState(NUMBERING_FILE, "chapter_"), gist)
 
 
 def generate_chapter(chapter_num, series_bible, outline, previous_summary):
     """Generate a new chapter using Gemini AI."""
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
         # Load chapter prompt template
-        chapter_prompt_template = load_file(PROMPTS_DIR / "chapter_prompt.txt")
+        chapter_prompt_template = generation.load_template(PROMPTS_DIR / "chapter_prompt.txt")
         
         # Build the prompt
         prompt = chapter_prompt_template.format(
@@ -133,24 +111,25 @@ def generate_chapter(chapter_num, series_bible, outline, previous_summary):
         )
         
         print(f"Generating Chapter {chapter_num}...")
-        response = model.generate_content(prompt)
-        
-        return response.text
+        return generation.generate(
+            prompt,
+            cache=True,
+            stream=True,
+            partial_path=DOCS_DIR / f"chapter_{chapter_num:03d}.md.partial"
+        )
     except Exception as e:
         print(f"ERROR: Failed to generate chapter using model '{GEMINI_MODEL}': {e}")
-        print(f"Check if the model name is correct and available.")
-        _list_and_print_models()
+        if is_model_error(e):
+            print(f"Check if the model name is correct and available.")
+            generation.print_available_models()
         sys.exit(1)
 
 
 def generate_summary(chapter_text, chapter_num):
     """Generate a summary of the chapter for continuity."""
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
         # Load summary prompt template
-        summary_prompt_template = load_file(PROMPTS_DIR / "summary_prompt.txt")
+        summary_prompt_template = generation.load_template(PROMPTS_DIR / "summary_prompt.txt")
         
         prompt = summary_prompt_template.format(
             chapter_num=chapter_num,
@@ -158,13 +137,12 @@ def generate_summary(chapter_text, chapter_num):
         )
         
         print(f"Generating summary for Chapter {chapter_num}...")
-        response = model.generate_content(prompt)
-        
-        return response.text
+        return generation.generate(prompt, cache=True)
     except Exception as e:
         print(f"ERROR: Failed to generate summary using model '{GEMINI_MODEL}': {e}")
-        print(f"Check if the model name is correct and available.")
-        _list_and_print_models()
+        if is_model_error(e):
+            print(f"Check if the model name is correct and available.")
+            generation.print_available_models()
         sys.exit(1)
 
 
@@ -214,18 +192,27 @@ def parse_chapter_names_from_outline(outline_content):
     return chapter_names
 
 
-def update_chapters_json(gist):
+def update_chapters_json(gist, new_files=()):
     """
     Create/update chapters.json with all chapter mappings and their Gist URLs.
     
+    The index is built locally from the files already in the Gist plus the
+    ones about to be published, so it can be sent in the same edit.
+    
     Args:
-        gist: PyGithub Gist object
+        gist: PyGithub Gist object (as fetched before the edit)
+        new_files: Filenames being added in the same edit
     
     Returns:
         str: JSON string of chapters mapping
     """
-    # Get all chapter files from the Gist
-    chapter_files = sorted([f for f in gist.files.keys() if f.startswith("chapter_") and f.endswith(".md")])
+    # Chapter files already in the Gist plus the ones being published now
+    filenames = set(gist.files.keys()) | set(new_files)
+    # Numeric order, so chapter_1000.md sorts after chapter_999.md
+    chapter_files = sorted(
+        (f for f in filenames if numbering.parse_number(f, "chapter_") is not None),
+        key=lambda f: numbering.parse_number(f, "chapter_")
+    )
     
     # Load outline to get chapter names
     outline = load_file(DOCS_DIR / "outline.md")
@@ -238,14 +225,11 @@ def update_chapters_json(gist):
             num_str = filename.replace("chapter_", "").replace(".md", "")
             chapter_num = int(num_str)
             
-            # Build the raw content URL for this chapter
-            raw_url = gist.files[filename].raw_url
-            
             chapter_data = {
                 "chapter": chapter_num,
                 "filename": filename,
-                "url": raw_url,
-                "gist_url": f"https://gist.github.com/{GIST_ID}#{filename}"
+                "url": gist_publish.raw_url(GIST_ID, filename),
+                "gist_url": gist_publish.html_url(GIST_ID, filename)
             }
             
             # Add chapter name if available
@@ -253,7 +237,7 @@ def update_chapters_json(gist):
                 chapter_data["chapter_name"] = chapter_names[chapter_num]
             
             chapters.append(chapter_data)
-        except (ValueError, KeyError):
+        except ValueError:
             continue
     
     chapters_data = {
@@ -261,6 +245,7 @@ def update_chapters_json(gist):
         "total_chapters": len(chapters),
         "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC"),
         "gist_id": GIST_ID,
+        "last_run_key": RUN_KEY,
         "completed": False,
         "chapters": chapters
     }
@@ -307,9 +292,18 @@ def update_gist(chapter_num, chapter_text, continuity_log, gist):
     if summaries:
         files["summaries.md"] = summaries
     
-    print(f"Updating Gist {GIST_ID}...")
+    # Index the new chapter in the same edit, so the Gist never has a stale chapters.json
+    chapters_json = update_chapters_json(gist, [chapter_filename])
+    chapters_data = json.loads(chapters_json)
+    files["chapters.json"] = chapters_json
+    
+    # Only send files whose content changed since the last publish
+    manifest = gist_publish.GistManifest(MANIFEST_FILE, gist)
+    changed_files = manifest.changed(files)
+    
+    print(f"Updating Gist {GIST_ID} ({len(changed_files)} of {len(files)} files changed)...")
 
-    sanitized_files = _sanitize_gist_files(files)
+    sanitized_files = _sanitize_gist_files(changed_files)
 
     try:
         gist.edit(
@@ -326,18 +320,8 @@ def update_gist(chapter_num, chapter_text, continuity_log, gist):
             files=sanitized_files
         )
     
-    # Refresh gist to get updated file information after the edit
-    # PyGithub doesn't auto-update file URLs after edit(), but we need the
-    # fresh raw_url values for chapters.json. This requires a new API call.
-    g = Github(GIST_TOKEN)
-    refreshed_gist = g.get_gist(GIST_ID)
-    
-    # Update chapters.json with all chapter mappings (including the newly added chapter)
-    chapters_json = update_chapters_json(refreshed_gist)
-    chapters_data = json.loads(chapters_json)
-    files_json = {"chapters.json": chapters_json}
-    sanitized_json = _sanitize_gist_files(files_json)
-    refreshed_gist.edit(files=sanitized_json)
+    manifest.record(changed_files)
+    NumberingState(NUMBERING_FILE, "chapter_").record(chapter_num, run_key=RUN_KEY)
     
     # Also save chapters.json locally
     save_file(DOCS_DIR / "chapters.json", chapters_json)
@@ -393,9 +377,16 @@ def ensure_first_chapter_in_gist(gist, series_bible, outline, summaries):
     if outline:
         files["outline.md"] = outline
     
+    # Initial chapters.json, sent in the same edit
+    chapters_json = update_chapters_json(gist, ["chapter_001.md"])
+    files["chapters.json"] = chapters_json
+    
+    manifest = gist_publish.GistManifest(MANIFEST_FILE, gist)
+    changed_files = manifest.changed(files)
+    
     print(f"Publishing Chapter 1 to Gist {GIST_ID}...")
 
-    sanitized_files = _sanitize_gist_files(files)
+    sanitized_files = _sanitize_gist_files(changed_files)
 
     try:
         gist.edit(
@@ -412,17 +403,8 @@ def ensure_first_chapter_in_gist(gist, series_bible, outline, summaries):
             files=sanitized_files
         )
     
-    # Refresh gist to get updated file information after the edit
-    # PyGithub doesn't auto-update file URLs after edit(), but we need the
-    # fresh raw_url values for chapters.json. This requires a new API call.
-    g = Github(GIST_TOKEN)
-    refreshed_gist = g.get_gist(GIST_ID)
-    
-    # Create initial chapters.json
-    chapters_json = update_chapters_json(refreshed_gist)
-    files_json = {"chapters.json": chapters_json}
-    sanitized_json = _sanitize_gist_files(files_json)
-    refreshed_gist.edit(files=sanitized_json)
+    manifest.record(changed_files)
+    NumberingState(NUMBERING_FILE, "chapter_").record(1, run_key=RUN_KEY)
     
     # Also save chapters.json locally
     save_file(DOCS_DIR / "chapters.json", chapters_json)
@@ -432,8 +414,51 @@ def ensure_first_chapter_in_gist(gist, series_bible, outline, summaries):
     return True
 
 
+def verify_gist():
+    """
+    Compare the local publish manifest with the Gist.
+    
+    Hashes are read from the revision-pinned raw URLs in the Gist's file
+    listing, so no file content is downloaded.
+    """
+    if not GIST_TOKEN or not GIST_ID:
+        print("ERROR: GIST_TOKEN and GIST_ID environment variables must be set")
+        sys.exit(1)
+    
+    # Never fall back to get_gist(), which would download every file
+    gist = gist_publish.get_gist_metadata(gist_publish.connect(GIST_TOKEN), GIST_ID, full_fetch_fallback=False)
+    if gist is None:
+        print(f"ERROR: Gist {GIST_ID} is not in the token owner's gist listing")
+        sys.exit(1)
+    manifest = gist_publish.GistManifest(MANIFEST_FILE)
+    problems = manifest.verify(gist)
+    for filename, problem in problems:
+        print(f"⚠ {filename}: {problem}")
+    
+    if problems:
+        print(f"ERROR: {len(problems)} files differ between {MANIFEST_FILE.name} and Gist {GIST_ID}")
+        sys.exit(1)
+    print(f"✓ All {len(manifest.hashes)} files in {MANIFEST_FILE.name} match Gist {GIST_ID}")
+
+
 def main():
     """Main execution flow."""
+    parser = argparse.ArgumentParser(description="Daily Gemini Novel Generator")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check the publish manifest against the Gist instead of generating")
+    parser.add_argument("--force", action="store_true",
+                        help="Publish even if this schedule slot already has a publish")
+    args = parser.parse_args()
+    
+    if args.verify:
+        verify_gist()
+        return
+    
+    # A retried or repeated run in the same schedule slot has nothing to do
+    if not args.force and NumberingState(NUMBERING_FILE, "chapter_").last_run_key == RUN_KEY:
+        print(f"✓ Already published for this schedule slot ({RUN_KEY}). Use --force to publish another chapter.")
+        return
+    
     # Validate environment variables
     if not GEMINI_API_KEY:
         print("ERROR: GEMINI_API_KEY environment variable not set")
@@ -461,10 +486,16 @@ def main():
         sys.exit(1)
     
     # Get Gist object for initial check
-    g = Github(GIST_TOKEN)
-    gist = g.get_gist(GIST_ID)
+    g = gist_publish.connect(GIST_TOKEN)
+    gist = gist_publish.get_gist_metadata(g, GIST_ID)
     print(f"✓ Connected to Gist {GIST_ID}")
     
+    # The local state of a run that published but failed to commit is lost;
+    # the key published in chapters.json still marks this slot as done
+    if not args.force and idempotency.published_run_key(gist) == RUN_KEY:
+        print(f"✓ Already published for this schedule slot ({RUN_KEY}, per the Gist). Use --force to publish another chapter.")
+        return
+    
     # Ensure Chapter 1 exists in Gist (generate if missing)
     chapter1_created = ensure_first_chapter_in_gist(gist, series_bible, outline, summaries)
     
@@ -475,27 +506,46 @@ def main():
         print("=" * 60)
         return
     
-    # Determine chapter number by checking what's already in the Gist
-    chapter_num = get_chapter_number(gist)
-    print(f"\nGenerating Chapter {chapter_num}")
+    # Resume an unfinished run from the journal, or start the next chapter
+    journal = RunJournal(JOURNAL_FILE)
+    if journal.pending:
+        chapter_num = journal.chapter
+        print(f"\n⚠ Resuming Chapter {chapter_num} from the run journal "
+              f"(done: {', '.join(journal.completed()) or 'nothing'})")
+    else:
+        # Determine chapter number by checking what's already in the Gist
+        chapter_num = get_chapter_number(gist)
+        journal.begin(chapter_num)
+        print(f"\nGenerating Chapter {chapter_num}")
     print(f"Theme: {THEME}")
     
-    # Generate the chapter
-    chapter_text = generate_chapter(chapter_num, series_bible, outline, summaries)
+    # Generate the chapter, unless the journal already holds it
+    chapter_text = journal.get("chapter")
+    if chapter_text is None:
+        # Build a bounded previous-summary context (recent chapters + rolled-up digests)
+        previous_summary = summary_store.build_previous_summary(summaries, DOCS_DIR / "summary_digests.json")
+        chapter_text = generate_chapter(chapter_num, series_bible, outline, previous_summary)
+        journal.record("chapter", chapter_text)
     
     # Generate summary
-    summary = generate_summary(chapter_text, chapter_num)
-    
-    # Update continuity log
-    continuity_log = update_continuity_log(chapter_num, summary)
-    
-    # Update summary file
-    summaries_content = load_file(DOCS_DIR / "summaries.md") or "# Chapter Summaries\n"
-    summaries_content += f"\n\n## Chapter {chapter_num}\n\n{summary}"
-    save_file(DOCS_DIR / "summaries.md", summaries_content)
-    
-    # Update Gist with new chapter and chapters.json
+    summary = journal.get("summary")
+    if summary is None:
+        summary = generate_summary(chapter_text, chapter_num)
+        journal.record("summary", summary)
+    
+    # Update continuity log and summary file (once per chapter)
+    if journal.done("local"):
+        continuity_log = load_file(DOCS_DIR / "continuity_log.txt")
+    else:
+        continuity_log = update_continuity_log(chapter_num, summary)
+        summaries_content = load_file(DOCS_DIR / "summaries.md") or "# Chapter Summaries\n"
+        summaries_content += f"\n\n## Chapter {chapter_num}\n\n{summary}"
+        save_file(DOCS_DIR / "summaries.md", summaries_content)
+        journal.record("local")
+    
+    # Update Gist with new chapter and chapters.json (safe to replay: unchanged files are skipped)
     update_gist(chapter_num, chapter_text, continuity_log, gist)
+    journal.record("publish")
     
     print("\n" + "=" * 60)
     print("✓ Daily chapter generation complete!")
@@ -4,8 +4,13 @@ Tumblr Poem Bot
 Posts a poem to Tumblr every hour.
 Randomly selects a poetry type from a configurable list and generates
 a poem in that style with relevant hashtags.
+
+Poems are served from a pre-generated queue (see common/poem_queue.py) so a
+Gemini outage does not stop the posting schedule. Run with --fill N to
+generate N poems per poetry type into the queue ahead of time.
 """
 
+import argparse
 import os
 import sys
 import json
@@ -13,9 +18,12 @@ import random
 from datetime import datetime
 from pathlib import Path
 
-import google.generativeai as genai
 import pytumblr
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import generation
+from common.poem_queue import POEM_QUEUE_LOW_WATERMARK, POEM_QUEUE_REFILL_BATCH, PoemQueue, fill
+
 # Configuration
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
@@ -72,12 +80,12 @@ def load_json(filepath):
         return None
 
 
-def select_random_poetry_type():
+def load_poetry_types():
     """
-    Select a random poetry type from the poetry_types.json file.
+    Load the list of poetry types from the poetry_types.json file.
     
     Returns:
-        str: Name of the selected poetry type
+        list: Names of the configured poetry types
     """
     poetry_types_data = load_json(POETRY_TYPES_FILE)
     if not poetry_types_data or "poetry_types" not in poetry_types_data:
@@ -89,12 +97,22 @@ def select_random_poetry_type():
         print("ERROR: Poetry types list is empty")
         sys.exit(1)
     
-    selected = random.choice(poetry_types)
+    return poetry_types
+
+
+def select_random_poetry_type():
+    """
+    Select a random poetry type from the poetry_types.json file.
+    
+    Returns:
+        str: Name of the selected poetry type
+    """
+    selected = random.choice(load_poetry_types())
     print(f"Selected poetry type: {selected}")
     return selected
 
 
-def generate_poem(poetry_type):
+def create_poem(poetry_type):
     """
     Generate a new poem using Gemini AI in the selected poetry type style.
     
@@ -103,21 +121,33 @@ def generate_poem(poetry_type):
         
     Returns:
         str: The generated poem text
-    """
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        poem_prompt_template = load_file(PROMPTS_DIR / "poem_prompt.txt")
-        prompt = poem_prompt_template.format(poetry_type=poetry_type)
         
-        print(f"Generating poem in the style of {poetry_type}...")
-        response = model.generate_content(prompt)
-        poem_text = response.text.strip()
-        
-        print(f"✓ Poem generated successfully")
-        return poem_text
+    Raises:
+        Exception: Any generation error, for the caller to handle
+    """
+    poem_prompt_template = generation.load_template(PROMPTS_DIR / "poem_prompt.txt")
+    prompt = poem_prompt_template.format(poetry_type=poetry_type)
+    
+    print(f"Generating poem in the style of {poetry_type}...")
+    response_text = generation.generate(prompt)
+    poem_text = response_text.strip()
+    
+    print(f"✓ Poem generated successfully")
+    return poem_text
+
+
+def generate_poem(poetry_type):
+    """
+    Generate a poem live, exiting on failure.
+    
+    Args:
+        poetry_type: The type of poetry to generate
         
+    Returns:
+        str: The generated poem text
+    """
+    try:
+        return create_poem(poetry_type)
     except Exception as e:
         print(f"ERROR: Failed to generate poem using model '{GEMINI_MODEL}': {e}")
         sys.exit(1)
@@ -227,13 +257,49 @@ def post_to_tumblr(poem_text, poetry_type):
         sys.exit(1)
 
 
-def main():
-    """Main execution flow."""
-    # Validate environment variables
+def fill_queue(queue, per_type):
+    """
+    Producer mode: generate poems for every poetry type into the queue.
+    
+    Args:
+        queue: PoemQueue to fill
+        per_type: Number of poems to generate per poetry type
+    """
     if not GEMINI_API_KEY:
         print("ERROR: GEMINI_API_KEY environment variable not set")
         sys.exit(1)
     
+    print("=" * 60)
+    print(f"Filling Tumblr poem queue ({queue.count()} waiting)")
+    print("=" * 60)
+    fill(queue, load_poetry_types(), create_poem, validate_fn=bool, per_type=per_type)
+
+
+def refill_queue(queue):
+    """Top the queue up after posting when it has fallen below the low watermark."""
+    waiting = queue.count()
+    if waiting >= POEM_QUEUE_LOW_WATERMARK:
+        return
+    if not GEMINI_API_KEY:
+        print(f"⚠ Poem queue is low ({waiting} waiting) but GEMINI_API_KEY is not set; skipping refill")
+        return
+    print(f"\nPoem queue is low ({waiting} waiting), refilling...")
+    fill(queue, load_poetry_types(), create_poem, validate_fn=bool, limit=POEM_QUEUE_REFILL_BATCH)
+
+
+def main():
+    """Main execution flow."""
+    parser = argparse.ArgumentParser(description="Post a poem to Tumblr")
+    parser.add_argument("--fill", type=int, metavar="N",
+                        help="Generate N poems per poetry type into the queue instead of posting")
+    args = parser.parse_args()
+    
+    queue = PoemQueue("tumblr")
+    if args.fill:
+        fill_queue(queue, args.fill)
+        return
+    
+    # Validate environment variables
     if not TUMBLR_CONSUMER_KEY:
         print("ERROR: TUMBLR_CONSUMER_KEY environment variable not set")
         sys.exit(1)
@@ -263,18 +329,31 @@ def main():
     if config_data:
         print(f"Configuration: {config_data.get('note', 'Default settings')}")
     
-    # Select random poetry type
-    poetry_type = select_random_poetry_type()
-    
-    # Generate the poem
-    poem_text = generate_poem(poetry_type)
+    # Take the next poem from the queue, generating one live only if it is empty
+    queued = queue.peek()
+    if queued:
+        poem_id, poetry_type, poem_text = queued
+        print(f"Using queued {poetry_type} poem ({queue.count()} waiting)")
+    else:
+        if not GEMINI_API_KEY:
+            print("ERROR: Poem queue is empty and GEMINI_API_KEY environment variable not set")
+            sys.exit(1)
+        print("Poem queue is empty, generating live")
+        poem_id = None
+        poetry_type = select_random_poetry_type()
+        poem_text = generate_poem(poetry_type)
     
     # Post to Tumblr
     post_to_tumblr(poem_text, poetry_type)
+    if poem_id is not None:
+        queue.mark_posted(poem_id)
     
     print("\n" + "=" * 60)
     print("✓ Poem posted successfully!")
     print("=" * 60)
+    
+    refill_queue(queue)
+    queue.close()
 
 
 if __name__ == "__main__":
@@ -4,17 +4,26 @@ Twitter Poem Bot
 Posts a short poem (max 280 characters) to Twitter/X every 15 minutes.
 Randomly selects a poetry type from a configurable list and generates
 a poem in that style.
+
+Poems are served from a pre-generated queue (see common/poem_queue.py) so a
+Gemini outage does not stop the posting schedule. Run with --fill N to
+generate N poems per poetry type into the queue ahead of time.
 """
 
+import argparse
 import os
 import sys
 import json
 import random
 from pathlib import Path
 
-import google.generativeai as genai
 import tweepy
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import generation
+from common.poem_queue import POEM_QUEUE_LOW_WATERMARK, POEM_QUEUE_REFILL_BATCH, PoemQueue, fill
+from twitter_text import MAX_WEIGHTED_LENGTH, trim_to_fit, weighted_length
+
 # Configuration
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
@@ -33,8 +42,13 @@ PROMPTS_DIR = SCRIPTS_DIR / "prompts"
 POETRY_TYPES_FILE = SCRIPTS_DIR / "poetry_types.json"
 CONFIG_FILE = SCRIPTS_DIR / "config.json"
 
-# Character limit for Twitter
-TWITTER_CHAR_LIMIT = 280
+# Character limit for Twitter (weighted: URLs, emoji and CJK count differently)
+TWITTER_CHAR_LIMIT = MAX_WEIGHTED_LENGTH
+
+# Candidates requested per call, and the output cap for each of them: a full
+# tweet is well under 180 tokens, and trim_to_fit still catches an overlong one
+TWITTER_CANDIDATES = int(os.environ.get("TWITTER_CANDIDATES", 4))
+TWITTER_MAX_OUTPUT_TOKENS = int(os.environ.get("TWITTER_MAX_OUTPUT_TOKENS", 180))
 
 
 def load_file(filepath):
@@ -55,12 +69,12 @@ def load_json(filepath):
         return None
 
 
-def select_random_poetry_type():
+def load_poetry_types():
     """
-    Select a random poetry type from the poetry_types.json file.
+    Load the list of poetry types from the poetry_types.json file.
     
     Returns:
-        str: Name of the selected poetry type
+        list: Names of the configured poetry types
     """
     poetry_types_data = load_json(POETRY_TYPES_FILE)
     if not poetry_types_data or "poetry_types" not in poetry_types_data:
@@ -72,51 +86,99 @@ def select_random_poetry_type():
         print("ERROR: Poetry types list is empty")
         sys.exit(1)
     
-    selected = random.choice(poetry_types)
+    return poetry_types
+
+
+def select_random_poetry_type():
+    """
+    Select a random poetry type from the poetry_types.json file.
+    
+    Returns:
+        str: Name of the selected poetry type
+    """
+    selected = random.choice(load_poetry_types())
     print(f"Selected poetry type: {selected}")
     return selected
 
 
-def generate_poem(poetry_type, max_attempts=5):
+def select_best_candidate(candidates):
+    """
+    Pick the candidate that makes the fullest use of the tweet.
+    
+    Candidates over the limit are only used, trimmed at line boundaries, when
+    none of them fits as written.
+    
+    Args:
+        candidates: Candidate poem texts
+        
+    Returns:
+        str: The chosen poem text
+    """
+    poems = [c.strip() for c in candidates if c.strip()]
+    fitting = [p for p in poems if weighted_length(p) <= TWITTER_CHAR_LIMIT]
+    if fitting:
+        best = max(fitting, key=weighted_length)
+        print(f"✓ {len(fitting)}/{len(poems)} candidates fit within Twitter's {TWITTER_CHAR_LIMIT} character limit")
+        return best
+    
+    print(f"⚠ No candidate fits within {TWITTER_CHAR_LIMIT} characters; trimming at line boundaries")
+    trimmed = [trim_to_fit(p, TWITTER_CHAR_LIMIT) for p in poems]
+    # Prefer poems that lost whole lines over ones cut mid-line
+    return max(trimmed, key=lambda p: (not p.endswith("…"), weighted_length(p)))
+
+
+def create_poem(poetry_type):
     """
     Generate a new poem using Gemini AI in the selected poetry type style.
-    Ensures the poem is under the Twitter character limit.
+    Requests several length-capped candidates in one call and keeps the best
+    one that fits the Twitter character limit.
     
     Args:
         poetry_type: The type of poetry to generate
-        max_attempts: Maximum number of attempts to generate a poem under the limit
         
     Returns:
         str: The generated poem text
-    """
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        poem_prompt_template = load_file(PROMPTS_DIR / "poem_prompt.txt")
-        prompt = poem_prompt_template.format(poetry_type=poetry_type)
-        
-        for attempt in range(1, max_attempts + 1):
-            print(f"Generating poem in the style of {poetry_type} (attempt {attempt}/{max_attempts})...")
-            response = model.generate_content(prompt)
-            poem_text = response.text.strip()
-            
-            # Count characters
-            char_count = len(poem_text)
-            print(f"Generated poem length: {char_count} characters")
-            
-            if char_count <= TWITTER_CHAR_LIMIT:
-                print(f"✓ Poem fits within Twitter's {TWITTER_CHAR_LIMIT} character limit")
-                return poem_text
-            else:
-                print(f"⚠ Poem exceeds limit by {char_count - TWITTER_CHAR_LIMIT} characters, regenerating...")
         
-        # If we couldn't generate a short enough poem, truncate it
-        print(f"⚠ Could not generate poem under {TWITTER_CHAR_LIMIT} characters after {max_attempts} attempts")
-        print(f"Truncating poem to fit...")
-        truncated = poem_text[:TWITTER_CHAR_LIMIT - 3] + "..."
-        return truncated
+    Raises:
+        Exception: Any generation error, for the caller to handle
+    """
+    poem_prompt_template = generation.load_template(PROMPTS_DIR / "poem_prompt.txt")
+    prompt = poem_prompt_template.format(poetry_type=poetry_type)
+    
+    print(f"Generating {TWITTER_CANDIDATES} candidate poems in the style of {poetry_type}...")
+    candidates = generation.generate_candidates(
+        prompt,
+        TWITTER_CANDIDATES,
+        max_output_tokens=TWITTER_MAX_OUTPUT_TOKENS
+    )
+    if not candidates:
+        raise RuntimeError("Gemini returned no usable candidates")
+    
+    for i, candidate in enumerate(candidates, 1):
+        print(f"  Candidate {i}: {weighted_length(candidate.strip())} characters")
+    
+    poem_text = select_best_candidate(candidates)
+    print(f"Poem length: {weighted_length(poem_text)} characters")
+    return poem_text
+
+
+def is_postable(poem_text):
+    """Return True if a poem is non-empty and fits in a single tweet."""
+    return bool(poem_text) and weighted_length(poem_text) <= TWITTER_CHAR_LIMIT
+
+
+def generate_poem(poetry_type):
+    """
+    Generate a poem live, exiting on failure.
+    
+    Args:
+        poetry_type: The type of poetry to generate
         
+    Returns:
+        str: The generated poem text
+    """
+    try:
+        return create_poem(poetry_type)
     except Exception as e:
         print(f"ERROR: Failed to generate poem using model '{GEMINI_MODEL}': {e}")
         sys.exit(1)
@@ -142,7 +204,7 @@ def post_to_twitter(poem_text, poetry_type):
         
         # Post the tweet
         print(f"\nPosting to Twitter/X...")
-        print(f"Tweet content ({len(poem_text)} characters):")
+        print(f"Tweet content ({weighted_length(poem_text)} characters):")
         print("-" * 60)
         print(poem_text)
         print("-" * 60)
@@ -159,13 +221,49 @@ def post_to_twitter(poem_text, poetry_type):
         sys.exit(1)
 
 
-def main():
-    """Main execution flow."""
-    # Validate environment variables
+def fill_queue(queue, per_type):
+    """
+    Producer mode: generate poems for every poetry type into the queue.
+    
+    Args:
+        queue: PoemQueue to fill
+        per_type: Number of poems to generate per poetry type
+    """
     if not GEMINI_API_KEY:
         print("ERROR: GEMINI_API_KEY environment variable not set")
         sys.exit(1)
     
+    print("=" * 60)
+    print(f"Filling Twitter poem queue ({queue.count()} waiting)")
+    print("=" * 60)
+    fill(queue, load_poetry_types(), create_poem, validate_fn=is_postable, per_type=per_type)
+
+
+def refill_queue(queue):
+    """Top the queue up after posting when it has fallen below the low watermark."""
+    waiting = queue.count()
+    if waiting >= POEM_QUEUE_LOW_WATERMARK:
+        return
+    if not GEMINI_API_KEY:
+        print(f"⚠ Poem queue is low ({waiting} waiting) but GEMINI_API_KEY is not set; skipping refill")
+        return
+    print(f"\nPoem queue is low ({waiting} waiting), refilling...")
+    fill(queue, load_poetry_types(), create_poem, validate_fn=is_postable, limit=POEM_QUEUE_REFILL_BATCH)
+
+
+def main():
+    """Main execution flow."""
+    parser = argparse.ArgumentParser(description="Post a poem to Twitter/X")
+    parser.add_argument("--fill", type=int, metavar="N",
+                        help="Generate N poems per poetry type into the queue instead of posting")
+    args = parser.parse_args()
+    
+    queue = PoemQueue("twitter")
+    if args.fill:
+        fill_queue(queue, args.fill)
+        return
+    
+    # Validate environment variables
     if not TWITTER_API_KEY:
         print("ERROR: TWITTER_API_KEY environment variable not set")
         sys.exit(1)
@@ -195,18 +293,35 @@ def main():
     if config_data:
         print(f"Configuration: {config_data.get('note', 'Default settings')}")
     
-    # Select random poetry type
-    poetry_type = select_random_poetry_type()
-    
-    # Generate the poem
-    poem_text = generate_poem(poetry_type)
+    # Take the next poem from the queue, generating one live only if it is empty
+    queued = queue.peek()
+    if queued:
+        poem_id, poetry_type, poem_text = queued
+        print(f"Using queued {poetry_type} poem ({queue.count()} waiting)")
+    else:
+        if not GEMINI_API_KEY:
+            print("ERROR: Poem queue is empty and GEMINI_API_KEY environment variable not set")
+            sys.exit(1)
+        print("Poem queue is empty, generating live")
+        poem_id = None
+        poetry_type = select_random_poetry_type()
+        poem_text = generate_poem(poetry_type)
+        if not is_postable(poem_text):
+            print(f"ERROR: Generated poem is {weighted_length(poem_text)} characters, "
+                  f"over Twitter's {TWITTER_CHAR_LIMIT} character limit")
+            sys.exit(1)
     
     # Post to Twitter
     post_to_twitter(poem_text, poetry_type)
+    if poem_id is not None:
+        queue.mark_posted(poem_id)
     
     print("\n" + "=" * 60)
     print("✓ Poem posted successfully!")
     print("=" * 60)
+    
+    refill_queue(queue)
+    queue.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+"""
+Twitter weighted tweet length.
+
+Twitter does not count characters one for one. Following the twitter-text
+v3 configuration:
+
+- text is NFC-normalized before counting
+- every URL counts as 23 characters, however long it is
+- each emoji sequence (including ZWJ sequences, flags and skin tones)
+  counts as 2
+- code points in the Latin, punctuation and common symbol ranges count as
+  1; everything else (CJK, Hangul, ...) counts as 2
+
+so a tweet is valid when its weighted length is at most 280.
+"""
+
+import re
+import unicodedata
+
+MAX_WEIGHTED_LENGTH = 280
+URL_LENGTH = 23
+
+# (first code point, last code point) ranges weighted 1; all others weigh 2
+LIGHT_RANGES = (
+    (0x0000, 0x10FF),
+    (0x2000, 0x200D),
+    (0x2010, 0x201F),
+    (0x2032, 0x2037),
+)
+
+URL_PATTERN = re.compile(r"(?:https?://|www\.)[^\s<>\"]+[^\s<>\".,:;!?)\]}'\u2019\u201d]")
+
+_EMOJI_BASE = (
+    "\u00a9\u00ae\u203c\u2049\u2122\u2139\u2194-\u2199\u21a9\u21aa\u231a\u231b\u2328"
+    "\u23cf\u23e9-\u23f3\u23f8-\u23fa\u24c2\u25aa\u25ab\u25b6\u25c0\u25fb-\u25fe"
+    "\u2600-\u27bf\u2934\u2935\u2b05-\u2b07\u2b1b\u2b1c\u2b50\u2b55\u3030\u303d"
+    "\u3297\u3299\U0001f000-\U0001faff"
+)
+# Variation selector 16, keycap mark, skin tones and tag characters
+_EMOJI_MODIFIERS = "\ufe0f\u20e3\U0001f3fb-\U0001f3ff\U000e0020-\U000e007f"
+EMOJI_PATTERN = re.compile(
+    # Flags are pairs of regional indicators
+    "[\U0001f1e6-\U0001f1ff]{2}"
+    # Keycaps: digit, # or * followed by an optional VS16 and the keycap mark
+    "|[0-9#*]\ufe0f?\u20e3"
+    # Everything else: a base emoji with modifiers, optionally ZWJ-joined
+    f"|[{_EMOJI_BASE}][{_EMOJI_MODIFIERS}]*(?:\u200d[{_EMOJI_BASE}][{_EMOJI_MODIFIERS}]*)*"
+)
+
+
+def _char_weight(char):
+    code = ord(char)
+    for first, last in LIGHT_RANGES:
+        if first <= code <= last:
+            return 1
+    return 2
+
+
+def _segments(text):
+    """Yield (piece, weight) for each URL, emoji sequence and plain run of text."""
+    position = 0
+    tokens = sorted(
+        [(m.start(), m.end(), URL_LENGTH) for m in URL_PATTERN.finditer(text)] +
+        [(m.start(), m.end(), 2) for m in EMOJI_PATTERN.finditer(text)]
+    )
+    for start, end, weight in tokens:
+        if start < position:
+            # Emoji inside a URL: the URL already counted it
+            continue
+        for char in text[position:start]:
+            yield char, _char_weight(char)
+        yield text[start:end], weight
+        position = end
+    for char in text[position:]:
+        yield char, _char_weight(char)
+
+
+def weighted_length(text):
+    """
+    Return the length Twitter counts against the 280 limit.
+
+    Args:
+        text: Tweet text
+
+    Returns:
+        int: Weighted length
+    """
+    text = unicodedata.normalize("NFC", text)
+    return sum(weight for _, weight in _segments(text))
+
+
+def fits(text, limit=MAX_WEIGHTED_LENGTH):
+    """Return True if the text is a valid tweet length."""
+    return weighted_length(text) <= limit
+
+
+def trim_to_fit(text, limit=MAX_WEIGHTED_LENGTH):
+    """
+    Trim text to fit the limit, dropping whole lines from the end.
+
+    Only when even the first line is too long is that line cut at a word
+    boundary and ended with an ellipsis.
+
+    Args:
+        text: Text to trim
+        limit: Weighted length limit
+
+    Returns:
+        str: Text that fits within the limit
+    """
+    text = unicodedata.normalize("NFC", text.strip())
+    lines = text.split("\n")
+    while lines:
+        candidate = "\n".join(lines).rstrip()
+        if candidate and fits(candidate, limit):
+            return candidate
+        lines.pop()
+
+    # The first line alone is too long: cut it at the last word that fits,
+    # leaving room for the ellipsis (which weighs 2)
+    kept = ""
+    length = weighted_length("…")
+    for piece, weight in _segments(text.split("\n")[0]):
+        if length + weight > limit:
+            break
+        kept += piece
+        length += weight
+    cut = kept.rsplit(" ", 1)[0] if " " in kept else kept
+    return cut.rstrip(" ,;:-") + "…"
@@ -6,6 +6,7 @@ ballad poetry type style, and publishes all outputs to a single public GitHub Gi
 Runs for 300 days, then marks the collection as complete.
 """
 
+import argparse
 import os
 import sys
 import json
@@ -13,8 +14,14 @@ import random
 from datetime import datetime
 from pathlib import Path
 
-import google.generativeai as genai
-from github import Github, InputFileContent
+from github import InputFileContent
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import collection_index, generation, gist_publish, idempotency, numbering
+from common.collection_index import CollectionIndex
+from common.gist_shards import ShardSet
+from common.numbering import NumberingState
+from common.rate_limit import is_model_error
 
 # Configuration
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
@@ -25,6 +32,14 @@ WANDERING_MINSTREL_GIST_ID = os.environ.get("WANDERING_MINSTREL_GIST_ID")
 SCRIPTS_DIR = Path(__file__).parent
 DOCS_DIR = Path(__file__).parent.parent.parent / "docs" / "wandering-minstrel"
 PROMPTS_DIR = SCRIPTS_DIR / "prompts"
+INDEX_FILE = DOCS_DIR / "collection_index.jsonl"
+NUMBERING_FILE = DOCS_DIR / "numbering.json"
+
+# Idempotency key of this run: one publish per work and schedule slot
+RUN_KEY = idempotency.run_key(DOCS_DIR.name)
+
+# Metadata comments appended to each published poem, and their index keys
+METADATA_FIELDS = {"Poetry Type": "poetry_type", "Published": "published_date"}
 
 # Configuration files
 POETRY_TYPES_FILE = SCRIPTS_DIR / "poetry_types.json"
@@ -59,19 +74,6 @@ def load_json(filepath):
         return None
 
 
-def _list_and_print_models():
-    """List available Gemini models for debugging purposes."""
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        print("\nAvailable Gemini models:")
-        for model in genai.list_models():
-            print(f"  - {model.name}")
-            if hasattr(model, 'supported_generation_methods'):
-                print(f"    Supported methods: {model.supported_generation_methods}")
-    except Exception as e:
-        print(f"  Unable to list models: {e}")
-
-
 def _sanitize_gist_files(files: dict) -> dict:
     """
     Ensure values passed to gist.edit are either None or InputFileContent instances.
@@ -90,33 +92,19 @@ def _sanitize_gist_files(files: dict) -> dict:
     return sanitized
 
 
-def get_poem_number(gist):
+def get_poem_number(shards):
     """
-    Determine the next poem number by checking what poems exist in the Gist.
+    Determine the next poem number from the local numbering state.
+    The state is reconciled with the Gist's file names only when it is
+    missing or stale.
     
     Args:
-        gist: PyGithub Gist object
+        shards: ShardSet spanning every volume of the collection
     
     Returns:
         int: The next poem number to generate
     """
-    poem_files = [f for f in gist.files.keys() if f.startswith("poem_") and f.endswith(".md")]
-    
-    if not poem_files:
-        return 1
-    
-    poem_numbers = []
-    for filename in poem_files:
-        try:
-            num_str = filename.replace("poem_", "").replace(".md", "")
-            poem_numbers.append(int(num_str))
-        except ValueError:
-            continue
-    
-    if not poem_numbers:
-        return 1
-    
-    return max(poem_numbers) + 1
+    return numbering.next_number(NumberingState(NUMBERING_FILE, "poem_"), shards)
 
 
 def check_completion_status():
@@ -160,21 +148,17 @@ def select_random_poetry_type():
 def generate_poem(poem_num, poetry_type):
     """Generate a new ballad poem using Gemini AI in the selected poetry type style."""
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        
-        poem_prompt_template = load_file(PROMPTS_DIR / "poem_prompt.txt")
+        poem_prompt_template = generation.load_template(PROMPTS_DIR / "poem_prompt.txt")
         
         prompt = poem_prompt_template.format(poetry_type=poetry_type)
         
         print(f"Generating Ballad #{poem_num} in the style of {poetry_type}...")
-        response = model.generate_content(prompt)
-        
-        return response.text
+        return generation.generate(prompt)
     except Exception as e:
         print(f"ERROR: Failed to generate poem using model '{GEMINI_MODEL}': {e}")
-        print(f"Check if the model name is correct and available.")
-        _list_and_print_models()
+        if is_model_error(e):
+            print(f"Check if the model name is correct and available.")
+            generation.print_available_models()
         sys.exit(1)
 
 
@@ -195,58 +179,96 @@ def extract_poem_title(poem_text):
     return f"Ballad {datetime.now().strftime('%Y-%m-%d')}"
 
 
-def update_chapters_json(gist, poem_num):
+def build_poem_record(filename, content):
+    """
+    Build the metadata index record for a published poem.
+    
+    Args:
+        filename: Poem filename in the Gist (e.g. "poem_001.md")
+        content: Poem content as published, including metadata comments
+    
+    Returns:
+        dict: Index record with number, filename, title and metadata
+    """
+    record = {
+        "chapter": int(filename.replace("poem_", "").replace(".md", "")),
+        "filename": filename
+    }
+    title = extract_poem_title(content)
+    if title:
+        record["chapter_name"] = title
+    record.update(collection_index.parse_metadata(content, METADATA_FIELDS))
+    return record
+
+
+def load_index(gist):
+    """
+    Return the metadata index records, first indexing any poems in the Gist
+    that are missing from it.
+    Only the file listing is checked, so this reads no poem content unless
+    the index is missing entries (e.g. on first use).
+    
+    Args:
+        gist: PyGithub Gist object, or a ShardSet spanning every volume
+    
+    Returns:
+        list: Index records ordered by poem number
+    """
+    index = CollectionIndex(INDEX_FILE)
+    records = index.records()
+    indexed = {record["filename"] for record in records}
+    missing = sorted(
+        f for f in gist.files.keys()
+        if f.startswith("poem_") and f.endswith(".md") and f not in indexed
+    )
+    if not missing:
+        return records
+    
+    print(f"Indexing {len(missing)} poems missing from {INDEX_FILE.name}...")
+    for filename in missing:
+        try:
+            index.append(build_poem_record(filename, gist_publish.read_file(gist.files[filename])))
+        except ValueError:
+            continue
+    return index.records()
+
+
+def rebuild_index(gist):
+    """
+    Rebuild the metadata index from scratch by reading every poem in the Gist.
+    
+    Args:
+        gist: PyGithub Gist object, or a ShardSet spanning every volume
+    """
+    CollectionIndex(INDEX_FILE).rebuild([])
+    records = load_index(gist)
+    print(f"✓ Rebuilt {INDEX_FILE.name} with {len(records)} poems")
+
+
+def update_chapters_json(records, poem_num, shards):
     """
     Create/update chapters.json with all poem mappings and their Gist URLs.
     Set completed flag to true if this is the 300th poem.
     
     Args:
-        gist: PyGithub Gist object
+        records: Poem records from the metadata index
         poem_num: Current poem number
+        shards: ShardSet the collection is published to
     
     Returns:
         str: JSON string of poems mapping
     """
-    poem_files = sorted([f for f in gist.files.keys() if f.startswith("poem_") and f.endswith(".md")])
-    
     poems = []
-    for filename in poem_files:
-        try:
-            num_str = filename.replace("poem_", "").replace(".md", "")
-            file_poem_num = int(num_str)
-            
-            raw_url = gist.files[filename].raw_url
-            
-            # Try to extract poem metadata from file
-            poem_data = {
-                "chapter": file_poem_num,  # Using 'chapter' for compatibility with UI
-                "filename": filename,
-                "url": raw_url,
-                "gist_url": f"https://gist.github.com/{WANDERING_MINSTREL_GIST_ID}#{filename}"
-            }
-            
-            # Try to get poem title and metadata from the file content
-            try:
-                file_content = gist.files[filename].content
-                title = extract_poem_title(file_content)
-                if title:
-                    poem_data["chapter_name"] = title
-                
-                # Look for publish date and poetry type in metadata comment at end of file
-                lines = file_content.split('\n')
-                for line in reversed(lines[-5:]):  # Check last 5 lines
-                    if line.startswith('<!-- Published: ') and line.endswith(' -->'):
-                        date_str = line.replace('<!-- Published: ', '').replace(' -->', '').strip()
-                        poem_data["published_date"] = date_str
-                    if line.startswith('<!-- Poetry Type: ') and line.endswith(' -->'):
-                        type_str = line.replace('<!-- Poetry Type: ', '').replace(' -->', '').strip()
-                        poem_data["poetry_type"] = type_str
-            except Exception:
-                pass
-            
-            poems.append(poem_data)
-        except (ValueError, KeyError):
-            continue
+    for record in records:
+        poem_data = {
+            "chapter": record["chapter"],  # Using 'chapter' for compatibility with UI
+            "filename": record["filename"],
+            "url": gist_publish.raw_url(shards.gist_id_for(record["chapter"]), record["filename"]),
+            "gist_url": gist_publish.html_url(shards.gist_id_for(record["chapter"]), record["filename"])
+        }
+        # Title and metadata recorded in the index when the poem was published
+        poem_data.update({k: v for k, v in record.items() if k not in poem_data})
+        poems.append(poem_data)
     
     # Determine if collection is complete (300 poems reached)
     is_completed = poem_num >= MAX_POEMS
@@ -258,8 +280,10 @@ def update_chapters_json(gist, poem_num):
         "total_chapters": len(poems),
         "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC"),
         "gist_id": WANDERING_MINSTREL_GIST_ID,
+        "last_run_key": RUN_KEY,
         "completed": is_completed,
         "max_poems": MAX_POEMS,
+        "shards": shards.index(),
         "chapters": poems
     }
     
@@ -273,7 +297,7 @@ def update_chapters_json(gist, poem_num):
     return json.dumps(chapters_data, indent=2)
 
 
-def update_gist(poem_num, poem_text, poetry_type, gist):
+def update_gist(poem_num, poem_text, poetry_type, shards):
     """
     Update the GitHub Gist with new poem and chapters.json.
     
@@ -281,7 +305,7 @@ def update_gist(poem_num, poem_text, poetry_type, gist):
         poem_num: Poem number being added
         poem_text: Poem content
         poetry_type: Poetry type used for this poem
-        gist: PyGithub Gist object
+        shards: ShardSet the collection is published to
     """
     files = {}
     
@@ -291,32 +315,45 @@ def update_gist(poem_num, poem_text, poetry_type, gist):
     
     # Add metadata comment at the end for tracking
     poem_content = f"{poem_text}\n\n<!-- Poetry Type: {poetry_type} -->\n<!-- Published: {publish_datetime} -->"
-    files[poem_filename] = poem_content
     
     # Also update README if it exists
     readme = load_file(DOCS_DIR / "README.md")
     if readme:
         files["README.md"] = readme
     
+    # Index the new poem and build chapters.json locally, so everything goes out in one edit
+    record = build_poem_record(poem_filename, poem_content)
+    records = [r for r in load_index(shards) if r["chapter"] != poem_num] + [record]
+    
+    # The first volume takes the poem in the same edit as chapters.json; once it is
+    # full, the poem goes to the active (or a new) volume gist first
+    shard = shards.volume_for(len(poem_content.encode("utf-8")))
+    if shard is shards.first:
+        files[poem_filename] = poem_content
+    else:
+        print(f"Publishing {poem_filename} to volume {shard['volume']}...")
+        shards.publish(
+            shard,
+            _sanitize_gist_files({poem_filename: poem_content}),
+            f"Wandering Minstrel - Ballad Collection - Volume {shard['volume']}"
+        )
+    shards.record(shard, poem_num, poem_content)
+    
+    chapters_json = update_chapters_json(records, poem_num, shards)
+    chapters_data = json.loads(chapters_json)
+    files["chapters.json"] = chapters_json
+    
     print(f"Updating Gist {WANDERING_MINSTREL_GIST_ID}...")
     
     sanitized_files = _sanitize_gist_files(files)
     
-    gist.edit(
+    shards.gist.edit(
         description=f"Wandering Minstrel - Ballad Collection - {poem_num} Poems",
         files=sanitized_files
     )
     
-    # Refresh gist to get updated file information
-    g = Github(GIST_TOKEN)
-    refreshed_gist = g.get_gist(WANDERING_MINSTREL_GIST_ID)
-    
-    # Update chapters.json with all poem mappings
-    chapters_json = update_chapters_json(refreshed_gist, poem_num)
-    chapters_data = json.loads(chapters_json)
-    files_json = {"chapters.json": chapters_json}
-    sanitized_json = _sanitize_gist_files(files_json)
-    refreshed_gist.edit(files=sanitized_json)
+    CollectionIndex(INDEX_FILE).append(record)
+    NumberingState(NUMBERING_FILE, "poem_").record(poem_num, run_key=RUN_KEY)
     
     # Save chapters.json locally
     save_file(DOCS_DIR / "chapters.json", chapters_json)
@@ -331,6 +368,26 @@ def update_gist(poem_num, poem_text, poetry_type, gist):
 
 def main():
     """Main execution flow."""
+    parser = argparse.ArgumentParser(description="Daily Wandering Minstrel Ballad Generator")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Rebuild collection_index.jsonl from the Gist instead of generating")
+    parser.add_argument("--force", action="store_true",
+                        help="Publish even if this schedule slot already has a publish")
+    args = parser.parse_args()
+    
+    if args.rebuild_index:
+        if not GIST_TOKEN or not WANDERING_MINSTREL_GIST_ID:
+            print("ERROR: GIST_TOKEN and WANDERING_MINSTREL_GIST_ID environment variables must be set")
+            sys.exit(1)
+        g = gist_publish.connect(GIST_TOKEN)
+        rebuild_index(ShardSet(g, gist_publish.get_gist_metadata(g, WANDERING_MINSTREL_GIST_ID), "poem_", DOCS_DIR / "chapters.json"))
+        return
+    
+    # A retried or repeated run in the same schedule slot has nothing to do
+    if not args.force and NumberingState(NUMBERING_FILE, "poem_").last_run_key == RUN_KEY:
+        print(f"✓ Already published for this schedule slot ({RUN_KEY}). Use --force to publish another poem.")
+        return
+    
     # Validate environment variables
     if not GEMINI_API_KEY:
         print("ERROR: GEMINI_API_KEY environment variable not set")
@@ -362,12 +419,22 @@ def main():
         print(f"Max poems: {config_data.get('max_poems', MAX_POEMS)}")
     
     # Get Gist object
-    g = Github(GIST_TOKEN)
-    gist = g.get_gist(WANDERING_MINSTREL_GIST_ID)
+    g = gist_publish.connect(GIST_TOKEN)
+    gist = gist_publish.get_gist_metadata(g, WANDERING_MINSTREL_GIST_ID)
     print(f"✓ Connected to Gist {WANDERING_MINSTREL_GIST_ID}")
     
+    # The local state of a run that published but failed to commit is lost;
+    # the key published in chapters.json still marks this slot as done
+    if not args.force and idempotency.published_run_key(gist) == RUN_KEY:
+        print(f"✓ Already published for this schedule slot ({RUN_KEY}, per the Gist). Use --force to publish another poem.")
+        return
+    
+    shards = ShardSet(g, gist, "poem_", DOCS_DIR / "chapters.json")
+    if len(shards.shards) > 1:
+        print(f"✓ Collection spans {len(shards.shards)} volumes")
+    
     # Determine poem number
-    poem_num = get_poem_number(gist)
+    poem_num = get_poem_number(shards)
     
     # Check if we've reached the limit
     if poem_num > MAX_POEMS:
@@ -375,7 +442,7 @@ def main():
         print("  Collection is complete. Marking as completed...")
         
         # Update chapters.json to mark as complete
-        chapters_json = update_chapters_json(gist, poem_num - 1)
+        chapters_json = update_chapters_json(load_index(shards), poem_num - 1, shards)
         files_json = {"chapters.json": chapters_json}
         sanitized_json = _sanitize_gist_files(files_json)
         gist.edit(files=sanitized_json)
@@ -395,7 +462,7 @@ def main():
     poem_text = generate_poem(poem_num, poetry_type)
     
     # Update Gist with new poem and chapters.json
-    update_gist(poem_num, poem_text, poetry_type, gist)
+    update_gist(poem_num, poem_text, poetry_type, shards)
     
     print("\n" + "=" * 60)
     print("✓ Ballad generation complete!")